@@ -0,0 +1,95 @@
+"""
+EXPLAIN the queries behind each page and flag sequential scans
+
+    flask db-analyze
+
+Requests every read route through the test client, records the SQL it
+issues and runs each statement again under EXPLAIN with the same
+parameters. Postgres plans small tables with sequential scans whatever
+the indexes, so run this against a realistically sized database.
+"""
+# Imports
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event
+
+from cache import page_cache
+from models import db, Artist, Venue
+
+# (method, path, form data); {venue} and {artist} are replaced with existing ids
+ROUTES = [
+    ('GET', '/venues', None),
+    ('GET', '/artists', None),
+    ('GET', '/shows', None),
+    ('GET', '/venues?genre=Jazz&city=New York&state=NY', None),
+    ('GET', '/artists?genre=Jazz', None),
+    ('GET', '/venues/{venue}', None),
+    ('GET', '/artists/{artist}', None),
+    ('POST', '/venues/search', {'search_term': 'music'}),
+    ('POST', '/artists/search', {'search_term': 'music'}),
+    ('GET', '/api/v1/shows/search?venue_id={venue}', None),
+]
+
+
+def capture(client, method, path, data):
+    # The statements and parameters one request sends to the database
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        client.open(path, method=method, data=data)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return statements
+
+
+def explain(connection, statement, parameters):
+    """Return the plan lines of a statement and the ones that scan a whole table."""
+    if connection.dialect.name == 'postgresql':
+        plan = [row[0] for row in connection.exec_driver_sql('EXPLAIN ' + statement, parameters)]
+        return plan, [line for line in plan if 'Seq Scan' in line]
+    if connection.dialect.name == 'sqlite':
+        plan = [row[-1] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+        # "SCAN table" reads every row; "SCAN table USING INDEX" walks an index in order
+        return plan, [line for line in plan if line.startswith('SCAN ') and 'USING' not in line]
+    return [], []
+
+
+@click.command('db-analyze')
+@click.option('--verbose', is_flag=True, help='Print every plan, not just the flagged ones.')
+@with_appcontext
+def db_analyze_command(verbose):
+    """EXPLAIN each page's queries and flag sequential scans."""
+    ids = {
+        'venue': db.session.query(Venue.id).order_by(Venue.id).limit(1).scalar() or 1,
+        'artist': db.session.query(Artist.id).order_by(Artist.id).limit(1).scalar() or 1,
+    }
+    db.session.remove()
+
+    # Cached pages issue no queries, so bypass the cache while capturing
+    backend, page_cache.backend = page_cache.backend, None
+    client = current_app.test_client()
+    flagged = 0
+    try:
+        for method, path, data in ROUTES:
+            path = path.format(**ids)
+            statements = capture(client, method, path, data)
+            click.echo(f'{method} {path}: {len(statements)} queries')
+            with db.engine.connect() as connection:
+                for statement, parameters in statements:
+                    plan, scans = explain(connection, statement, parameters)
+                    flagged += len(scans)
+                    if scans or verbose:
+                        click.echo('  ' + ' '.join(statement.split())[:160])
+                        for line in plan:
+                            click.echo(('  ! ' if line in scans else '    ') + line)
+    finally:
+        page_cache.backend = backend
+
+    click.echo(f'{flagged} sequential scans found.')
@@ -0,0 +1,380 @@
+"""
+JSON API, version 1
+
+Serves list, detail, search and create endpoints for venues, artists and
+shows under /api/v1. Listings use the same keyset cursors as the HTML
+pages, ?fields= picks the fields to return, and every GET response
+carries an ETag so clients can revalidate with If-None-Match. POST
+/shows/check reports the scheduling conflicts of a list of proposed
+shows without booking them, and /calendar/days the number of shows on
+each day of a window.
+"""
+# Imports
+
+import json
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from operator import attrgetter, itemgetter
+
+from flask import Blueprint, Response, request
+from sqlalchemy.exc import IntegrityError
+
+from cache import page_cache
+from calendars import MAX_CALENDAR_DAYS, day_counts
+from conditional import artist_version, venue_version
+from models import db, Artist, Venue, Show, parse_datetime
+from pagination import paginate
+from queries import filter_listing, filter_shows, get_artist_data, get_venue_data, show_listing
+from schedule import ScheduleConflict, booking, check_schedule
+from search import search
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Proposed shows accepted by one schedule check
+MAX_CHECKED_SHOWS = 10000
+
+# Days of day counts returned when ?to= is not given
+CALENDAR_DAYS = 31
+
+
+#----------------------------------------------------------------------------#
+# Serialization.
+#----------------------------------------------------------------------------#
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':'), default=lambda value: value.isoformat()).encode()
+
+
+@lru_cache(maxsize=64)
+def compile_getter(fields, mapping):
+    # One getter per field combination and row kind, shared by every serializer
+    getter = (itemgetter if mapping else attrgetter)(*fields)
+    if len(fields) == 1:
+        return lambda row: {fields[0]: getter(row)}
+    return lambda row: dict(zip(fields, getter(row)))
+
+
+class UnknownFields(ValueError):
+    """Raised when ?fields= names a field the endpoint does not return."""
+
+
+class Serializer:
+    """Turns rows or dicts into dicts of a fixed set of fields.
+
+    The getter for each requested field combination is built once and
+    reused, so serializing a row is a single tuple lookup.
+    """
+
+    def __init__(self, *fields):
+        self.fields = fields
+
+    def select(self):
+        # The fields asked for with ?fields=, in declaration order, defaulting to all of them
+        requested = request.args.get('fields')
+        if not requested:
+            return self.fields
+        requested = {field.strip() for field in requested.split(',') if field.strip()}
+        unknown = requested.difference(self.fields)
+        if unknown:
+            raise UnknownFields('Unknown fields: ' + ', '.join(sorted(unknown)))
+        return tuple(field for field in self.fields if field in requested) or self.fields
+
+    def one(self, row):
+        return compile_getter(self.select(), isinstance(row, dict))(row)
+
+    def many(self, rows):
+        fields = self.select()
+        return [compile_getter(fields, isinstance(row, dict))(row) for row in rows]
+
+
+venue_list = Serializer('id', 'name', 'city', 'state', 'num_upcoming_shows')
+artist_list = Serializer('id', 'name', 'city', 'state', 'num_upcoming_shows')
+search_result = Serializer('id', 'name', 'num_upcoming_shows')
+show_list = Serializer('id', 'start_time', 'end_time', 'venue_id', 'venue_name', 'artist_id', 'artist_name', 'artist_image_link')
+venue_detail = Serializer(
+    'id', 'name', 'genres', 'address', 'city', 'state', 'phone', 'website', 'facebook_link', 'seeking_talent',
+    'seeking_description', 'image_link', 'past_shows', 'upcoming_shows', 'past_shows_count', 'upcoming_shows_count'
+)
+artist_detail = Serializer(
+    'id', 'name', 'genres', 'city', 'state', 'phone', 'website', 'facebook_link', 'seeking_venue',
+    'seeking_description', 'image_link', 'past_shows', 'upcoming_shows', 'past_shows_count', 'upcoming_shows_count'
+)
+
+
+def respond(payload, status=200):
+    response = Response(dumps(payload), status=status, mimetype='application/json')
+    if request.method == 'GET' and status == 200:
+        response.add_etag()
+        response.make_conditional(request)
+    return response
+
+
+def error(message, status):
+    return respond({'message': message}, status)
+
+
+@api.errorhandler(UnknownFields)
+def unknown_fields(e):
+    return error(str(e), 400)
+
+
+def page_payload(serializer, page):
+    return {'data': serializer.many(page.items), 'next': page.next_cursor, 'previous': page.prev_cursor}
+
+
+def valid_type(field, value):
+    # Booleans for the seeking flags, a string or list of strings for genres, strings or null otherwise
+    if field.startswith('seeking_') and field != 'seeking_description':
+        return isinstance(value, bool)
+    if field == 'genres':
+        return isinstance(value, str) or isinstance(value, list) and all(isinstance(name, str) for name in value)
+    return value is None or isinstance(value, str)
+
+
+def json_id(value):
+    # An id from the JSON body, which must be an integer rather than a string, float or boolean
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise TypeError('ids must be integers')
+    return value
+
+
+def create(model, fields, required):
+    # Create a venue or artist from the JSON body
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return error('Expected a JSON object.', 400)
+    missing = [field for field in required if not body.get(field)]
+    if missing:
+        return error('Missing fields: ' + ', '.join(missing), 400)
+    invalid = [field for field in fields if field in body and not valid_type(field, body[field])]
+    if invalid:
+        return error('Invalid types for fields: ' + ', '.join(invalid), 400)
+    try:
+        instance = model(**{field: body[field] for field in fields if field in body})
+        db.session.add(instance)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return error(str(e), 400)
+    except IntegrityError:
+        db.session.rollback()
+        return error(f'{model.__name__} already exists or violates a constraint.', 409)
+    return respond({'id': instance.id}, 201)
+
+
+#----------------------------------------------------------------------------#
+# Venues.
+#----------------------------------------------------------------------------#
+
+VENUE_FIELDS = (
+    'name', 'city', 'state', 'address', 'phone', 'genres', 'image_link', 'facebook_link', 'website',
+    'seeking_talent', 'seeking_description'
+)
+
+
+@api.route('/venues')
+def list_venues():
+    page = paginate(
+        filter_listing(db.session.query(
+            Venue.id, Venue.name, Venue.city, Venue.state, Venue.upcoming_shows_count.label('num_upcoming_shows')
+        ), Venue, request.args),
+        [Venue.id],
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+    return respond(page_payload(venue_list, page))
+
+
+@api.route('/venues/<int:venue_id>')
+def get_venue(venue_id):
+    data = page_cache.get_or_set(f'venue:{venue_id}', lambda: get_venue_data(venue_id), venue_version(venue_id)[0])
+    if not data:
+        return error('Venue not found.', 404)
+    return respond(venue_detail.one(data))
+
+
+@api.route('/venues/search')
+def search_venues():
+    results = search(Venue, request.args.get('q', ''), genre=request.args.get('genre'))
+    return respond({'count': len(results), 'data': search_result.many(results)})
+
+
+@api.route('/venues', methods=['POST'])
+def create_venue():
+    return create(Venue, VENUE_FIELDS, ('name', 'city', 'state', 'phone', 'genres'))
+
+
+#----------------------------------------------------------------------------#
+# Artists.
+#----------------------------------------------------------------------------#
+
+ARTIST_FIELDS = (
+    'name', 'city', 'state', 'phone', 'genres', 'image_link', 'facebook_link', 'website',
+    'seeking_venue', 'seeking_description'
+)
+
+
+@api.route('/artists')
+def list_artists():
+    page = paginate(
+        filter_listing(db.session.query(
+            Artist.id, Artist.name, Artist.city, Artist.state, Artist.upcoming_shows_count.label('num_upcoming_shows')
+        ), Artist, request.args),
+        [Artist.id],
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+    return respond(page_payload(artist_list, page))
+
+
+@api.route('/artists/<int:artist_id>')
+def get_artist(artist_id):
+    data = page_cache.get_or_set(f'artist:{artist_id}', lambda: get_artist_data(artist_id), artist_version(artist_id)[0])
+    if not data:
+        return error('Artist not found.', 404)
+    return respond(artist_detail.one(data))
+
+
+@api.route('/artists/search')
+def search_artists():
+    results = search(Artist, request.args.get('q', ''), genre=request.args.get('genre'))
+    return respond({'count': len(results), 'data': search_result.many(results)})
+
+
+@api.route('/artists', methods=['POST'])
+def create_artist():
+    return create(Artist, ARTIST_FIELDS, ('name', 'city', 'state', 'phone'))
+
+
+#----------------------------------------------------------------------------#
+# Shows.
+#----------------------------------------------------------------------------#
+
+@api.route('/shows')
+def list_shows():
+    page = paginate(
+        show_listing(),
+        [Show.start_time, Show.id],
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+    return respond(page_payload(show_list, page))
+
+
+@api.route('/shows/<int:show_id>')
+def get_show(show_id):
+    show = show_listing().filter(Show.id == show_id).first()
+    if show is None:
+        return error('Show not found.', 404)
+    return respond(show_list.one(show))
+
+
+@api.route('/shows/search')
+def search_shows():
+    # Filter shows by venue, artist, start time window, city, state and genre, in chronological order
+    query = show_listing()
+    try:
+        if request.args.get('venue_id'):
+            query = query.filter(Show.venue_id == int(request.args['venue_id']))
+        if request.args.get('artist_id'):
+            query = query.filter(Show.artist_id == int(request.args['artist_id']))
+        query = filter_shows(query, request.args)
+    except ValueError:
+        return error('Invalid filter value.', 400)
+    page = paginate(query, [Show.start_time, Show.id], after=request.args.get('after'), before=request.args.get('before'))
+    return respond(page_payload(show_list, page))
+
+
+@api.route('/shows', methods=['POST'])
+def create_show():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return error('Expected a JSON object.', 400)
+    try:
+        show = Show(
+            artist_id=json_id(body['artist_id']),
+            venue_id=json_id(body['venue_id']),
+            start_time=parse_datetime(body['start_time']),
+            end_time=parse_datetime(body['end_time']) if body.get('end_time') else None
+        )
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return error('Integer artist_id and venue_id and an ISO 8601 local start_time are required.', 400)
+    if db.session.get(Artist, show.artist_id) is None or db.session.get(Venue, show.venue_id) is None:
+        return error('Unknown artist or venue.', 400)
+    try:
+        db.session.add(show)
+        db.session.commit()
+    except ScheduleConflict as e:
+        db.session.rollback()
+        return respond({'message': str(e), 'conflicts': e.conflicts[0][1]}, 409)
+    except ValueError as e:
+        db.session.rollback()
+        return error(str(e), 400)
+    except IntegrityError:
+        db.session.rollback()
+        return error('Show could not be created.', 409)
+    return respond({'id': show.id}, 201)
+
+
+@api.route('/shows/check', methods=['POST'])
+def check_shows():
+    # Validate a season of proposed shows in one pass, without booking them
+    body = request.get_json(silent=True)
+    proposals = body.get('shows') if isinstance(body, dict) else body
+    if not isinstance(proposals, list):
+        return error('Expected a list of shows.', 400)
+    if len(proposals) > MAX_CHECKED_SHOWS:
+        return error(f'At most {MAX_CHECKED_SHOWS} shows can be checked at once.', 400)
+    bookings = []
+    for number, proposal in enumerate(proposals):
+        try:
+            bookings.append(booking(
+                json_id(proposal['venue_id']),
+                json_id(proposal['artist_id']),
+                parse_datetime(proposal['start_time']),
+                parse_datetime(proposal['end_time']) if proposal.get('end_time') else None,
+                json_id(proposal['id']) if proposal.get('id') is not None else None,
+            ))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return error(
+                f'Show {number}: integer artist_id and venue_id and an ISO 8601 local start_time are required.', 400
+            )
+        if bookings[-1]['end_time'] <= bookings[-1]['start_time']:
+            return error(f'Show {number} must end after it starts.', 400)
+    conflicts = check_schedule(bookings)
+    return respond({
+        'data': [{'conflicts': found} for found in conflicts],
+        'conflicting': sum(1 for found in conflicts if found),
+    })
+
+
+#----------------------------------------------------------------------------#
+# Calendar.
+#----------------------------------------------------------------------------#
+
+@api.route('/calendar/days')
+def calendar_days():
+    # Shows per day from ?from= (today by default) through ?to=, optionally in a ?city= and ?state=
+    try:
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else date.today()
+        end = (
+            date.fromisoformat(request.args['to']) + timedelta(days=1) if request.args.get('to')
+            else start + timedelta(days=CALENDAR_DAYS)
+        )
+    except ValueError:
+        return error('from and to must be ISO 8601 dates.', 400)
+    if not 0 < (end - start).days <= MAX_CALENDAR_DAYS:
+        return error(f'The window must span 1 to {MAX_CALENDAR_DAYS} days.', 400)
+    counts = day_counts(start, end, request.args.get('city'), request.args.get('state'))
+    return respond({
+        'from': start.isoformat(),
+        'to': (end - timedelta(days=1)).isoformat(),
+        'data': [{'day': day.isoformat(), 'shows': shows} for day, shows in counts],
+    })
@@ -3,20 +3,43 @@
 #----------------------------------------------------------------------------#
 
 import json
+import re
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for,jsonify
+from flask import Flask, render_template, stream_template, request, Response, flash, redirect, url_for,jsonify, abort
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
-from models import db, Artist, Venue, Show
+from models import db, Artist, Venue, Show, parse_genres
+from counters import counters_cli
+from search import search
+from pagination import paginate
+from cache import page_cache
+from queries import get_venue_data, get_artist_data, show_listing, filter_listing, filter_shows
+from api import api
+from analyze import db_analyze_command
+from transfer import fyyur_cli
+from archive import archive_cli
+from calendars import calendar_cli, calendar_shows, feed_start, ical
+import metrics
+import profiling
+import replicas
+import assets
+import autocomplete
+from schedule import ScheduleConflict
+from summaries import TRENDING_DAYS, summaries_cli, top_areas, trending_artists
+from conditional import (
+    conditional, current_version, venues_version, artists_version, shows_version, venue_version, artist_version
+)
 from flask_migrate import Migrate
 from babel import dates
 from datetime import datetime
-from sqlalchemy import func
+from functools import lru_cache
+from itertools import groupby
+from sqlalchemy import and_, distinct, func, select, tuple_
 
 
 #----------------------------------------------------------------------------#
@@ -26,9 +49,22 @@ from sqlalchemy import func
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
+replicas.init_app(app)
+metrics.init_app(app)
+profiling.init_app(app)
 
 db.init_app(app)
 migrate = Migrate(app, db)
+app.cli.add_command(counters_cli)
+app.cli.add_command(db_analyze_command)
+app.cli.add_command(fyyur_cli)
+app.cli.add_command(calendar_cli)
+app.cli.add_command(archive_cli)
+app.cli.add_command(summaries_cli)
+page_cache.init_app(app)
+assets.init_app(app)
+autocomplete.init_app(app)
+app.register_blueprint(api)
 
 
 
@@ -40,14 +76,71 @@ migrate = Migrate(app, db)
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(datetime, format='medium'):
-    date = dateutil.parser.parse(datetime)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    formatted_date = dates.format_datetime(date, format=format, locale='en')
-    return formatted_date
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+def _name_field(field, locale, samples, index):
+    # Names come from Babel itself, formatted once for every value they can take
+    pattern = dates.parse_pattern(field)
+    names = {index(sample): pattern.apply(sample, locale) for sample in samples}
+    return lambda value: names[index(value)]
+
+
+def _number_field(width, number):
+    return lambda value: str(number(value)).zfill(width)
+
+
+def _compile_field(field, locale):
+    # A fast formatter for one pattern field, or None when Babel has to format it
+    letter, width = field[0], len(field)
+    if letter == 'E':
+        return _name_field(field, locale, [datetime(2001, 1, day) for day in range(1, 8)], datetime.weekday)
+    if letter == 'M':
+        if width >= 3:
+            return _name_field(field, locale, [datetime(2001, month, 1) for month in range(1, 13)], lambda value: value.month)
+        return _number_field(width, lambda value: value.month)
+    if letter == 'a':
+        return _name_field(field, locale, [datetime(2001, 1, 1, 0), datetime(2001, 1, 1, 12)], lambda value: value.hour >= 12)
+    if letter == 'y':
+        return _number_field(width, lambda value: value.year % 100 if width == 2 else value.year)
+    numbers = {
+        'd': lambda value: value.day,
+        'h': lambda value: value.hour % 12 or 12,
+        'H': lambda value: value.hour,
+        'm': lambda value: value.minute,
+        's': lambda value: value.second,
+    }
+    if letter in numbers:
+        return _number_field(width, numbers[letter])
+    return None
+
+
+@lru_cache(maxsize=None)
+def datetime_pattern(format, locale):
+    """Compile a Babel pattern into a function of a datetime, once per (format, locale)."""
+    pattern = dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+    locale = babel.Locale.parse(locale)
+    fields = {field: _compile_field(field, locale) for field in re.findall(r'%\((\w+)\)s', pattern.format)}
+    if None in fields.values():
+        return lambda value: pattern.apply(value, locale)
+    template = pattern.format
+    return lambda value: template % {field: formatter(value) for field, formatter in fields.items()}
+
+
+def format_datetime(value, format='medium', locale='en'):
+    # Accept datetimes directly, parse ISO strings without dateutil where possible
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            value = dateutil.parser.parse(value)
+    if format in ('short', 'long'):
+        # Babel's named formats combine the locale's date and time formats
+        return dates.format_datetime(value, format=format, locale=locale)
+    return datetime_pattern(format, locale)(value)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
@@ -58,138 +151,146 @@ app.jinja_env.filters['datetime'] = format_datetime
 
 @app.route('/')
 def index():
-  return render_template('pages/home.html')
+    # The busiest cities and trending artists as of the last summaries refresh, one small query each
+    return render_template(
+        'pages/home.html',
+        areas=top_areas(app.config['TOP_AREAS']),
+        artists=trending_artists(app.config['TRENDING_ARTISTS']),
+        trending_days=TRENDING_DAYS
+    )
 
 
 #  Venues
 #  ----------------------------------------------------------------
 
+def upcoming_shows(now):
+    # The join condition matching each venue to its shows that have not started by now
+    return and_(Show.venue_id == Venue.id, Show.start_time >= now)
+
+
+def venue_rows(query, now):
+    # Venue rows with their upcoming show counts, grouped from the live shows over ix_Show_venue_id_start_time
+    return query.add_columns(func.count(Show.id).label('num_upcoming_shows')).outerjoin(
+        Show, upcoming_shows(now)
+    ).group_by(Venue.id)
+
+
+def area_totals(now, areas=None):
+    # Venue and upcoming show totals of the given (city, state) pairs, or of every area, counted as of
+    # the same now as the venue rows so each heading always adds up to its area's venues
+    query = select(
+        Venue.city, Venue.state, func.count(distinct(Venue.id)).label('venues'),
+        func.count(Show.id).label('upcoming_shows')
+    ).select_from(Venue).outerjoin(Show, upcoming_shows(now)).group_by(Venue.state, Venue.city)
+    if areas is not None:
+        query = query.where(tuple_(Venue.state, Venue.city).in_([(state, city) for city, state in areas]))
+    return query
+
+
+def venue_areas(venues, totals):
+    # Group the venues by city and state in a single pass, with each area's totals
+    areas = {}
+    for venue in venues:
+        area = areas.get((venue.city, venue.state))
+        if area is None:
+            area = areas[(venue.city, venue.state)] = area_data(venue.city, venue.state, totals)
+            area['venues'] = []
+        area['venues'].append({
+            'id': venue.id,
+            'name': venue.name,
+            'num_upcoming_shows': venue.num_upcoming_shows
+        })
+
+    return list(areas.values())
+
+
+def area_data(city, state, totals):
+    # The area's venue and upcoming show totals
+    total = totals.get((city, state))
+    return {
+        'city': city,
+        'state': state,
+        'num_venues': total.venues if total else None,
+        'num_upcoming_shows': total.upcoming_shows if total else None,
+    }
+
+
+def get_venue_areas(venues, now):
+    pairs = {(venue.city, venue.state) for venue in venues}
+    totals = {(row.city, row.state): row for row in db.session.execute(area_totals(now, pairs))} if pairs else {}
+    return venue_areas(venues, totals)
+
+
+def stream_venue_areas(args, now):
+    # Read venues through a server-side cursor and group consecutive rows into areas as the template consumes them
+    rows = venue_rows(
+        filter_listing(db.session.query(Venue.id, Venue.name, Venue.city, Venue.state), Venue, args), now
+    ).order_by(Venue.state, Venue.city, Venue.id).yield_per(app.config['STREAM_BATCH_SIZE'])
+    # Every area's totals, read up front as there are far fewer areas than venues
+    totals = {(row.city, row.state): row for row in db.session.execute(area_totals(now))}
+    for (city, state), venues in groupby(rows, key=lambda venue: (venue.city, venue.state)):
+        yield {
+            **area_data(city, state, totals),
+            'venues': ({
+                'id': venue.id,
+                'name': venue.name,
+                'num_upcoming_shows': venue.num_upcoming_shows
+            } for venue in venues)
+        }
+
+
 @app.route('/venues')
+@conditional(venues_version)
 def venues():
-    # Query all venues from the database
-    venues = Venue.query.all()
+    # Upcoming show counts, of the venues and of their areas, are counted from the shows as of one moment,
+    # so they drop as soon as a show starts rather than when the stored counters are next rolled over
+    now = datetime.now()
+    if request.args.get('stream'):
+        return stream_template('pages/venues.html', areas=stream_venue_areas(request.args, now))
+
+    # Load one page of venues, narrowed by genre, city and state, ordered so that each area's venues are listed together
+    page = paginate(
+        venue_rows(filter_listing(
+            db.session.query(Venue.id, Venue.name, Venue.city, Venue.state), Venue, request.args
+        ), now),
+        [Venue.state, Venue.city, Venue.id],
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+    areas = get_venue_areas(page.items, now)
 
-    # Create a dictionary to store the venue data grouped by city and state
-    data = []
-    
-    # Iterate over the venues and group them by city and state
-    for venue in venues:
-        found = False
-        for item in data:
-            if item['city'] == venue.city and item['state'] == venue.state:
-                item['venues'].append({
-                    'id': venue.id,
-                    'name': venue.name,
-                    'num_upcoming_shows': 0  # Placeholder for now, update as needed
-                })
-                found = True
-                break
-        if not found:
-            data.append({
-                'city': venue.city,
-                'state': venue.state,
-                'venues': [{
-                    'id': venue.id,
-                    'name': venue.name,
-                    'num_upcoming_shows': 0  # Placeholder for now, update as needed
-                }]
-            })
-
-    return render_template('pages/venues.html', areas=data)
+    if request.args.get('format') == 'json':
+        return jsonify({'data': areas, 'next': page.next_cursor, 'previous': page.prev_cursor})
+    return render_template('pages/venues.html', areas=areas, page=page)
 
 
 @app.route('/venues/search', methods=['POST'])
+@replicas.read_only
 def search_venues():
     # Get the search term from the form data
     search_term = request.form.get('search_term', '')
 
-    # Perform case-insensitive search for venues matching the search term
-    venues = Venue.query.filter(Venue.name.ilike(f'%{search_term}%')).all()
+    # Rank venues by name, city, state and genres through the search index, optionally within one genre
+    results = search(Venue, search_term, genre=request.values.get('genre'))
 
     # Create the response data
     response = {
-        "count": len(venues),
-        "data": [{
-            "id": venue.id,
-            "name": venue.name,
-            "num_upcoming_shows": 0  # Placeholder for now, update as needed
-        } for venue in venues]
+        "count": len(results),
+        "data": results
     }
 
     return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
 
 @app.route('/venues/<int:venue_id>')
+@conditional(venue_version)
 def show_venue(venue_id):
-    # Retrieve the venue data based on the venue_id from the database or any other data source
-    venue = Venue.query.get(venue_id)
+    data = page_cache.get_or_set(f'venue:{venue_id}', lambda: get_venue_data(venue_id), current_version())
 
     # Check if the venue exists
-    if not venue:
+    if not data:
         return render_template('errors/404.html')
 
-    # Retrieve the venue's past shows
-    past_shows = db.session.query(Show).join(Artist).filter(
-        Show.venue_id == venue_id,
-        Show.start_time < datetime.now()
-    ).all()
-
-    # Retrieve the venue's upcoming shows
-    upcoming_shows = db.session.query(Show).join(Artist).filter(
-        Show.venue_id == venue_id,
-        Show.start_time >= datetime.now()
-    ).all()
-
-    # Calculate the counts of past and upcoming shows
-    past_shows_count = len(past_shows)
-    upcoming_shows_count = len(upcoming_shows)
-
-    # Create the response data
-    data = {
-        "id": venue.id,
-        "name": venue.name,
-        "genres": venue.genres.split(',') if venue.genres else [],
-        "address": venue.address,
-        "city": venue.city,
-        "state": venue.state,
-        "phone": venue.phone,
-        "website": venue.website,
-        "facebook_link": venue.facebook_link,
-        "seeking_talent": venue.seeking_talent,
-        "image_link": venue.image_link,
-        "past_shows": [],  # Placeholder for now, update as needed
-        "upcoming_shows": [],  # Placeholder for now, update as needed
-        "past_shows_count": past_shows_count,
-        "upcoming_shows_count": upcoming_shows_count
-    }
-    
-    if hasattr(venue, 'seeking_description'):
-        data['seeking_description'] = venue.seeking_description
-    else:
-        data['seeking_description'] = None
-
-    # Populate the past shows data
-    for show in past_shows:
-        artist = show.artist
-        past_show = {
-            "artist_id": artist.id,
-            "artist_name": artist.name,
-            "artist_image_link": artist.image_link,
-            "start_time": show.start_time.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
-        }
-        data["past_shows"].append(past_show)
-
-    # Populate the upcoming shows data
-    for show in upcoming_shows:
-        artist = show.artist
-        upcoming_show = {
-            "artist_id": artist.id,
-            "artist_name": artist.name,
-            "artist_image_link": artist.image_link,
-            "start_time": show.start_time.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
-        }
-        data["upcoming_shows"].append(upcoming_show)
-
     return render_template('pages/show_venue.html', venue=data)
 
 
@@ -209,7 +310,7 @@ def create_venue_submission():
     state = request.form.get('state')
     address = request.form.get('address')
     phone = request.form.get('phone')
-    genres = request.form.get('genres')
+    genres = request.form.getlist('genres')
     image_link = request.form.get('image_link')
     facebook_link = request.form.get('facebook_link')
     
@@ -240,8 +341,8 @@ def create_venue_submission():
         # Redirect to the homepage
         return redirect(url_for('index'))
 
-    except Exception as e:
-        print(e)
+    except Exception:
+        app.logger.exception('Venue %s could not be listed', name)
         # Rollback the session in case of any error
         db.session.rollback()
 
@@ -281,116 +382,59 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@conditional(artists_version)
 def artists():
-    # Retrieve artists from the database
-    artists = Artist.query.all()
-
-    # Create a list to store the artist data
-    data = []
-
-    # Iterate over the artists and populate the data list
-    for artist in artists:
-        artist_data = {
+    # Stream every artist when asked to
+    if request.args.get('stream'):
+        rows = filter_listing(db.session.query(Artist.id, Artist.name), Artist, request.args).order_by(Artist.id).yield_per(app.config['STREAM_BATCH_SIZE'])
+        return stream_template('pages/artists.html', artists=({
             "id": artist.id,
             "name": artist.name,
-        }
-        data.append(artist_data)
+        } for artist in rows))
+
+    # Retrieve one page of artists from the database, narrowed by genre, city and state
+    page = paginate(
+        filter_listing(db.session.query(Artist.id, Artist.name), Artist, request.args),
+        [Artist.id],
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+
+    # Create a list to store the artist data
+    data = [{
+        "id": artist.id,
+        "name": artist.name,
+    } for artist in page.items]
 
-    return render_template('pages/artists.html', artists=data)
+    if request.args.get('format') == 'json':
+        return jsonify({'data': data, 'next': page.next_cursor, 'previous': page.prev_cursor})
+    return render_template('pages/artists.html', artists=data, page=page)
 
 
 @app.route('/artists/search', methods=['POST'])
+@replicas.read_only
 def search_artists():
     # Get the search term from the form
     search_term = request.form.get('search_term', '')
 
-    # Perform case-insensitive search on artists' names
-    artists = Artist.query.filter(Artist.name.ilike(f"%{search_term}%")).all()
-
-    # Create a list to store the search results
-    data = []
-
-    # Iterate over the artists and populate the data list
-    for artist in artists:
-        artist_data = {
-            "id": artist.id,
-            "name": artist.name,
-            "num_upcoming_shows": 0,  
-        }
-        data.append(artist_data)
+    # Rank artists by name, city, state and genres through the search index, optionally within one genre
+    results = search(Artist, search_term, genre=request.values.get('genre'))
 
     response = {
-        "count": len(data),
-        "data": data
+        "count": len(results),
+        "data": results
     }
 
     return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
 
 @app.route('/artists/<int:artist_id>')
+@conditional(artist_version)
 def show_artist(artist_id):
-    # Query the artist from the database using the artist_id
-    artist = Artist.query.get(artist_id)
+    data = page_cache.get_or_set(f'artist:{artist_id}', lambda: get_artist_data(artist_id), current_version())
 
     # Check if the artist exists
-    if artist:
-        # Retrieve the artist's past shows
-        past_shows = db.session.query(Show).join(Venue).filter(
-            Show.artist_id == artist_id,
-            Show.start_time < datetime.now()
-        ).all()
-
-        # Retrieve the artist's upcoming shows
-        upcoming_shows = db.session.query(Show).join(Venue).filter(
-            Show.artist_id == artist_id,
-            Show.start_time >= datetime.now()
-        ).all()
-
-        # Calculate the counts of past and upcoming shows
-        past_shows_count = len(past_shows)
-        upcoming_shows_count = len(upcoming_shows)
-
-        # Convert the artist data to a dictionary
-        data = {
-            "id": artist.id,
-            "name": artist.name,
-            "genres": artist.genres.split(',') if artist.genres else [],
-            "city": artist.city,
-            "state": artist.state,
-            "phone": artist.phone,
-            "website": artist.website,
-            "facebook_link": artist.facebook_link,
-            "seeking_venue": artist.seeking_venue,
-            "seeking_description": artist.seeking_description,
-            "image_link": artist.image_link,
-            "past_shows": [],  # Placeholder for now, update as needed
-            "upcoming_shows": [],  # Placeholder for now, update as needed
-            "past_shows_count": past_shows_count,
-            "upcoming_shows_count": upcoming_shows_count,
-        }
-
-        # Populate the past shows data
-        for show in past_shows:
-            venue = show.venue
-            past_show = {
-                "venue_id": venue.id,
-                "venue_name": venue.name,
-                "venue_image_link": venue.image_link,
-                "start_time": show.start_time.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
-            }
-            data["past_shows"].append(past_show)
-
-        # Populate the upcoming shows data
-        for show in upcoming_shows:
-            venue = show.venue
-            upcoming_show = {
-                "venue_id": venue.id,
-                "venue_name": venue.name,
-                "venue_image_link": venue.image_link,
-                "start_time": show.start_time.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
-            }
-            data["upcoming_shows"].append(upcoming_show)
-
+    if data:
         return render_template('pages/show_artist.html', artist=data)
     else:
         flash('Artist not found')
@@ -410,7 +454,7 @@ def edit_artist(artist_id):
     if artist:
         # Populate the form with artist data
         form.name.data = artist.name
-        form.genres.data = artist.genres
+        form.genres.data = parse_genres(artist.genres)
         form.city.data = artist.city
         form.state.data = artist.state
         form.phone.data = artist.phone
@@ -469,7 +513,7 @@ def edit_venue(venue_id):
     if venue:
         # Populate the form with the venue's attributes
         form.name.data = venue.name
-        form.genres.data = venue.genres
+        form.genres.data = parse_genres(venue.genres)
         form.address.data = venue.address
         form.city.data = venue.city
         form.state.data = venue.state
@@ -571,30 +615,62 @@ def create_artist_submission():
 
 
 
+#  Autocomplete
+#  ----------------------------------------------------------------
+
+@app.route('/autocomplete')
+def autocomplete_names():
+    # Suggestions for the search boxes as the user types, served from the in-memory name indexes
+    types = request.args.getlist('type') or None
+    if types and any(kind not in autocomplete.MODELS for kind in types):
+        abort(400)
+    limit = min(request.args.get('limit', autocomplete.DEFAULT_LIMIT, type=int), autocomplete.MAX_LIMIT)
+    return jsonify({'data': autocomplete.suggest(request.args.get('q', ''), types, limit)})
+
+
 #  Shows
 #  ----------------------------------------------------------------
 
+def show_data(show):
+    return {
+        "venue_id": show.venue_id,
+        "venue_name": show.venue_name,
+        "artist_id": show.artist_id,
+        "artist_name": show.artist_name,
+        "artist_image_link": show.artist_image_link,
+        "start_time": show.start_time
+    }
+
+
 @app.route('/shows')
+@conditional(shows_version)
 def shows():
-    # Retrieve the list of shows from the database
-    shows = Show.query.join(Artist, Artist.id == Show.artist_id).join(Venue, Venue.id == Show.venue_id).all()
+    # Narrowed to a ?from= and ?to= window, a city, state or genre when given
+    try:
+        query = filter_shows(show_listing(), request.args)
+    except ValueError:
+        abort(400)
+
+    # Stream every show in chronological order when asked to
+    if request.args.get('stream'):
+        rows = query.order_by(Show.start_time, Show.id).yield_per(app.config['STREAM_BATCH_SIZE'])
+        return stream_template('pages/shows.html', shows=(show_data(show) for show in rows))
+
+    # Retrieve one page of shows in chronological order
+    page = paginate(
+        query,
+        [Show.start_time, Show.id],
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
 
     # Create a list to store the show data
-    data = []
-
-    # Iterate over each show and extract the required information
-    for show in shows:
-        show_data = {
-            "venue_id": show.venue.id,
-            "venue_name": show.venue.name,
-            "artist_id": show.artist.id,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": str(show.start_time)  # Convert datetime object to string
-        }
-        data.append(show_data)
+    data = [show_data(show) for show in page.items]
 
-    return render_template('pages/shows.html', shows=data)
+    if request.args.get('format') == 'json':
+        data = [dict(show, start_time=show['start_time'].isoformat()) for show in data]
+        return jsonify({'data': data, 'next': page.next_cursor, 'previous': page.prev_cursor})
+    return render_template('pages/shows.html', shows=data, page=page)
 
 
 @app.route('/shows/create')
@@ -617,7 +693,8 @@ def create_show_submission():
             show = Show(
                 artist_id=form.artist_id.data,
                 venue_id=form.venue_id.data,
-                start_time=form.start_time.data
+                start_time=form.start_time.data,
+                end_time=form.end_time.data
             )
 
             # Add the show to the session and commit the changes to the database
@@ -627,11 +704,14 @@ def create_show_submission():
             # on successful db insert, flash success
             flash('Show was successfully listed!')
             return render_template('pages/home.html')
-        except Exception as e:
-            # TODO: on unsuccessful db insert, flash an error instead.
-            # e.g., flash('An error occurred. Show could not be listed.')
-            flash('An error occurred. Show could not be listed: {}'.format(str(e)))
+        except ScheduleConflict as e:
+            db.session.rollback()
+            flash('Show could not be listed. {}'.format(e))
+            return render_template('pages/home.html')
+        except Exception:
             db.session.rollback()
+            app.logger.exception('Show could not be listed')
+            flash('An error occurred. Show could not be listed.')
             return render_template('pages/home.html')
         finally:
             db.session.close()
@@ -641,6 +721,53 @@ def create_show_submission():
         return render_template('pages/home.html')
 
 
+#  Calendars
+#  ----------------------------------------------------------------
+
+def ical_response(name, shows, url):
+    response = Response(ical(name, shows, request.host, url), mimetype='text/calendar')
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@app.route('/venues/<int:venue_id>/calendar.ics')
+def venue_calendar(venue_id):
+    # The venue's shows as an iCal feed to subscribe to
+    venue = db.session.get(Venue, venue_id) or abort(404)
+    return ical_response(
+        venue.name, calendar_shows(Show.venue_id, venue_id, feed_start()),
+        url_for('show_venue', venue_id=venue_id, _external=True)
+    )
+
+
+@app.route('/artists/<int:artist_id>/calendar.ics')
+def artist_calendar(artist_id):
+    # The artist's shows as an iCal feed to subscribe to
+    artist = db.session.get(Artist, artist_id) or abort(404)
+    return ical_response(
+        artist.name, calendar_shows(Show.artist_id, artist_id, feed_start()),
+        url_for('show_artist', artist_id=artist_id, _external=True)
+    )
+
+
+#  Cache
+#  ----------------------------------------------------------------
+
+@app.route('/cache/stats')
+def cache_stats():
+    # Hit, miss and eviction counters of this worker's page cache
+    return jsonify(page_cache.stats())
+
+
+@app.route('/metrics')
+def metrics_view():
+    # Pool state and per-endpoint SQL counters of this worker, for Prometheus or as JSON
+    snapshot = metrics.metrics.snapshot(db.engines)
+    if request.args.get('format') == 'json':
+        return jsonify(snapshot)
+    return Response(metrics.prometheus(snapshot), mimetype='text/plain; version=0.0.4')
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
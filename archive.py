@@ -0,0 +1,249 @@
+"""
+Show partitions and the show archive
+
+    flask archive partitions [--ahead 3]
+    flask archive shows [--keep-months 24] [--file shows.ndjson]
+
+On Postgres, Show is partitioned by month of start_time, so queries for
+upcoming shows only read the partitions of the current and coming
+months, however many years of history there are. partitions creates the
+partitions of the next --ahead months. Shows booked further out land in
+Show_later and are moved into their month's partition when it is
+created. Run it from cron, e.g. daily.
+
+shows archives the shows of the months before the last --keep-months.
+On Postgres, whole monthly partitions are detached CONCURRENTLY (Postgres
+14 and later), so reads and writes of Show carry on meanwhile, then
+emptied and dropped.
+Shows that are not in a monthly partition, and every show on other
+databases, are moved a batch at a time. By default archived shows move to
+ShowArchive, a compact table of their ids, venue, artist and times. The
+venue and artist pages still list them among past shows, through
+queries.show_history. With --file they are written to newline-delimited
+JSON instead, which `flask fyyur import shows` reads back, and leave the
+database. Archived shows are taken out of the show counters, the calendar
+day counts and the /shows listing.
+"""
+# Imports
+
+import json
+import re
+from collections import Counter
+from datetime import date, datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import column, delete, insert, select, table, text
+
+from cache import page_cache
+from calendars import add_days
+from counters import count_new_shows
+from models import db, Show, ShowArchive
+from schedule import clear_index
+
+# Shows moved per batch and commit
+BATCH_SIZE = 5000
+
+ARCHIVED_FIELDS = ('id', 'venue_id', 'artist_id', 'start_time', 'end_time')
+
+# Monthly partitions are named after their month, e.g. Show_2026_10
+PARTITION_NAME = re.compile(r'^Show_(\d{4})_(\d{2})$')
+
+# How long creating a partition waits for its lock on Show before giving up until the next run,
+# rather than queueing every read of Show behind it
+PARTITION_LOCK_TIMEOUT = '5s'
+
+
+def add_months(month, months):
+    """The first day of the month months after the month of a date."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'Show_{month.year:04d}_{month.month:02d}'
+
+
+#----------------------------------------------------------------------------#
+# Partitions.
+#----------------------------------------------------------------------------#
+
+def is_partitioned(connection):
+    """Whether Show is a partitioned Postgres table."""
+    if connection.dialect.name != 'postgresql':
+        return False
+    return connection.execute(text(
+        """SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = '"Show"'::regclass)"""
+    )).scalar()
+
+
+def monthly_tables(connection):
+    """{month: (table name, whether it is attached, whether a detach is pending)} of the monthly tables.
+
+    Detached tables left behind by an interrupted archive run are included.
+    """
+    rows = connection.execute(text(
+        """SELECT c.relname, i.inhparent IS NOT NULL, coalesce(i.inhdetachpending, false) FROM pg_class c
+           LEFT JOIN pg_inherits i ON i.inhrelid = c.oid AND i.inhparent = '"Show"'::regclass
+           WHERE c.relkind = 'r' AND c.relnamespace = current_schema()::regnamespace AND c.relname LIKE 'Show\\_%'"""
+    ))
+    tables = {}
+    for name, attached, pending in rows:
+        match = PARTITION_NAME.match(name)
+        if match:
+            tables[date(int(match[1]), int(match[2]), 1)] = (name, attached, pending)
+    return tables
+
+
+def add_booking_constraints(connection, name):
+    # Exclusion constraints cannot span a partitioned table, so each partition forbids overlapping bookings
+    # of its own shows, and the show_booking_overlap trigger on Show those of shows in different months
+    if not connection.execute(text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'btree_gist')")).scalar():
+        return
+    for side in ('venue', 'artist'):
+        connection.execute(text(
+            f'ALTER TABLE "{name}" ADD CONSTRAINT "ex_{name}_{side}_booking" '
+            f'EXCLUDE USING gist ({side}_id WITH =, tsrange(start_time, end_time) WITH &&)'
+        ))
+
+
+def create_partition(connection, month):
+    """Create the partition of a month, the first after the existing ones, moving its shows out of Show_later."""
+    name = partition_name(month)
+    following = add_months(month, 1).isoformat()
+    bounds = f"FROM ('{month.isoformat()}') TO ('{following}')"
+    later = f"FROM ('{following}') TO (MAXVALUE)"
+    window = f"start_time >= '{month.isoformat()}' AND start_time < '{following}'"
+    # Show_later starts at the month until it is split off. The detach is not CONCURRENTLY, so
+    # that it is reattached in the same transaction and later bookings always have a partition
+    connection.execute(text(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'"))
+    connection.execute(text('ALTER TABLE "Show" DETACH PARTITION "Show_later"'))
+    connection.execute(text(f'CREATE TABLE "{name}" PARTITION OF "Show" FOR VALUES {bounds}'))
+    connection.execute(text(f'INSERT INTO "Show" SELECT * FROM "Show_later" WHERE {window}'))
+    connection.execute(text(f'DELETE FROM "Show_later" WHERE {window}'))
+    connection.execute(text(f'ALTER TABLE "Show" ATTACH PARTITION "Show_later" FOR VALUES {later}'))
+    add_booking_constraints(connection, name)
+
+
+def create_partitions(ahead, today=None):
+    """Create the missing partitions up to the next ahead months, returning their names.
+
+    Months are split off Show_later in order, from the one after the last
+    partition, so months missed while the job did not run are created too.
+    """
+    connection = db.session.connection()
+    if not is_partitioned(connection):
+        return []
+    last = add_months((today or date.today()).replace(day=1), ahead)
+    attached = [month for month, (name, attached, pending) in monthly_tables(connection).items() if attached]
+    start = add_months(max(attached), 1) if attached else (today or date.today()).replace(day=1)
+    created = []
+    while start <= last:
+        create_partition(connection, start)
+        created.append(partition_name(start))
+        start = add_months(start, 1)
+    db.session.commit()
+    return created
+
+
+#----------------------------------------------------------------------------#
+# Archiving.
+#----------------------------------------------------------------------------#
+
+def archive_batch(rows, file=None):
+    """Move rows of shows already taken out of Show to the archive or the file, and uncount them."""
+    if file is not None:
+        for row in rows:
+            file.write(json.dumps({field: row[field] for field in ARCHIVED_FIELDS}, default=datetime.isoformat) + '\n')
+    else:
+        db.session.execute(insert(ShowArchive.__table__), [{field: row[field] for field in ARCHIVED_FIELDS} for row in rows])
+
+    # The shows left through bulk statements, bypassing the session events
+    count_new_shows(
+        (venue_id, artist_id, is_upcoming, -count) for (venue_id, artist_id, is_upcoming), count in
+        Counter((row['venue_id'], row['artist_id'], row['is_upcoming']) for row in rows).items()
+    )
+    days = Counter((row['start_time'].date(), row['venue_id']) for row in rows)
+    add_days(db.session.connection(), {key: -count for key, count in days.items()})
+
+
+def move_rows(source, before, file=None, batch_size=BATCH_SIZE):
+    # Move the shows of a table starting before the cutoff a batch at a time, committing each batch,
+    # so an interrupted run leaves every show in exactly one place and can be repeated
+    moved = 0
+    while True:
+        rows = db.session.execute(
+            select(*(source.c[field] for field in ARCHIVED_FIELDS + ('is_upcoming',)))
+            .where(source.c.start_time < before).order_by(source.c.id).limit(batch_size)
+        ).mappings().all()
+        if not rows:
+            return moved
+        db.session.execute(delete(source).where(source.c.id.in_([row['id'] for row in rows])))
+        archive_batch(rows, file)
+        db.session.commit()
+        if file is not None:
+            file.flush()
+        moved += len(rows)
+
+
+def archive_shows(before, file=None, batch_size=BATCH_SIZE):
+    """Archive the shows starting before a date, returning how many were archived."""
+    connection = db.session.connection()
+    moved = 0
+    if is_partitioned(connection):
+        for month, (name, attached, pending) in sorted(monthly_tables(connection).items()):
+            if datetime.combine(add_months(month, 1), datetime.min.time()) > before:
+                continue
+            # Detaching takes the whole month out of Show at once. CONCURRENTLY only locks Show against
+            # other schema changes but cannot run in a transaction, so it runs on its own autocommit
+            # connection. A detach left pending, or a partition left detached, by an interrupted run is
+            # finished, emptied and dropped on the next one
+            if attached:
+                db.session.commit()
+                with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as autocommit:
+                    autocommit.execute(text(
+                        f'ALTER TABLE "Show" DETACH PARTITION "{name}" {"FINALIZE" if pending else "CONCURRENTLY"}'
+                    ))
+            partition = table(name, *(column(field) for field in ARCHIVED_FIELDS + ('is_upcoming',)))
+            moved += move_rows(partition, before, file, batch_size)
+            db.session.execute(text(f'DROP TABLE "{name}"'))
+            db.session.commit()
+    moved += move_rows(Show.__table__, before, file, batch_size)
+
+    if moved:
+        # The schedule index and the cached pages still hold the archived shows
+        clear_index()
+        page_cache.clear()
+    return moved
+
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+archive_cli = AppGroup('archive', help='Maintain the show partitions and archive old shows.')
+
+
+@archive_cli.command('partitions')
+@click.option('--ahead', type=int, help='Months to create partitions for after the current one.')
+def partitions_command(ahead):
+    """Create the monthly Show partitions of the coming months (Postgres)."""
+    if not is_partitioned(db.session.connection()):
+        click.echo('Show is not partitioned, nothing to do.')
+        return
+    created = create_partitions(current_app.config['SHOW_PARTITIONS_AHEAD'] if ahead is None else ahead)
+    click.echo(f'Created {len(created)} partitions' + (f": {', '.join(created)}." if created else '.'))
+
+
+@archive_cli.command('shows')
+@click.option('--keep-months', type=int, help='Months before the current one whose shows stay in Show.')
+@click.option('--file', type=click.File('a', encoding='utf-8'), help='Write the shows to this NDJSON file instead.')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True, help='Shows per batch and commit.')
+def archive_command(keep_months, file, batch_size):
+    """Archive the shows of the months before the kept ones."""
+    keep_months = current_app.config['ARCHIVE_AFTER_MONTHS'] if keep_months is None else keep_months
+    before = add_months(date.today().replace(day=1), -keep_months)
+    moved = archive_shows(datetime.combine(before, datetime.min.time()), file, batch_size)
+    target = file.name if file is not None else 'ShowArchive'
+    click.echo(f'Archived {moved} shows starting before {before.isoformat()} to {target}.')
@@ -0,0 +1,304 @@
+"""
+ASGI entry point serving the read pages with SQLAlchemy's asyncio engine
+
+    uvicorn asgi:application --workers 4
+
+The venue, artist and show listings and the venue and artist pages are
+served here without a thread per request, and a detail page runs its
+entity, past show and upcoming show queries concurrently on separate
+connections. The searches run the regular search in a worker thread,
+since the in-process index is plain Python. Everything else, including
+?stream=1 listings and all writes, is handed to the Flask app unchanged.
+
+The app's before_request, after_request and teardown hooks run around
+these views as around Flask's, so reads are routed to the same replica
+the app would pick (see replicas.py) and the requests are counted in
+/metrics, and the views carry the same conditional validators. The
+validators and searches are synchronous and run in a worker thread.
+Checkout waits of the async pools are not timed.
+
+Needs sqlalchemy[asyncio], an async driver (asyncpg for Postgres,
+aiosqlite for SQLite), asgiref and uvicorn, as listed in
+requirements-optional.txt. ASYNC_DATABASE_URL overrides the async form
+of SQLALCHEMY_DATABASE_URI.
+"""
+# Imports
+
+import asyncio
+import os
+from datetime import datetime
+from urllib.parse import parse_qsl
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import flash, jsonify, redirect, render_template, request, url_for
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.exceptions import BadRequest, HTTPException
+
+from app import app, area_totals, filter_listing, show_data, venue_areas, venue_rows
+from cache import page_cache
+from conditional import (
+    conditional, current_version, venues_version, artists_version, shows_version, venue_version, artist_version
+)
+from models import db, Artist, Show, Venue
+from pagination import page_query
+from queries import artist_data, artist_shows, filter_shows, show_listing, venue_data, venue_shows
+from replicas import replica_binds
+from search import search
+
+# Async drivers for the synchronous database URLs
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+
+def async_url(url):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+def async_engine(url, options):
+    return create_async_engine(url, **{
+        option: value for option, value in options.items()
+        if option in ('pool_size', 'max_overflow', 'pool_timeout', 'pool_pre_ping', 'pool_recycle')
+    })
+
+
+engine = async_engine(
+    os.environ.get('ASYNC_DATABASE_URL') or async_url(app.config['SQLALCHEMY_DATABASE_URI']),
+    app.config['SQLALCHEMY_ENGINE_OPTIONS']
+)
+
+# An async engine per replica bind, by bind key
+replica_engines = {
+    key: async_engine(async_url(app.config['SQLALCHEMY_BINDS'][key]['url']), app.config['SQLALCHEMY_BINDS'][key])
+    for key in replica_binds(app)
+}
+
+
+def reader():
+    # The async engine of the replica the app routed this request to, or the primary's
+    replica = db.session().info.get('replica')
+    for key, replica_engine in replica_engines.items():
+        if db.engines[key] is replica:
+            return replica_engine
+    return engine
+
+
+def table_columns(*attributes):
+    # Rows read through a Core connection are keyed by the table columns, not the mapped attributes
+    return [attribute.property.columns[0] for attribute in attributes]
+
+
+async def fetch_all(statement, source=None):
+    # Each statement gets its own connection, so statements gathered together run concurrently
+    async with (source or reader()).connect() as connection:
+        return (await connection.execute(statement)).all()
+
+
+async def fetch_one(statement, source=None):
+    async with (source or reader()).connect() as connection:
+        return (await connection.execute(statement)).first()
+
+
+#----------------------------------------------------------------------------#
+# Pages.
+#----------------------------------------------------------------------------#
+
+@conditional(venues_version)
+async def venues():
+    now = datetime.now()
+    query, page = page_query(
+        venue_rows(filter_listing(select(Venue.id, Venue.name, Venue.city, Venue.state), Venue, request.args), now),
+        table_columns(Venue.state, Venue.city, Venue.id),
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+    page = page(await fetch_all(query))
+    pairs = {(venue.city, venue.state) for venue in page.items}
+    totals = {(row.city, row.state): row for row in await fetch_all(area_totals(now, pairs))} if pairs else {}
+    areas = venue_areas(page.items, totals)
+
+    if request.args.get('format') == 'json':
+        return jsonify({'data': areas, 'next': page.next_cursor, 'previous': page.prev_cursor})
+    return render_template('pages/venues.html', areas=areas, page=page)
+
+
+@conditional(artists_version)
+async def artists():
+    query, page = page_query(
+        filter_listing(select(Artist.id, Artist.name), Artist, request.args),
+        table_columns(Artist.id),
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+    page = page(await fetch_all(query))
+    data = [{"id": artist.id, "name": artist.name} for artist in page.items]
+
+    if request.args.get('format') == 'json':
+        return jsonify({'data': data, 'next': page.next_cursor, 'previous': page.prev_cursor})
+    return render_template('pages/artists.html', artists=data, page=page)
+
+
+@conditional(shows_version)
+async def shows():
+    try:
+        query = filter_shows(show_listing(), request.args)
+    except ValueError:
+        return BadRequest().get_response()
+    query, page = page_query(
+        query.statement,
+        table_columns(Show.start_time, Show.id),
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+    page = page(await fetch_all(query))
+    data = [show_data(show) for show in page.items]
+
+    if request.args.get('format') == 'json':
+        data = [dict(show, start_time=show['start_time'].isoformat()) for show in data]
+        return jsonify({'data': data, 'next': page.next_cursor, 'previous': page.prev_cursor})
+    return render_template('pages/shows.html', shows=data, page=page)
+
+
+async def detail_data(model, id, shows, build):
+    # The row, its past shows and its upcoming shows, read at the same time from the primary like PageCache.get_or_set
+    key = f'{model.__name__.lower()}:{id}'
+    version = current_version()
+    data = page_cache.get(key, version) if version is not None else None
+    if data is None:
+        now = datetime.now()
+        row, past, upcoming = await asyncio.gather(
+            fetch_one(select(*model.__table__.columns).where(model.id == id), engine),
+            fetch_all(shows(id, now, upcoming=False), engine),
+            fetch_all(shows(id, now, upcoming=True), engine),
+        )
+        if row is None:
+            return None
+        upcoming = [dict(show._mapping) for show in upcoming]
+        data = build(row, [dict(show._mapping) for show in past], upcoming)
+        if version is not None:
+            page_cache.set(key, data, upcoming[0]['start_time'] if upcoming else None, version)
+    return data
+
+
+@conditional(venue_version)
+async def show_venue(venue_id):
+    data = await detail_data(Venue, venue_id, venue_shows, venue_data)
+    if not data:
+        return render_template('errors/404.html')
+    return render_template('pages/show_venue.html', venue=data)
+
+
+@conditional(artist_version)
+async def show_artist(artist_id):
+    data = await detail_data(Artist, artist_id, artist_shows, artist_data)
+    if not data:
+        flash('Artist not found')
+        return redirect(url_for('artists'))
+    return render_template('pages/show_artist.html', artist=data)
+
+
+async def search_page(model, template):
+    search_term = request.form.get('search_term', '')
+    # The thread shares the request's context, and so its session and replica
+    results = await asyncio.to_thread(search, model, search_term, genre=request.values.get('genre'))
+    return render_template(template, results={"count": len(results), "data": results}, search_term=search_term)
+
+
+async def search_venues():
+    return await search_page(Venue, 'pages/search_venues.html')
+
+
+async def search_artists():
+    return await search_page(Artist, 'pages/search_artists.html')
+
+
+# Flask endpoints served here, the rest go to the Flask app
+VIEWS = {
+    'venues': venues,
+    'artists': artists,
+    'shows': shows,
+    'show_venue': show_venue,
+    'show_artist': show_artist,
+    'search_venues': search_venues,
+    'search_artists': search_artists,
+}
+
+
+#----------------------------------------------------------------------------#
+# Application.
+#----------------------------------------------------------------------------#
+
+class Application:
+    """ASGI application answering the read endpoints itself and passing the rest to Flask."""
+
+    def __init__(self, app):
+        self.app = app
+        self.fallback = WsgiToAsgi(app)
+
+    def view(self, scope):
+        # The async view and arguments for the request, or None when Flask should handle it
+        adapter = self.app.url_map.bind('', script_name=scope.get('root_path') or None)
+        try:
+            endpoint, args = adapter.match(scope['path'], method=scope['method'])
+        except HTTPException:
+            return None, None
+        query = dict(parse_qsl(scope['query_string'].decode('latin-1')))
+        if endpoint not in VIEWS or query.get('stream'):
+            return None, None
+        return VIEWS[endpoint], args
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        view, args = self.view(scope) if scope['type'] == 'http' else (None, None)
+        if view is None:
+            return await self.fallback(scope, receive, send)
+
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+
+        # Repeated headers stay separate, except cookies, which HTTP/2 splits and the app reads from one header
+        headers = [(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']]
+        cookies = [value for name, value in headers if name.lower() == 'cookie']
+        if len(cookies) > 1:
+            headers = [(name, value) for name, value in headers if name.lower() != 'cookie']
+            headers.append(('Cookie', '; '.join(cookies)))
+        with self.app.test_request_context(
+            scope['path'],
+            method=scope['method'],
+            query_string=scope['query_string'].decode('latin-1'),
+            headers=headers,
+            data=body,
+        ):
+            response = self.app.preprocess_request()
+            if response is None:
+                response = await view(**args)
+            response = self.app.process_response(self.app.make_response(response))
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [
+                (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers.items()
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': response.get_data()})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for disposed in (engine, *replica_engines.values()):
+                    await disposed.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = Application(app)
@@ -0,0 +1,231 @@
+"""
+Fingerprinted static asset bundles
+
+    flask assets build [--clean]
+
+The stylesheets and scripts every page loads are concatenated into three
+bundles, minified, and written to static/dist under names carrying a hash
+of their content, with a gzip (and, when brotli is installed, a brotli)
+variant next to each. static/dist/manifest.json maps bundle names to the
+built files, and templates link them with asset_url('site.css').
+
+A built file never changes under its name, so it is served with a
+year-long immutable Cache-Control, sending the precompressed variant the
+browser accepts instead of the file itself.
+
+Run the build on deploy. Without a manifest the bundles are built on
+first use, and in debug mode they are rebuilt whenever a source changes.
+Files of earlier builds are kept, so pages rendered before a deploy keep
+working, until build --clean.
+"""
+# Imports
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+import click
+from flask import abort, current_app, request, send_from_directory
+from flask.cli import AppGroup
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+
+# A year, the longest max-age caches are expected to honour
+MAX_AGE = 365 * 24 * 3600
+
+# Bundle name: source files under static/, in load order
+BUNDLES = {
+    'site.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    'head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    'site.js': [
+        'js/libs/jquery-1.11.1.min.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+        'js/script.js',
+    ],
+}
+
+# (file suffix, Content-Encoding) of the precompressed variants, preferred first
+ENCODINGS = [('.br', 'br'), ('.gz', 'gzip')]
+
+CSS_COMMENT = re.compile(r'/\*(?!!).*?\*/', re.S)
+CSS_PUNCTUATION = re.compile(r'\s*([{};,])\s*')
+WHITESPACE = re.compile(r'\s+')
+SOURCE_MAP = re.compile(r'^//[#@] sourceMappingURL=.*$', re.M)
+
+
+#----------------------------------------------------------------------------#
+# Building.
+#----------------------------------------------------------------------------#
+
+def minify_css(text):
+    # Comments other than /*! licences */ and the whitespace around punctuation
+    text = WHITESPACE.sub(' ', CSS_COMMENT.sub('', text))
+    return CSS_PUNCTUATION.sub(r'\1', text).replace(';}', '}').strip()
+
+
+def minify_js(text):
+    # The libraries ship minified and the app's own scripts are a few lines, so
+    # only drop the source map comments, whose maps are not copied alongside
+    return SOURCE_MAP.sub('', text).strip()
+
+
+def bundle(static_folder, name):
+    """The minified content of a bundle."""
+    minify = minify_css if name.endswith('.css') else minify_js
+    parts = []
+    for source in BUNDLES[name]:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as file:
+            parts.append(minify(file.read()))
+    # Scripts are separated so one without a trailing semicolon cannot run into the next
+    return ('\n' if name.endswith('.css') else '\n;\n').join(parts) + '\n'
+
+
+def write(path, content):
+    # Write then rename, so a worker never serves a half written file
+    with open(path + '.tmp', 'wb') as file:
+        file.write(content)
+    os.replace(path + '.tmp', path)
+
+
+def build(static_folder):
+    """Write every bundle with its compressed variants and the manifest, returning the manifest."""
+    dist = os.path.join(static_folder, DIST)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    for name in BUNDLES:
+        content = bundle(static_folder, name).encode()
+        stem, extension = os.path.splitext(name)
+        filename = f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}{extension}'
+        path = os.path.join(dist, filename)
+        if not os.path.exists(path):
+            write(path, content)
+            write(path + '.gz', gzip.compress(content, 9, mtime=0))
+            if brotli is not None:
+                write(path + '.br', brotli.compress(content, quality=11))
+        manifest[name] = filename
+    write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def clean(static_folder, manifest):
+    """Remove the built files the manifest no longer names, returning how many."""
+    dist = os.path.join(static_folder, DIST)
+    keep = {MANIFEST} | {filename + suffix for filename in manifest.values() for suffix in ('', '.gz', '.br')}
+    removed = [name for name in os.listdir(dist) if name not in keep]
+    for name in removed:
+        os.remove(os.path.join(dist, name))
+    return len(removed)
+
+
+def load(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def stale(static_folder):
+    # Whether a source changed after the manifest was written
+    try:
+        built = os.stat(os.path.join(static_folder, DIST, MANIFEST)).st_mtime
+    except OSError:
+        return True
+    return any(
+        os.stat(os.path.join(static_folder, source)).st_mtime > built
+        for sources in BUNDLES.values() for source in sources
+    )
+
+
+#----------------------------------------------------------------------------#
+# Serving.
+#----------------------------------------------------------------------------#
+
+def manifest():
+    """The current manifest, building the bundles when there is none or, in debug mode, it is stale."""
+    state = current_app.extensions['assets']
+    static_folder = current_app.static_folder
+    if state['manifest'] is None:
+        state['manifest'] = load(static_folder)
+    if state['manifest'] is None or (current_app.debug and stale(static_folder)):
+        state['manifest'] = build(static_folder)
+    return state['manifest']
+
+
+def asset_url(name):
+    """URL of the built file of a bundle, e.g. asset_url('site.css')."""
+    return f'{current_app.static_url_path}/{DIST}/{manifest()[name]}'
+
+
+def serve(filename):
+    # Send the best precompressed variant the browser accepts
+    if filename == MANIFEST:
+        abort(404)
+    dist = os.path.join(current_app.static_folder, DIST)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    for suffix, encoding in ENCODINGS:
+        if request.accept_encodings[encoding] and os.path.exists(os.path.join(dist, filename + suffix)):
+            response = send_from_directory(dist, filename + suffix, mimetype=mimetype, max_age=MAX_AGE)
+            response.content_encoding = encoding
+            break
+    else:
+        response = send_from_directory(dist, filename, mimetype=mimetype, max_age=MAX_AGE)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    """Serve the built bundles and add asset_url to the templates."""
+    app.extensions['assets'] = {'manifest': None}
+    # More specific than the static route, so it is matched first
+    app.add_url_rule(f'{app.static_url_path}/{DIST}/<path:filename>', 'asset', serve)
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.cli.add_command(assets_cli)
+
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+assets_cli = AppGroup('assets', help='Build the fingerprinted static bundles.')
+
+
+@assets_cli.command('build')
+@click.option('--clean', 'remove_old', is_flag=True, help='Remove the files of earlier builds.')
+def build_command(remove_old):
+    """Bundle, minify and compress the static assets."""
+    static_folder = current_app.static_folder
+    built = current_app.extensions['assets']['manifest'] = build(static_folder)
+    for name, filename in built.items():
+        sources = sum(os.path.getsize(os.path.join(static_folder, source)) for source in BUNDLES[name])
+        sizes = [
+            f'{os.path.getsize(path)} B {suffix[1:]}'
+            for suffix in ('.gz', '.br') for path in [os.path.join(static_folder, DIST, filename + suffix)]
+            if os.path.exists(path)
+        ]
+        path = os.path.join(static_folder, DIST, filename)
+        click.echo(
+            f'{filename}: {len(BUNDLES[name])} files, {sources} B -> {os.path.getsize(path)} B, ' + ', '.join(sizes)
+        )
+    if remove_old:
+        click.echo(f'Removed {clean(static_folder, built)} files of earlier builds.')
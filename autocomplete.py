@@ -0,0 +1,187 @@
+"""
+Typeahead suggestions over venue and artist names
+
+    GET /autocomplete?q=the+mus&type=venue&limit=10
+
+Each model's names are held in memory in sorted arrays searched with
+bisect, so a suggestion costs two binary searches and a scan of the
+returned names, with no SQL. Names starting with the typed prefix come
+first, then names with a later word starting with it, each alphabetically.
+Matching ignores case and accents.
+
+The indexes are loaded when the app starts (AUTOCOMPLETE_PRELOAD) or on
+first use, and kept current by indexes.py: venues and artists committed
+in this process are applied at once, names committed by other workers or
+bulk imports within INDEX_SYNC_SECONDS.
+"""
+# Imports
+
+import heapq
+import re
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import islice
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from indexes import SyncedIndexes
+from models import Artist, Venue
+
+# Suggestions returned by default and at most
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+# The models suggested, by the name of the type parameter
+MODELS = {'venue': Venue, 'artist': Artist}
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def normalize(value):
+    """Lower-case a name or prefix, strip its accents and collapse its whitespace."""
+    value = value or ''
+    if not value.isascii():
+        value = unicodedata.normalize('NFKD', value)
+        value = ''.join(char for char in value if not unicodedata.combining(char))
+    return ' '.join(value.casefold().split())
+
+
+#----------------------------------------------------------------------------#
+# In-process index.
+#----------------------------------------------------------------------------#
+
+class SortedKeys:
+    """Sorted keys with the id of the row each belongs to, kept in parallel arrays."""
+
+    def __init__(self, entries=()):
+        entries = sorted(entries)
+        self.keys = [key for key, id in entries]
+        self.ids = array('q', (id for key, id in entries))
+
+    def add(self, key, id):
+        position = bisect_right(self.keys, key)
+        self.keys.insert(position, key)
+        self.ids.insert(position, id)
+
+    def remove(self, key, id):
+        position = bisect_left(self.keys, key)
+        while position < len(self.keys) and self.keys[position] == key:
+            if self.ids[position] == id:
+                del self.keys[position]
+                del self.ids[position]
+                return
+            position += 1
+
+    def starting_with(self, prefix):
+        # (key, id) of the keys starting with prefix, in key order
+        position = bisect_left(self.keys, prefix)
+        while position < len(self.keys) and self.keys[position].startswith(prefix):
+            yield self.keys[position], self.ids[position]
+            position += 1
+
+
+def name_keys(name):
+    # The normalized name, and the rest of it from each later word on
+    key = normalize(name)
+    return key, [key[match.start():] for match in islice(WORD_PATTERN.finditer(key), 1, None)]
+
+
+class PrefixIndex:
+    """The names of one model's rows, searchable by the prefix of the name or of any word in it."""
+
+    def __init__(self, rows=()):
+        # Unnamed rows are held with an empty name so the index counts every row
+        self.names = {id: name or '' for id, name in rows}
+        keys = {id: name_keys(name) for id, name in self.names.items() if name}
+        self.full = SortedKeys((key, id) for id, (key, words) in keys.items())
+        self.words = SortedKeys((word, id) for id, (key, words) in keys.items() for word in words)
+        self.lock = threading.Lock()
+
+    def add(self, id, name):
+        with self.lock:
+            self._remove(id)
+            self.names[id] = name or ''
+            if not name:
+                return
+            key, words = name_keys(name)
+            self.full.add(key, id)
+            for word in words:
+                self.words.add(word, id)
+
+    def remove(self, id):
+        with self.lock:
+            self._remove(id)
+
+    def _remove(self, id):
+        name = self.names.pop(id, None)
+        if not name:
+            return
+        key, words = name_keys(name)
+        self.full.remove(key, id)
+        for word in words:
+            self.words.remove(word, id)
+
+    def matches(self, prefix, limit):
+        """Up to limit ((rank, key), id, name) for the names matching a normalized prefix, best first."""
+        found = []
+        seen = set()
+        with self.lock:
+            for rank, keys in enumerate((self.full, self.words)):
+                for key, id in keys.starting_with(prefix):
+                    if len(found) == limit:
+                        return found
+                    if id not in seen:
+                        seen.add(id)
+                        found.append(((rank, key), id, self.names[id]))
+        return found
+
+    def __len__(self):
+        return len(self.names)
+
+
+_indexes = SyncedIndexes(
+    'autocomplete', MODELS.values(),
+    columns=lambda model: (model.id, model.name),
+    factory=PrefixIndex,
+    values=lambda instance: (instance.name,)
+)
+
+
+def get_index(model):
+    # The model's index, built from the database on first use
+    return _indexes.get(model)
+
+
+def clear_indexes():
+    # Drop the built indexes, e.g. after the tables were reloaded outside the session
+    _indexes.clear()
+
+
+def suggest(prefix, types=None, limit=DEFAULT_LIMIT):
+    """Up to limit {'type', 'id', 'name'} suggestions for a prefix, over the given types or all of them."""
+    prefix = normalize(prefix)
+    if not prefix or limit < 1:
+        return []
+    # Each model's best limit matches hold the best limit overall
+    merged = heapq.merge(*(
+        [(order, name, kind, id) for order, id, name in get_index(MODELS[kind]).matches(prefix, limit)]
+        for kind in types or MODELS
+    ))
+    return [{'type': kind, 'id': id, 'name': name} for order, name, kind, id in islice(merged, limit)]
+
+
+def init_app(app):
+    """Load the indexes when the app starts, if AUTOCOMPLETE_PRELOAD is set."""
+    if not app.config.get('AUTOCOMPLETE_PRELOAD'):
+        return
+    with app.app_context():
+        try:
+            for model in MODELS.values():
+                get_index(model)
+        except SQLAlchemyError as e:
+            # e.g. the tables do not exist yet; the indexes are built on first use instead
+            clear_indexes()
+            app.logger.warning('Autocomplete indexes not preloaded: %s', e)
+
@@ -0,0 +1,12 @@
+"""
+Benchmarks for Fyyur endpoints, run against a synthetic SQLite database
+"""
+import os
+import tempfile
+
+# Point the app at a throwaway SQLite database unless told otherwise.
+# This has to happen before anything imports app.
+os.environ.setdefault(
+    'DATABASE_URL',
+    'sqlite:///' + os.path.join(tempfile.gettempdir(), 'fyyur_bench.db')
+)
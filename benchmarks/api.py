@@ -0,0 +1,45 @@
+"""
+Compare response size and time of the HTML pages and their JSON API equivalents
+
+    python -m benchmarks.api [requests]
+"""
+# Imports
+
+import sys
+import time
+
+from app import app
+from benchmarks.seed import seed
+from cache import page_cache
+
+PAIRS = [
+    ('/venues', '/api/v1/venues'),
+    ('/artists', '/api/v1/artists'),
+    ('/shows', '/api/v1/shows'),
+    ('/venues/1', '/api/v1/venues/1'),
+    ('/artists/1', '/api/v1/artists/1'),
+]
+
+
+def measure(client, path, requests):
+    # Detail pages are cached, so time cold requests to compare the full paths
+    start = time.perf_counter()
+    for i in range(requests):
+        page_cache.delete_many(['venue:1', 'artist:1'])
+        response = client.get(path)
+    return (time.perf_counter() - start) / requests, len(response.data)
+
+
+def main(requests=50):
+    with app.app_context():
+        seed(venues=2000, artists=2000, shows=20000)
+    client = app.test_client()
+    for html, api in PAIRS:
+        html_time, html_size = measure(client, html, requests)
+        api_time, api_size = measure(client, api, requests)
+        print(f'{html:<12} {html_time * 1000:7.2f} ms {html_size:>8} B   '
+              f'{api:<20} {api_time * 1000:7.2f} ms {api_size:>8} B')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,61 @@
+"""
+Show queries before and after archiving the history
+
+    python -m benchmarks.archive [years] [--shows 20000] [--keep-months 12]
+
+Seeds a year either side of today plus the given years of history, as
+benchmarks.calendars does, then times the busiest venue's upcoming shows,
+its whole page and the upcoming show counts of the venues listing, before
+and after archiving the shows of the months before the kept ones. The
+seed recreates Show from the models, unpartitioned, so this measures
+taking the history out of the table rather than partition pruning.
+"""
+# Imports
+
+import argparse
+from datetime import date, datetime
+
+from sqlalchemy import func, select
+
+from app import app
+from archive import add_months, archive_shows
+from benchmarks.calendars import add_history, timed
+from benchmarks.seed import seed
+from models import db, Show
+from queries import get_venue_data, venue_shows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time show queries before and after archiving')
+    parser.add_argument('years', type=int, nargs='?', default=10)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--keep-months', type=int, default=12)
+    args = parser.parse_args()
+
+    with app.app_context():
+        seed(venues=500, artists=500, shows=args.shows)
+        add_history(args.years)
+        venue_id = db.session.execute(
+            select(Show.venue_id).group_by(Show.venue_id).order_by(func.count().desc()).limit(1)
+        ).scalar()
+        now = datetime.now()
+        cases = (
+            ('upcoming shows', lambda: db.session.execute(venue_shows(venue_id, now, upcoming=True)).all()),
+            ('venue page', lambda: get_venue_data(venue_id)),
+            ('upcoming counts', lambda: db.session.execute(
+                select(Show.venue_id, func.count()).where(Show.start_time >= now).group_by(Show.venue_id)
+            ).all()),
+        )
+
+        def report(label):
+            total = db.session.execute(select(func.count(Show.id))).scalar()
+            print(f'{label:<9} {total:>8} shows  ' + '  '.join(f'{name} {timed(fn):7.2f} ms' for name, fn in cases))
+
+        report('before')
+        before = add_months(date.today().replace(day=1), -args.keep_months)
+        archive_shows(datetime.combine(before, datetime.min.time()))
+        report('archived')
+
+
+if __name__ == '__main__':
+    main()
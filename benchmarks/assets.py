@@ -0,0 +1,66 @@
+"""
+Requests and bytes a page costs in static assets, separate files against the built bundles
+
+    python -m benchmarks.assets
+
+The separate files are the bundles' sources as the layout used to load
+them, through Flask's static route, which sends them uncompressed and has
+the browser revalidate each one on every visit. The bundles are the files
+linked by the rendered home page. Both are fetched as a browser accepting
+gzip and brotli would on a first and on a repeat visit, where a file
+whose Cache-Control allows reuse is not requested again.
+"""
+# Imports
+
+import re
+
+from app import app
+from assets import BUNDLES
+
+ASSET_LINK = re.compile(r'(?:href|src)="(/static/[^"]+\.(?:css|js))"')
+# Only old Internet Explorer loads what is inside conditional comments
+CONDITIONAL_COMMENT = re.compile(r'<!--\[if [^]]*\]>.*?<!\[endif\]-->', re.S)
+ACCEPT_ENCODING = 'br, gzip'
+
+
+def fresh(response):
+    # Whether a browser may reuse its copy without asking, as Cache-Control allows
+    control = response.cache_control
+    return not control.no_cache and (control.immutable or (control.max_age or 0) > 0)
+
+
+def visits(client, urls):
+    """(requests, bytes) of a first and of a repeat visit fetching urls."""
+    cached = {}
+    first = [0, 0]
+    for url in urls:
+        response = client.get(url, headers={'Accept-Encoding': ACCEPT_ENCODING})
+        first[0] += 1
+        first[1] += len(response.data)
+        cached[url] = response
+
+    repeat = [0, 0]
+    for url, previous in cached.items():
+        if fresh(previous):
+            continue
+        headers = {'Accept-Encoding': ACCEPT_ENCODING}
+        if previous.headers.get('ETag'):
+            headers['If-None-Match'] = previous.headers['ETag']
+        response = client.get(url, headers=headers)
+        repeat[0] += 1
+        repeat[1] += len(response.data)
+    return first, repeat
+
+
+def main():
+    client = app.test_client()
+    separate = [f'/static/{source}' for sources in BUNDLES.values() for source in sources]
+    bundled = ASSET_LINK.findall(CONDITIONAL_COMMENT.sub('', client.get('/').get_data(as_text=True)))
+    for name, urls in (('separate files', separate), ('bundles', bundled)):
+        (requests, size), (repeat_requests, repeat_size) = visits(client, urls)
+        print(f'{name:<15} first visit {requests:3d} requests {size:>8} B'
+              f'   repeat visit {repeat_requests:3d} requests {repeat_size:>8} B')
+
+
+if __name__ == '__main__':
+    main()
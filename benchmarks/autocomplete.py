@@ -0,0 +1,60 @@
+"""
+Autocomplete latency at increasing table sizes
+
+    python -m benchmarks.autocomplete [rows ...]
+
+Times suggestions from the in-memory prefix index against the ILIKE
+prefix query the search boxes would otherwise issue per keystroke, and
+the index's build time and size. Defaults to 10k, 100k and 1M rows.
+"""
+# Imports
+
+import random
+import sys
+import time
+
+from sqlalchemy import or_, select
+
+from app import app
+from autocomplete import DEFAULT_LIMIT, MODELS, clear_indexes, get_index, suggest
+from benchmarks.search import percentile
+from benchmarks.seed import seed
+from models import db
+
+PREFIXES = ['v', 've', 'Venue 1', 'Venue 12', 'a', 'Artist 4', 'art', 'the', 'zzz']
+
+
+def ilike(prefix):
+    # Names starting with the prefix or with a later word starting with it, over both tables
+    return [
+        db.session.execute(select(model.id, model.name).where(
+            or_(model.name.ilike(f'{prefix}%'), model.name.ilike(f'% {prefix}%'))
+        ).order_by(model.name).limit(DEFAULT_LIMIT)).all()
+        for model in MODELS.values()
+    ]
+
+
+def main(sizes=(10000, 100000, 1000000), lookups=500):
+    rng = random.Random(0)
+    with app.app_context():
+        for size in sizes:
+            seed(venues=size, artists=size, shows=0)
+            clear_indexes()
+            start = time.perf_counter()
+            names = sum(len(get_index(model)) for model in MODELS.values())
+            build = time.perf_counter() - start
+
+            for name, lookup in (('index', suggest), ('ilike', ilike)):
+                samples = []
+                for i in range(lookups):
+                    prefix = rng.choice(PREFIXES)
+                    start = time.perf_counter()
+                    lookup(prefix)
+                    samples.append(time.perf_counter() - start)
+                print(f'{name:<6}{size:>9} rows  p50 {percentile(samples, 0.5) * 1000:7.3f} ms'
+                      f'  p99 {percentile(samples, 0.99) * 1000:7.3f} ms')
+            print(f'        {names} names indexed in {build:.2f} s')
+
+
+if __name__ == '__main__':
+    main(*([tuple(int(arg) for arg in sys.argv[1:])] if sys.argv[1:] else []))
@@ -0,0 +1,107 @@
+"""
+Calendar queries as the show history grows
+
+    python -m benchmarks.calendars [years ...] [--shows 20000]
+
+Seeds a year either side of today, then adds the past year's shows again
+shifted one, two, ... years further back, so the upcoming shows stay the
+same while the history grows to the given number of years. Times the
+shows of a city this weekend, of a genre over the next month, and the
+shows per day of a city over the next month counted from the day buckets
+and from the shows themselves. Defaults to 1, 5 and 20 years.
+"""
+# Imports
+
+import argparse
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select
+
+from app import app
+from benchmarks.seed import seed
+from calendars import day_counts, rebuild_days
+from models import db, Show
+from pagination import paginate
+from queries import filter_shows, show_listing
+
+REPEATS = 20
+
+# Shows on a listing page
+PER_PAGE = 50
+
+
+def add_history(years):
+    # Copies of the past year's shows moved back a year at a time, as a venue's archive would be
+    table = Show.__table__
+    past = [
+        dict(row._mapping) for row in db.session.execute(
+            select(table.c.venue_id, table.c.artist_id, table.c.start_time, table.c.end_time)
+            .where(table.c.start_time < datetime.now())
+        )
+    ]
+    # The seed inserts its ids explicitly, leaving Postgres sequences behind, so the copies do too
+    next_id = db.session.execute(select(func.max(table.c.id))).scalar() + 1
+    for year in range(1, years):
+        shift = timedelta(days=364 * year)
+        db.session.execute(table.insert(), [
+            dict(
+                row, id=next_id + number, start_time=row['start_time'] - shift, end_time=row['end_time'] - shift,
+                is_upcoming=False
+            ) for number, row in enumerate(past)
+        ])
+        next_id += len(past)
+    db.session.commit()
+    rebuild_days()
+
+
+def timed(fn):
+    # Best of REPEATS runs, in milliseconds
+    best = None
+    for i in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time calendar queries against a growing history')
+    parser.add_argument('years', type=int, nargs='*', default=[1, 5, 20])
+    parser.add_argument('--shows', type=int, default=20000)
+    args = parser.parse_args()
+
+    today = date.today()
+    saturday = today + timedelta(days=(5 - today.weekday()) % 7)
+    weekend = {'from': saturday.isoformat(), 'to': (saturday + timedelta(days=1)).isoformat(), 'city': 'New York'}
+    month = {'from': today.isoformat(), 'to': (today + timedelta(days=30)).isoformat(), 'genre': 'Jazz'}
+    end = today + timedelta(days=31)
+
+    def page(filters):
+        return paginate(filter_shows(show_listing(), filters), [Show.start_time, Show.id], per_page=PER_PAGE)
+
+    def counts(buckets):
+        app.config['CALENDAR_DAY_BUCKETS'] = buckets
+        return day_counts(today, end, city='New York')
+
+    with app.app_context():
+        buckets = app.config['CALENDAR_DAY_BUCKETS']
+        for years in args.years:
+            seed(venues=500, artists=500, shows=args.shows)
+            add_history(years)
+            total = db.session.execute(select(db.func.count(Show.id))).scalar()
+            cases = (
+                ('city weekend', lambda: page(weekend)),
+                ('genre month', lambda: page(month)),
+                ('day buckets', lambda: counts(True)),
+                ('day aggregate', lambda: counts(False)),
+            )
+            print(f'{years:>3} years {total:>8} shows  ' + '  '.join(
+                f'{name} {timed(fn):6.2f} ms' for name, fn in cases
+            ))
+        app.config['CALENDAR_DAY_BUCKETS'] = buckets
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Repeat visits with conditional GET: how often a revalidation is answered with 304
+
+    python -m benchmarks.conditional [requests] [write share]
+
+Simulated visitors keep the ETag of each page they have seen and send it
+back on their next visit, while a share of the steps (default 0.02) edit
+a random venue or artist. Prints the 304 rate of the revalidations and
+the median time of a 304 against a full render, per page.
+"""
+# Imports
+
+import random
+import sys
+import time
+from collections import defaultdict
+
+from app import app
+from benchmarks.results import summarize
+from benchmarks.seed import seed
+from cache import page_cache
+from models import db, Artist, Venue
+
+PATHS = ['/venues', '/artists', '/shows'] + [f'/venues/{id}' for id in range(1, 11)] + [
+    f'/artists/{id}' for id in range(1, 11)
+]
+VISITORS = 20
+
+
+def edit(rng):
+    # Rename any venue or artist, which changes the pages of those it has played with
+    model = rng.choice((Venue, Artist))
+    row = db.session.get(model, rng.randint(1, 2000))
+    row.name = f'{row.name.split(" #")[0]} #{rng.randint(1, 1000)}'
+    db.session.commit()
+
+
+def main(requests=2000, write_share=0.02):
+    rng = random.Random(0)
+    with app.app_context():
+        seed(venues=2000, artists=2000, shows=20000)
+        client = app.test_client()
+        etags = [{} for i in range(VISITORS)]
+        durations = defaultdict(lambda: {200: [], 304: []})
+        revalidations = not_modified = 0
+
+        for i in range(requests):
+            if rng.random() < write_share:
+                edit(rng)
+                continue
+            visitor = rng.choice(etags)
+            path = rng.choice(PATHS)
+            headers = {'If-None-Match': visitor[path]} if path in visitor else {}
+            # Time the page itself rather than the detail page cache
+            page_cache.clear()
+            started = time.perf_counter()
+            response = client.get(path, headers=headers)
+            elapsed = time.perf_counter() - started
+
+            kind = path if path.count('/') == 1 else path.rsplit('/', 1)[0] + '/<id>'
+            durations[kind][response.status_code].append(elapsed)
+            if headers:
+                revalidations += 1
+                not_modified += response.status_code == 304
+            visitor[path] = response.headers['ETag']
+
+    print(f'{not_modified} of {revalidations} revalidations answered 304 '
+          f'({not_modified / max(revalidations, 1):.1%}), {write_share:.0%} of steps writing')
+    for kind, statuses in sorted(durations.items()):
+        full, cached = summarize(statuses[200]), summarize(statuses[304])
+        print(f"{kind:<14} 200 p50 {full.get('p50_ms', 0):7.2f} ms ({full['count']:>5})"
+              f"   304 p50 {cached.get('p50_ms', 0):7.2f} ms ({cached['count']:>5})")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]), *(float(arg) for arg in sys.argv[2:3]))
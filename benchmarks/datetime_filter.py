@@ -0,0 +1,49 @@
+"""
+Time the datetime template filter over 100k timestamps
+
+    python -m benchmarks.datetime_filter [count]
+"""
+# Imports
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import dateutil.parser
+from babel import dates
+
+from app import format_datetime
+
+
+def legacy_format_datetime(value, format='medium'):
+    # The original filter: parse a string with dateutil and let Babel parse the pattern every call
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return dates.format_datetime(date, format=format, locale='en')
+
+
+def main(count=100000):
+    rng = random.Random(0)
+    start = datetime(2020, 1, 1)
+    timestamps = [start + timedelta(minutes=rng.randint(0, 60 * 24 * 365 * 5)) for i in range(count)]
+    strings = [str(timestamp) for timestamp in timestamps]
+
+    cases = (
+        ('legacy, str()', legacy_format_datetime, strings),
+        ('cached, ISO str', format_datetime, strings),
+        ('cached, datetime', format_datetime, timestamps),
+    )
+    for name, fn, values in cases:
+        begin = time.perf_counter()
+        for value in values:
+            fn(value, 'full')
+        elapsed = time.perf_counter() - begin
+        print(f'{name:<17} {elapsed * 1000:8.1f} ms  ({elapsed / count * 1e6:5.2f} us per call)')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
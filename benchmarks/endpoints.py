@@ -0,0 +1,115 @@
+"""
+Per-endpoint micro-benchmarks through the Flask test client
+
+    python -m benchmarks.endpoints [--venues 2000] [--artists 2000] [--shows 20000] [--requests 200]
+                                   [--output benchmarks/results/endpoints.json] [--baseline FILE]
+
+Seeds a deterministic database, times every page and API endpoint in
+process (no HTTP or server in the way) and writes the latency
+percentiles and SQL statement count of each to a JSON file. With
+--baseline the run is compared with an earlier file and the command
+exits non-zero on a regression, see benchmarks/results.py.
+"""
+# Imports
+
+import argparse
+import sys
+import time
+
+from sqlalchemy import event
+
+from app import app
+from benchmarks import results
+from benchmarks.seed import seed
+from cache import page_cache
+from models import db
+
+# name: (method, path, form data, whether the page cache is emptied before each request)
+CASES = {
+    'home': ('GET', '/', None, False),
+    'venues': ('GET', '/venues', None, False),
+    'venues_genre_city': ('GET', '/venues?genre=Jazz&city=New York&state=NY', None, False),
+    'artists': ('GET', '/artists', None, False),
+    'shows': ('GET', '/shows', None, False),
+    'venue_cold': ('GET', '/venues/1', None, True),
+    'venue_cached': ('GET', '/venues/1', None, False),
+    'artist_cold': ('GET', '/artists/1', None, True),
+    'artist_cached': ('GET', '/artists/1', None, False),
+    'venue_edit': ('GET', '/venues/1/edit', None, False),
+    'search_venues': ('POST', '/venues/search', {'search_term': 'venue 12'}, False),
+    'search_artists': ('POST', '/artists/search', {'search_term': 'artist 3'}, False),
+    'api_venues': ('GET', '/api/v1/venues', None, False),
+    'api_venue': ('GET', '/api/v1/venues/1', None, True),
+    'api_shows_search': ('GET', '/api/v1/shows/search?venue_id=1', None, False),
+}
+
+# Untimed requests first, so one-off work like building the search index is left out
+WARMUP = 3
+
+
+def measure(client, method, path, data, cold, requests):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    for i in range(WARMUP):
+        client.open(path, method=method, data=data)
+
+    durations = []
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        for i in range(requests):
+            if cold:
+                page_cache.clear()
+            started = time.perf_counter()
+            response = client.open(path, method=method, data=data)
+            durations.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                raise RuntimeError(f'{method} {path} returned {response.status_code}')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+    return dict(
+        results.summarize(durations),
+        queries=round(len(statements) / requests, 2),
+        bytes=len(response.data),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time each endpoint through the Flask test client')
+    parser.add_argument('--venues', type=int, default=2000)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', action='append', choices=sorted(CASES), help='run only these cases')
+    parser.add_argument('--output', default='benchmarks/results/endpoints.json')
+    parser.add_argument('--baseline', help='earlier result file to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown of the median')
+    args = parser.parse_args()
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    cases = {}
+    with app.app_context():
+        seed(venues=args.venues, artists=args.artists, shows=args.shows, seed=args.seed)
+        client = app.test_client()
+        for name in args.only or CASES:
+            cases[name] = measure(client, *CASES[name], args.requests)
+            case = cases[name]
+            print(
+                f"{name:<20} p50 {case['p50_ms']:8.2f} ms  p95 {case['p95_ms']:8.2f} ms"
+                f"  {case['queries']:5.1f} queries  {case['bytes']:8d} bytes"
+            )
+
+    parameters = {key: getattr(args, key) for key in ('venues', 'artists', 'shows', 'requests', 'seed')}
+    run = results.write(args.output, 'endpoints', parameters, cases)
+    print(f'Results written to {args.output}')
+    if args.baseline:
+        return results.report(results.read(args.baseline), run, args.threshold)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
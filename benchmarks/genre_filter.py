@@ -0,0 +1,66 @@
+"""
+Compare filtering venues by genre through string matching and through the genre links
+
+    python -m benchmarks.genre_filter [venues ...]
+
+Before the Genre table the only way to find "Jazz venues in New York" was
+a LIKE over the genres text of every candidate venue. The seeded genres
+each cover about a quarter of the venues, so a rare genre tagged on one
+venue in a thousand is added to show the selective case.
+"""
+# Imports
+
+import sys
+import timeit
+
+from app import app
+from benchmarks.seed import seed
+from models import db, Genre, Venue, venue_genres
+from queries import genre_filter, genre_members
+
+CITY, STATE = 'New York', 'NY'
+RARE_GENRE = 'Bluegrass'
+RARE_EVERY = 1000
+
+
+def add_rare_genre(venues):
+    # Tag every RARE_EVERY-th venue with the rare genre, in both the text and the links
+    genre_id = db.session.execute(Genre.__table__.insert().values(name=RARE_GENRE)).inserted_primary_key[0]
+    ids = list(range(RARE_EVERY, venues + 1, RARE_EVERY))
+    db.session.execute(venue_genres.insert(), [{'genre_id': genre_id, 'venue_id': id} for id in ids])
+    db.session.execute(Venue.__table__.update().where(Venue.id.in_(ids)).values(
+        genres=Venue.genres + ',' + RARE_GENRE
+    ))
+    db.session.commit()
+
+
+def cases(genre):
+    # (name, before, after) for the listing page's first page of one city, and every venue of the genre
+    def city_page(filter):
+        return lambda: db.session.query(Venue.id, Venue.name).filter(
+            Venue.state == STATE, Venue.city == CITY, filter
+        ).order_by(Venue.state, Venue.city, Venue.id).limit(50).all()
+
+    return [
+        ('city page', city_page(Venue.genres.like(f'%{genre}%')), city_page(genre_filter(Venue, genre))),
+        ('all ids',
+         lambda: db.session.query(Venue.id).filter(Venue.genres.like(f'%{genre}%')).all(),
+         lambda: db.session.execute(genre_members(Venue, genre)).all()),
+    ]
+
+
+def main(sizes=(10000, 100000), repeat=5):
+    with app.app_context():
+        for venues in sizes:
+            seed(venues=venues, artists=1000, shows=1000)
+            add_rare_genre(venues)
+            for genre in ('Jazz', RARE_GENRE):
+                for name, before, after in cases(genre):
+                    assert sorted(before()) == sorted(after()), (genre, name)
+                    like, links = (min(timeit.repeat(fn, number=1, repeat=repeat)) for fn in (before, after))
+                    print(f'{venues:>8} venues  {genre:<10} {name:<10} like: {like * 1000:8.2f} ms'
+                          f'  links: {links * 1000:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or (10000, 100000))
@@ -0,0 +1,170 @@
+"""
+Load test running servers over HTTP and compare requests/s and latency
+
+    python -m benchmarks.load http://127.0.0.1:5000 http://127.0.0.1:8000 --pid 1234 --pid 5678
+
+Each server gets the same mix of read requests from --concurrency
+keep-alive connections for --duration seconds. --pid, given once per
+server, reports the resident memory of that process and its children so
+the servers can be compared at equal memory. Seed the database first
+with python -m benchmarks.seed and start the servers, e.g.
+
+    gunicorn --workers 4 --threads 8 app:app
+    uvicorn asgi:application --workers 4 --port 8000
+"""
+# Imports
+
+import argparse
+import asyncio
+import random
+import time
+from urllib.parse import urlsplit
+
+# (method, path, form body) of the requests sent, picked at random
+READS = [
+    ('GET', '/venues', None),
+    ('GET', '/artists', None),
+    ('GET', '/shows', None),
+    ('GET', '/venues/{id}', None),
+    ('GET', '/artists/{id}', None),
+    ('POST', '/venues/search', 'search_term=music'),
+    ('POST', '/artists/search', 'search_term=band'),
+]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def rss(pid):
+    # Resident memory in bytes of a process and its direct children, from /proc
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as file:
+            pids += [int(child) for child in file.read().split()]
+    except OSError:
+        pass
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/status') as file:
+                total += next(int(line.split()[1]) * 1024 for line in file if line.startswith('VmRSS:'))
+        except (OSError, StopIteration):
+            pass
+    return total
+
+
+class Connection:
+    """HTTP/1.1 connection to one server, reopened whenever the server closes it."""
+
+    def __init__(self, url):
+        self.parts = urlsplit(url)
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None):
+        """Send a request, with body as a urlencoded form, and return the status and response body."""
+        try:
+            # Servers without keep-alive get a new connection per request, timed with it
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.open_connection(self.parts.hostname, self.parts.port or 80)
+            status, keep_alive, content = await self._exchange(self.parts.path.rstrip('/') + path, method, body)
+        except BaseException:
+            self.close()
+            raise
+        if not keep_alive:
+            self.close()
+        return status, content
+
+    async def _exchange(self, path, method, body):
+        reader, writer = self.reader, self.writer
+        data = (body or '').encode()
+        headers = f'{method} {path} HTTP/1.1\r\nHost: {self.parts.netloc}\r\nContent-Length: {len(data)}\r\n'
+        if body is not None:
+            headers += 'Content-Type: application/x-www-form-urlencoded\r\n'
+        writer.write(headers.encode() + b'\r\n' + data)
+        await writer.drain()
+
+        version, status = (await reader.readline()).split()[:2]
+        length, chunked, keep_alive = None, False, version == b'HTTP/1.1'
+        while (line := await reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            name, value = name.lower(), value.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'transfer-encoding' and 'chunked' in value:
+                chunked = True
+            elif name == 'connection':
+                keep_alive = value == 'keep-alive' or keep_alive and value != 'close'
+        if chunked:
+            chunks = []
+            while (size := int((await reader.readline()).strip(), 16)):
+                chunks.append((await reader.readexactly(size + 2))[:-2])
+            await reader.readline()
+            content = b''.join(chunks)
+        elif length is not None:
+            content = await reader.readexactly(length)
+        else:
+            content = await reader.read()
+            keep_alive = False
+        return int(status), keep_alive, content
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+# Errors a request can fail with when the server drops or garbles the connection
+REQUEST_ERRORS = (OSError, asyncio.IncompleteReadError, ValueError)
+
+
+async def client(url, deadline, ids, latencies, errors, rng):
+    connection = Connection(url)
+    try:
+        while time.perf_counter() < deadline:
+            method, path, body = rng.choice(READS)
+            path = path.format(id=rng.randint(1, ids))
+            started = time.perf_counter()
+            try:
+                status, content = await connection.request(method, path, body)
+            except REQUEST_ERRORS:
+                errors.append(path)
+                continue
+            latencies.append(time.perf_counter() - started)
+            if status >= 500:
+                errors.append(path)
+    finally:
+        connection.close()
+
+
+async def run(url, concurrency, duration, ids, seed=0):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(
+        client(url, deadline, ids, latencies, errors, random.Random(seed + i)) for i in range(concurrency)
+    ))
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('urls', nargs='+')
+    parser.add_argument('--pid', type=int, action='append', default=[], help='server process, once per URL')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--ids', type=int, default=1000, help='venue and artist ids requested, from 1')
+    args = parser.parse_args()
+
+    for number, url in enumerate(args.urls):
+        latencies, errors = asyncio.run(run(url, args.concurrency, args.duration, args.ids))
+        memory = f'  {rss(args.pid[number]) / 2 ** 20:7.1f} MiB' if number < len(args.pid) else ''
+        print(
+            f'{url:>28}: {len(latencies) / args.duration:8.1f} req/s'
+            f'  p50 {percentile(latencies, 0.5) * 1000:7.1f} ms  p99 {percentile(latencies, 0.99) * 1000:7.1f} ms'
+            f'  {len(errors)} errors{memory}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Compare per-row phone validation with the batch validator
+
+    python -m benchmarks.phones [numbers]
+
+The legacy validator compiled its pattern on every call (a lookup in
+re's cache after the first). The batch validator runs each pattern once
+over the whole column joined with newlines.
+"""
+# Imports
+
+import random
+import re
+import sys
+import timeit
+
+from phones import check_phone_numbers, validate_phone_number
+
+FORMATS = ['{a}-{b}-{c}', '({a}) {b}-{c}', '{a}.{b}.{c}', '+1 {a} {b} {c}', '1{a}{b}{c}', '+44 20 {b} {c}']
+
+
+def legacy_validate(key, value):
+    # The validator formerly duplicated on Venue and Artist
+    phone_pattern = re.compile(r'^\+?\d{1,3}[-.\s]?\(?\d{1,3}\)?[-.\s]?\d{1,4}[-.\s]?\d{1,4}[-.\s]?\d{1,9}$')
+    if not phone_pattern.match(value):
+        raise ValueError(f"Invalid phone number format: {value}")
+    return value
+
+
+def numbers(count, seed=0):
+    # Realistic formats, a tenth of the numbers repeated and a few malformed
+    rng = random.Random(seed)
+    values = []
+    for i in range(count):
+        if values and rng.random() < 0.1:
+            values.append(rng.choice(values))
+        elif rng.random() < 0.02:
+            values.append(rng.choice(['', 'n/a', '555-CALL-NOW', '12-34']))
+        else:
+            values.append(rng.choice(FORMATS).format(
+                a=rng.randint(200, 999), b=rng.randint(200, 999), c=f'{rng.randint(0, 9999):04d}'
+            ))
+    return values
+
+
+def per_row(validate, values):
+    failures = 0
+    for value in values:
+        try:
+            validate(value)
+        except ValueError:
+            failures += 1
+    return failures
+
+
+def main(count=1000000, repeat=3):
+    values = numbers(count)
+    cases = [
+        ('legacy', lambda: per_row(lambda value: legacy_validate('phone', value), values)),
+        ('compiled', lambda: per_row(validate_phone_number, values)),
+        ('batch', lambda: len(check_phone_numbers(values, e164=False)[1])),
+        ('batch e164', lambda: len(check_phone_numbers(values)[1])),
+    ]
+    for name, fn in cases:
+        failures = fn()
+        best = min(timeit.repeat(fn, number=1, repeat=repeat))
+        print(f'{name:>10}: {best * 1000:8.1f} ms  {count / best:12,.0f} numbers/s  {failures} invalid')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,53 @@
+"""
+Count the SQL statements each detail page issues and fail on regressions
+
+    python -m benchmarks.query_counts
+"""
+# Imports
+
+import sys
+
+from sqlalchemy import event
+
+from app import app
+from benchmarks.seed import seed
+from models import db
+
+# Maximum number of statements each page may issue: the conditional GET validator and the page's own query
+BUDGETS = {
+    '/venues/1': 2,
+    '/artists/1': 2,
+}
+
+
+def count_queries(client, path):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code == 200, (path, response.status_code)
+    return len(statements)
+
+
+def main():
+    failed = False
+    with app.app_context():
+        seed(venues=50, artists=50, shows=500)
+    client = app.test_client()
+    with app.app_context():
+        for path, budget in BUDGETS.items():
+            count = count_queries(client, path)
+            status = 'ok' if count <= budget else 'FAIL'
+            failed = failed or count > budget
+            print(f'{path:<20} {count:3d} queries (budget {budget})  {status}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
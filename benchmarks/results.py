@@ -0,0 +1,122 @@
+"""
+Benchmark result files and regression checks
+
+    python -m benchmarks.results baseline.json current.json [--threshold 0.2]
+
+Suites write one JSON file per run: what was run and on which commit,
+and per case the latency percentiles in milliseconds (plus the SQL
+statement count for the endpoint suite). Comparing two runs of the same
+suite flags every case whose median got slower by more than the
+threshold, or that issues more statements, and exits non-zero if any did.
+"""
+# Imports
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+# Medians are compared only above this many milliseconds, below it timer noise dominates
+NOISE_FLOOR_MS = 0.05
+
+
+def summarize(seconds):
+    """Latency statistics in milliseconds of a list of durations in seconds."""
+    values = sorted(value * 1000 for value in seconds)
+    if not values:
+        return {'count': 0}
+
+    def percentile(fraction):
+        return round(values[min(len(values) - 1, int(len(values) * fraction))], 3)
+
+    return {
+        'count': len(values),
+        'mean_ms': round(sum(values) / len(values), 3),
+        'p50_ms': percentile(0.5),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'max_ms': round(values[-1], 3),
+    }
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write(path, suite, parameters, cases):
+    """Write a run's results to path, creating its directory."""
+    run = {
+        'suite': suite,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': parameters,
+        'cases': cases,
+    }
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(run, file, indent=2, sort_keys=True)
+        file.write('\n')
+    return run
+
+
+def read(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(baseline, current, threshold=0.2):
+    """Return (case, message) for each case of current that regressed against baseline."""
+    if baseline.get('suite') != current.get('suite'):
+        raise ValueError(f"Cannot compare suite {current.get('suite')!r} with {baseline.get('suite')!r}")
+    regressions = []
+    for name, case in sorted(current['cases'].items()):
+        before = baseline['cases'].get(name)
+        if not before or not case.get('count') or not before.get('count'):
+            continue
+        if case['p50_ms'] > max(before['p50_ms'] * (1 + threshold), before['p50_ms'] + NOISE_FLOOR_MS):
+            regressions.append((name, f"p50 {before['p50_ms']:.2f} -> {case['p50_ms']:.2f} ms"))
+        if case.get('queries', 0) > before.get('queries', case.get('queries', 0)):
+            regressions.append((name, f"queries {before['queries']} -> {case['queries']}"))
+        if case.get('errors', 0) > before.get('errors', 0):
+            regressions.append((name, f"errors {before.get('errors', 0)} -> {case['errors']}"))
+    return regressions
+
+
+def report(baseline, current, threshold=0.2):
+    """Print the median change of each case and the regressions, returning 1 if there were any."""
+    for name, case in sorted(current['cases'].items()):
+        before = baseline['cases'].get(name, {})
+        if case.get('count') and before.get('count'):
+            change = (case['p50_ms'] / before['p50_ms'] - 1) * 100 if before['p50_ms'] else 0.0
+            print(f"{name:<28} {before['p50_ms']:9.2f} -> {case['p50_ms']:9.2f} ms  {change:+6.1f}%")
+        else:
+            print(f'{name:<28} {"(new)" if not before else "(no samples)"}')
+    regressions = compare(baseline, current, threshold)
+    for name, message in regressions:
+        print(f'REGRESSION {name}: {message}')
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files')
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown of the median, 0.2 = 20%%')
+    args = parser.parse_args()
+    return report(read(args.baseline), read(args.current), args.threshold)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Locust-style HTTP scenarios against a running server
+
+    python -m benchmarks.scenarios http://127.0.0.1:5000 [--users 50] [--duration 60] [--read-only]
+                                   [--output benchmarks/results/scenarios.json] [--baseline FILE]
+
+Each simulated user follows one scenario, picked by weight: browsing the
+listings into venue and artist pages, searching and opening a result,
+or, unless --read-only, an organizer listing a new show. Users pause
+between steps like real visitors, pages link to each other through the
+ids in the HTML, and each request is timed under its step name. Results
+are written to a JSON file and can be checked against a baseline, see
+benchmarks/results.py. Seed the server's database first with
+python -m benchmarks.seed.
+"""
+# Imports
+
+import argparse
+import asyncio
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from benchmarks import results
+from benchmarks.load import REQUEST_ERRORS, Connection
+
+VENUE_LINK = re.compile(rb'href="/venues/(\d+)"')
+ARTIST_LINK = re.compile(rb'href="/artists/(\d+)"')
+SEARCH_WORDS = ['venue', 'artist', 'jazz', 'rock', 'new york', 'blues', 'austin', 'folk']
+GENRES = ['Jazz', 'Rock n Roll', 'Hip-Hop', 'Folk', 'Blues']
+
+
+class User:
+    """One simulated visitor with its own connection, random choices and pauses."""
+
+    def __init__(self, url, rng, stats, wait):
+        self.connection = Connection(url)
+        self.rng = rng
+        self.stats = stats
+        self.wait_range = wait
+
+    async def request(self, name, method, path, form=None):
+        started = time.perf_counter()
+        try:
+            status, content = await self.connection.request(method, path, urlencode(form) if form else None)
+        except REQUEST_ERRORS:
+            self.stats[name]['errors'] += 1
+            return b''
+        self.stats[name]['durations'].append(time.perf_counter() - started)
+        if status >= 400:
+            self.stats[name]['errors'] += 1
+        return content
+
+    async def get(self, name, path):
+        return await self.request(name, 'GET', path)
+
+    async def post(self, name, path, form):
+        return await self.request(name, 'POST', path, form)
+
+    async def wait(self):
+        await asyncio.sleep(self.rng.uniform(*self.wait_range))
+
+    def pick(self, pattern, content):
+        ids = pattern.findall(content)
+        return int(self.rng.choice(ids)) if ids else None
+
+
+#----------------------------------------------------------------------------#
+# Scenarios.
+#----------------------------------------------------------------------------#
+
+async def browse(user):
+    # The venue listing, sometimes narrowed to a genre, into a venue and on to one of its artists
+    path = '/venues' if user.rng.random() < 0.7 else '/venues?' + urlencode({'genre': user.rng.choice(GENRES)})
+    venue = user.pick(VENUE_LINK, await user.get('venues', path))
+    await user.wait()
+    if venue is None:
+        return
+    artist = user.pick(ARTIST_LINK, await user.get('venue', f'/venues/{venue}'))
+    await user.wait()
+    if artist is not None:
+        await user.get('artist', f'/artists/{artist}')
+        await user.wait()
+
+
+async def listings(user):
+    # The artist and show listings, following the next page link now and then
+    await user.get('artists', '/artists')
+    await user.wait()
+    content = await user.get('shows', '/shows')
+    next_page = re.search(rb'href="(/shows\?[^"]*after=[^"]+)"', content)
+    if next_page and user.rng.random() < 0.5:
+        await user.wait()
+        await user.get('shows_next', next_page.group(1).decode().replace('&amp;', '&'))
+    await user.wait()
+
+
+async def search(user):
+    # A search for venues or artists, opening the first result
+    kind = user.rng.choice(('venues', 'artists'))
+    content = await user.post(f'search_{kind}', f'/{kind}/search', {'search_term': user.rng.choice(SEARCH_WORDS)})
+    await user.wait()
+    found = (VENUE_LINK if kind == 'venues' else ARTIST_LINK).search(content)
+    if found:
+        await user.get(kind[:-1], f'/{kind}/{int(found.group(1))}')
+        await user.wait()
+
+
+async def organize(user):
+    # The new show form and its submission for an artist and venue seen in the listings
+    venue = user.pick(VENUE_LINK, await user.get('venues', '/venues'))
+    artist = user.pick(ARTIST_LINK, await user.get('artists', '/artists'))
+    await user.get('show_form', '/shows/create')
+    await user.wait()
+    if venue is not None and artist is not None:
+        start_time = datetime.now() + timedelta(days=user.rng.randint(1, 180))
+        await user.post('create_show', '/shows/create', {
+            'artist_id': artist,
+            'venue_id': venue,
+            'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+        })
+        await user.wait()
+
+
+# (scenario, weight, whether it writes)
+SCENARIOS = [
+    (browse, 6, False),
+    (listings, 3, False),
+    (search, 3, False),
+    (organize, 1, True),
+]
+
+
+async def user_loop(url, deadline, rng, stats, wait, scenarios):
+    user = User(url, rng, stats, wait)
+    scenario = rng.choices(*zip(*scenarios))[0]
+    try:
+        while time.perf_counter() < deadline:
+            await scenario(user)
+    finally:
+        user.connection.close()
+
+
+async def run(url, users, duration, wait, read_only, seed=0):
+    stats = defaultdict(lambda: {'durations': [], 'errors': 0})
+    scenarios = [(scenario, weight) for scenario, weight, writes in SCENARIOS if not (read_only and writes)]
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(
+        user_loop(url, deadline, random.Random(seed + i), stats, wait, scenarios) for i in range(users)
+    ))
+    return {
+        name: dict(
+            results.summarize(step['durations']), errors=step['errors'], rps=round(len(step['durations']) / duration, 2)
+        ) for name, step in stats.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run locust-style user scenarios against a server')
+    parser.add_argument('url')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=60)
+    parser.add_argument('--wait', type=float, nargs=2, default=(0.5, 2.0), metavar=('MIN', 'MAX'),
+                        help='seconds a user pauses between steps')
+    parser.add_argument('--read-only', action='store_true', help='leave out the scenarios that write')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmarks/results/scenarios.json')
+    parser.add_argument('--baseline', help='earlier result file to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown of the median')
+    args = parser.parse_args()
+
+    cases = asyncio.run(run(args.url, args.users, args.duration, args.wait, args.read_only, args.seed))
+    for name, case in sorted(cases.items()):
+        print(
+            f"{name:<16} {case['rps']:8.1f} req/s  p50 {case.get('p50_ms', 0):8.2f} ms"
+            f"  p99 {case.get('p99_ms', 0):8.2f} ms  {case['errors']} errors"
+        )
+
+    parameters = {key: getattr(args, key) for key in ('url', 'users', 'duration', 'wait', 'read_only', 'seed')}
+    run_results = results.write(args.output, 'scenarios', parameters, cases)
+    print(f'Results written to {args.output}')
+    if args.baseline:
+        return results.report(results.read(args.baseline), run_results, args.threshold)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
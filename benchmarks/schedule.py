@@ -0,0 +1,76 @@
+"""
+Checking a season of proposed shows for conflicts, in one pass and one query per show
+
+    python -m benchmarks.schedule [shows ...] [--proposals 5000]
+
+Runs against DATABASE_URL, so it measures the exclusion constraint
+indexes on Postgres and the in-process interval trees elsewhere, against
+asking the database about each proposal with its own overlap query.
+Defaults to 100k and 1M booked shows.
+"""
+# Imports
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, select
+
+from app import app
+from benchmarks.seed import seed
+from models import db, Show
+from schedule import booking, check_schedule, clear_index, get_index, uses_database
+
+
+def one_by_one(proposals):
+    # What checking each show as it is listed costs: an overlap query per proposal
+    conflicts = []
+    for proposal in proposals:
+        conflicts.append(db.session.execute(select(Show.id).where(
+            or_(Show.venue_id == proposal['venue_id'], Show.artist_id == proposal['artist_id']),
+            Show.start_time < proposal['end_time'],
+            Show.end_time > proposal['start_time'],
+        )).scalars().all())
+    return conflicts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time bulk schedule checks')
+    parser.add_argument('shows', type=int, nargs='*', default=[100000, 1000000])
+    parser.add_argument('--proposals', type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with app.app_context():
+        backend = 'exclusion constraints' if uses_database() else 'in-process interval trees'
+        for shows in args.shows:
+            entities = max(100, shows // 50)
+            seed(venues=entities, artists=entities, shows=shows)
+            clear_index()
+            # The in-process index is built once per worker, so keep it out of the timings
+            start = time.perf_counter()
+            if not uses_database():
+                get_index()
+            build = time.perf_counter() - start
+
+            now = datetime.now().replace(minute=0, second=0, microsecond=0)
+            proposals = [
+                booking(
+                    rng.randint(1, entities), rng.randint(1, entities),
+                    now + timedelta(days=rng.randint(0, 180), hours=rng.randint(17, 22))
+                ) for i in range(args.proposals)
+            ]
+            start = time.perf_counter()
+            conflicts = check_schedule(proposals)
+            bulk = time.perf_counter() - start
+            start = time.perf_counter()
+            one_by_one(proposals)
+            single = time.perf_counter() - start
+            print(f'{shows:>9} shows  {args.proposals} proposals  one pass {bulk * 1000:8.1f} ms'
+                  f'  one query each {single * 1000:9.1f} ms  {sum(1 for found in conflicts if found)} conflicting'
+                  f'  ({backend}, built in {build:.1f} s)')
+
+
+if __name__ == '__main__':
+    main()
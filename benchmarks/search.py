@@ -0,0 +1,53 @@
+"""
+Search latency at increasing table sizes
+
+    python -m benchmarks.search [rows ...]
+
+Runs against DATABASE_URL, so it measures the pg_trgm index on Postgres
+and the in-process index elsewhere. Defaults to 10k, 100k and 1M rows.
+"""
+# Imports
+
+import random
+import sys
+import time
+
+from app import app
+from benchmarks.seed import seed
+from models import Artist, Venue
+from search import clear_indexes, get_index, has_trigram_support, search
+
+TERMS = ['music', 'Venue 12', 'jazz', 'san fran', 'hop', 'Artist 4', 'NY', 'reggae club', 'zzz']
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def main(sizes=(10000, 100000, 1000000), searches=200):
+    rng = random.Random(0)
+    with app.app_context():
+        backend = 'pg_trgm' if has_trigram_support() else 'in-process index'
+        for size in sizes:
+            seed(venues=size, artists=size, shows=size)
+            clear_indexes()
+            for model in (Venue, Artist):
+                # The in-process index is built once per worker, so keep it out of the timings
+                start = time.perf_counter()
+                if not has_trigram_support():
+                    get_index(model)
+                build = time.perf_counter() - start
+
+                samples = []
+                for i in range(searches):
+                    term = rng.choice(TERMS)
+                    start = time.perf_counter()
+                    search(model, term)
+                    samples.append(time.perf_counter() - start)
+                print(f'{model.__name__:<7}{size:>9} rows  p50 {percentile(samples, 0.5) * 1000:7.2f} ms'
+                      f'  p99 {percentile(samples, 0.99) * 1000:7.2f} ms  ({backend}, built in {build:.1f} s)')
+
+
+if __name__ == '__main__':
+    main(*([tuple(int(arg) for arg in sys.argv[1:])] if sys.argv[1:] else []))
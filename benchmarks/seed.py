@@ -0,0 +1,157 @@
+"""
+Deterministic synthetic data for the benchmarks
+
+    python -m benchmarks.seed [venues] [artists] [shows] [seed]
+
+The same seed always produces the same rows. Venues and artists are
+spread over cities and genres with skewed weights, as real listings are
+dominated by a few big cities and popular genres. A few venues and
+artists account for most shows, most artists play their own city, and
+shows start in the evening, mostly on Fridays and Saturdays.
+"""
+# Imports
+
+import bisect
+import itertools
+import random
+import sys
+from datetime import datetime, timedelta
+
+from autocomplete import clear_indexes
+from calendars import rebuild_days
+from counters import verify
+from summaries import drop_views, refresh
+from models import db, Artist, Venue, Show, Genre, artist_genres, venue_genres
+
+CITIES = [
+    ('San Francisco', 'CA'), ('New York', 'NY'), ('Chicago', 'IL'), ('Austin', 'TX'),
+    ('Seattle', 'WA'), ('Nashville', 'TN'), ('New Orleans', 'LA'), ('Denver', 'CO'),
+]
+GENRES = ['Jazz', 'Reggae', 'Swing', 'Classical', 'Folk', 'Rock n Roll', 'Hip-Hop', 'Blues']
+
+# Relative share of venues and artists in each city and of each genre, in the order above
+CITY_WEIGHTS = [12, 30, 18, 9, 8, 6, 5, 7]
+GENRE_WEIGHTS = [12, 5, 3, 7, 10, 20, 18, 8]
+
+# Chance a show is played in the artist's own city
+HOME_CITY_SHARE = 0.7
+
+# Popularity of the n-th venue or artist falls off as 1 / n ** POPULARITY_SKEW
+POPULARITY_SKEW = 0.8
+
+
+def insert(table, rows):
+    # An empty list would execute a single INSERT of defaults
+    if rows:
+        db.session.execute(table.insert(), rows)
+
+
+def pick_genres(rng):
+    # One to three distinct genres, popular ones more often
+    count = rng.choices((1, 2, 3), weights=(3, 5, 2))[0]
+    genres = []
+    while len(genres) < count:
+        genre = rng.choices(GENRES, weights=GENRE_WEIGHTS)[0]
+        if genre not in genres:
+            genres.append(genre)
+    return ','.join(genres)
+
+
+def popularity(count):
+    # Cumulative weights making the first rows the busiest, for random.choices
+    return list(itertools.accumulate(1 / n ** POPULARITY_SKEW for n in range(1, count + 1)))
+
+
+def entity_rows(prefix, count, rng):
+    rows = []
+    for i in range(1, count + 1):
+        city, state = rng.choices(CITIES, weights=CITY_WEIGHTS)[0]
+        rows.append({
+            'id': i,
+            'name': f'{prefix} {i}',
+            'city': city,
+            'state': state,
+            'phone': f'{rng.randint(200, 999)}-555-{rng.randint(0, 9999):04d}',
+            'genres': pick_genres(rng),
+        })
+    return rows
+
+
+def show_rows(count, venue_rows, artist_rows, rng, now):
+    # The venues of each city, busiest first, with their cumulative popularity
+    weights = popularity(len(venue_rows))
+    by_city = {}
+    for row, weight in zip(venue_rows, [weights[0]] + [b - a for a, b in zip(weights, weights[1:])]):
+        ids, cumulative = by_city.setdefault(row['city'], ([], []))
+        ids.append(row['id'])
+        cumulative.append((cumulative[-1] if cumulative else 0) + weight)
+    venue_ids = [row['id'] for row in venue_rows]
+
+    rows = []
+    artists = rng.choices(artist_rows, cum_weights=popularity(len(artist_rows)), k=count)
+    for i, artist in enumerate(artists, 1):
+        if artist['city'] in by_city and rng.random() < HOME_CITY_SHARE:
+            ids, cumulative = by_city[artist['city']]
+            venue_id = ids[bisect.bisect(cumulative, rng.random() * cumulative[-1])]
+        else:
+            venue_id = rng.choices(venue_ids, cum_weights=weights)[0]
+        # An evening within a year either side of now, with half the Monday to Thursday shows moved to the weekend
+        day = now + timedelta(days=rng.randint(-365, 365))
+        if day.weekday() < 4 and rng.random() < 0.5:
+            day += timedelta(days=4 - day.weekday() + rng.randint(0, 1))
+        start_time = day.replace(hour=rng.randint(18, 22), minute=rng.choice((0, 30)))
+        rows.append({
+            'id': i,
+            'artist_id': artist['id'],
+            'venue_id': venue_id,
+            'start_time': start_time,
+            'is_upcoming': start_time >= now,
+        })
+    return rows
+
+
+def seed(venues=1000, artists=1000, shows=5000, seed=0):
+    """Recreate the schema and bulk insert deterministic rows."""
+    rng = random.Random(seed)
+    now = datetime.now().replace(second=0, microsecond=0)
+    # The summaries are materialized views on a migrated Postgres database, which DROP TABLE cannot drop
+    drop_views()
+    db.drop_all()
+    db.create_all()
+
+    insert(Genre.__table__, [{'id': i, 'name': name} for i, name in enumerate(GENRES, 1)])
+
+    venue_rows = entity_rows('Venue', venues, rng)
+    for row in venue_rows:
+        row['address'] = f'{row["id"]} Main Street'
+    artist_rows = entity_rows('Artist', artists, rng)
+
+    # Link each row to its genres, as the model's genres validator does for single inserts
+    for table, rows, link, column in (
+        (Venue.__table__, venue_rows, venue_genres, 'venue_id'),
+        (Artist.__table__, artist_rows, artist_genres, 'artist_id'),
+    ):
+        insert(table, rows)
+        insert(link, [
+            {'genre_id': GENRES.index(name) + 1, column: row['id']}
+            for row in rows for name in row['genres'].split(',')
+        ])
+
+    if venues and artists:
+        insert(Show.__table__, show_rows(shows, venue_rows, artist_rows, rng, now))
+
+    db.session.commit()
+
+    # Bulk inserts bypass the session events, so bring the show counters and day buckets up to date
+    verify(repair=True)
+    rebuild_days()
+    refresh()
+    # Names loaded before the reseed are gone
+    clear_indexes()
+
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        seed(*(int(arg) for arg in sys.argv[1:5]))
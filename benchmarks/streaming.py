@@ -0,0 +1,56 @@
+"""
+Time to first byte and peak memory of the full /shows listing, buffered and streamed
+
+    python -m benchmarks.streaming [shows ...]
+"""
+# Imports
+
+import sys
+import time
+import tracemalloc
+
+from flask import render_template
+
+from app import app, show_data
+from queries import show_listing
+from benchmarks.seed import seed
+from models import Show
+
+BUFFERED_PATH = '/_bench/shows-buffered'
+
+
+@app.route(BUFFERED_PATH)
+def buffered_shows():
+    # How /shows rendered before pagination and streaming: build the whole list, then render it
+    rows = show_listing().order_by(Show.start_time, Show.id).all()
+    return render_template('pages/shows.html', shows=[show_data(show) for show in rows])
+
+
+def measure(client, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get(path, buffered=False)
+    chunks = iter(response.response)
+    first = next(chunks)
+    first_byte = time.perf_counter() - start
+    size = len(first) + sum(len(chunk) for chunk in chunks)
+    total = time.perf_counter() - start
+    response.close()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first_byte, total, peak, size
+
+
+def main(sizes=(10000, 50000, 200000)):
+    client = app.test_client()
+    for size in sizes:
+        with app.app_context():
+            seed(venues=1000, artists=1000, shows=size)
+        for name, path in (('buffered', BUFFERED_PATH), ('streamed', '/shows?stream=1')):
+            first_byte, total, peak, length = measure(client, path)
+            print(f'{name:<9}{size:>8} shows  TTFB {first_byte * 1000:8.1f} ms  total {total * 1000:8.1f} ms'
+                  f'  peak {peak / 2 ** 20:7.1f} MiB  ({length / 2 ** 20:.1f} MiB sent)')
+
+
+if __name__ == '__main__':
+    main(*([tuple(int(arg) for arg in sys.argv[1:])] if sys.argv[1:] else []))
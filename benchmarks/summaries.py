@@ -0,0 +1,50 @@
+"""
+Live area and trending aggregates against the summaries
+
+    python -m benchmarks.summaries [years] [--shows 20000]
+
+Seeds a year either side of today plus the given years of history, as
+benchmarks.calendars does, then times computing the per-city venue and
+upcoming show counts and the trending artists from Show on every request,
+as the home page would without the summaries, against reading
+them from AreaSummary and TrendingArtist after a refresh. The refresh
+itself is timed once, as cron runs it.
+"""
+# Imports
+
+import argparse
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from app import app
+from benchmarks.calendars import add_history, timed
+from benchmarks.seed import seed
+from models import db, Show
+from summaries import area_query, refresh, top_areas, trending_artists, trending_query
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time live aggregates against the area and trending summaries')
+    parser.add_argument('years', type=int, nargs='?', default=10)
+    parser.add_argument('--shows', type=int, default=20000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        seed(venues=500, artists=500, shows=args.shows)
+        add_history(args.years)
+        total = db.session.execute(select(func.count(Show.id))).scalar()
+        started = datetime.now()
+        refresh()
+        print(f'{total} shows, refresh {(datetime.now() - started).total_seconds() * 1000:.2f} ms')
+
+        now = datetime.now()
+        for name, live, summary in (
+            ('top areas', lambda: db.session.execute(area_query(now)).all(), lambda: top_areas(5)),
+            ('trending', lambda: db.session.execute(trending_query(now)).all(), lambda: trending_artists(10)),
+        ):
+            print(f'{name:<10} live {timed(live):8.2f} ms  summary {timed(summary):6.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Measure bulk import throughput against creating rows one commit at a time
+
+    python -m benchmarks.transfer [venues] [shows]
+
+Writes synthetic CSV and NDJSON files, imports them with transfer.py into
+an empty database and compares with the ORM path the create forms take.
+"""
+# Imports
+
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from app import app
+from benchmarks.seed import CITIES, GENRES, seed
+from models import db, Venue
+from transfer import import_rows, read_rows
+
+# Rows created through the ORM for the one-commit-per-row baseline
+ORM_ROWS = 500
+
+
+def venue_rows(count, rng):
+    for i in range(1, count + 1):
+        city, state = rng.choice(CITIES)
+        yield {
+            'name': f'Imported Venue {i}',
+            'city': city,
+            'state': state,
+            'address': f'{i} Main Street',
+            'phone': f'{rng.randint(200, 999)}-555-{rng.randint(0, 9999):04d}',
+            'genres': ','.join(rng.sample(GENRES, 2)),
+        }
+
+
+def show_rows(count, venues, artists, rng):
+    now = datetime.now()
+    for i in range(count):
+        yield {
+            'start_time': (now + timedelta(hours=rng.randint(-24 * 365, 24 * 365))).isoformat(),
+            'venue_name': f'Imported Venue {rng.randint(1, venues)}',
+            'venue_city': None,
+            'artist_id': rng.randint(1, artists),
+        }
+
+
+def write(path, rows, format):
+    rows = list(rows)
+    with open(path, 'w', newline='') as file:
+        if format == 'csv':
+            writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            file.writelines(json.dumps(row) + '\n' for row in rows)
+    return rows
+
+
+def timed_import(kind, path, format):
+    with open(path, newline='') as file:
+        started = time.perf_counter()
+        imported, rejected = import_rows(kind, read_rows(file, format))
+        return imported, rejected, time.perf_counter() - started
+
+
+def main(venues=50000, shows=200000):
+    rng = random.Random(0)
+    directory = tempfile.mkdtemp()
+    with app.app_context():
+        seed(venues=0, artists=1000, shows=0)
+
+        # One ORM object and one commit per row, as create_venue_submission does
+        orm = list(venue_rows(ORM_ROWS, random.Random(1)))
+        started = time.perf_counter()
+        for row in orm:
+            db.session.add(Venue(**dict(row, name='ORM ' + row['name'])))
+            db.session.commit()
+        elapsed = time.perf_counter() - started
+        print(f'{"orm":>8}: {ORM_ROWS / elapsed:10,.0f} rows/s  ({ORM_ROWS} venues, one commit each)')
+
+        for format in ('csv', 'ndjson'):
+            seed(venues=0, artists=1000, shows=0)
+            path = os.path.join(directory, f'venues.{format}')
+            rows = write(path, venue_rows(venues, random.Random(2)), format)
+            imported, rejected, elapsed = timed_import('venues', path, format)
+            print(f'{format:>8}: {imported / elapsed:10,.0f} rows/s  ({imported} venues inserted)')
+
+            # Importing the same file again updates every row
+            imported, rejected, elapsed = timed_import('venues', path, format)
+            print(f'{format:>8}: {imported / elapsed:10,.0f} rows/s  ({imported} venues upserted)')
+
+            # Shows resolve their venue by name, city and state
+            cities = {row['name']: (row['city'], row['state']) for row in rows}
+            shows_path = os.path.join(directory, f'shows.{format}')
+            write(shows_path, (
+                dict(show, venue_city=cities[show['venue_name']][0], venue_state=cities[show['venue_name']][1])
+                for show in show_rows(shows, venues, 1000, rng)
+            ), format)
+            imported, rejected, elapsed = timed_import('shows', shows_path, format)
+            print(f'{format:>8}: {imported / elapsed:10,.0f} rows/s  ({imported} shows inserted, {rejected} rejected)')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
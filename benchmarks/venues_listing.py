@@ -0,0 +1,53 @@
+"""
+Compare the original /venues grouping with the grouped count query
+
+    python -m benchmarks.venues_listing [venues] [shows]
+"""
+# Imports
+
+import sys
+import timeit
+from datetime import datetime
+
+from app import app, get_venue_areas, venue_rows
+from benchmarks.seed import seed
+from models import db, Venue
+
+
+def legacy_venue_areas():
+    # The original implementation: load every venue and scan the areas list for each one
+    data = []
+    for venue in Venue.query.all():
+        found = False
+        for item in data:
+            if item['city'] == venue.city and item['state'] == venue.state:
+                item['venues'].append({'id': venue.id, 'name': venue.name, 'num_upcoming_shows': 0})
+                found = True
+                break
+        if not found:
+            data.append({
+                'city': venue.city,
+                'state': venue.state,
+                'venues': [{'id': venue.id, 'name': venue.name, 'num_upcoming_shows': 0}]
+            })
+    return data
+
+
+def main(venues=20000, shows=100000, repeat=5):
+    with app.app_context():
+        seed(venues=venues, artists=1000, shows=shows)
+        def grouped_venue_areas():
+            now = datetime.now()
+            return get_venue_areas(venue_rows(
+                db.session.query(Venue.id, Venue.name, Venue.city, Venue.state), now
+            ).order_by(
+                Venue.state, Venue.city, Venue.id
+            ).all(), now)
+
+        for name, fn in (('legacy', legacy_venue_areas), ('grouped', grouped_venue_areas)):
+            best = min(timeit.repeat(fn, number=1, repeat=repeat))
+            print(f'{name:>8}: {best * 1000:8.1f} ms  ({venues} venues, {shows} shows)')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,282 @@
+"""
+Read-through cache for the venue and artist detail pages
+
+Entries are keyed per entity ('venue:<id>', 'artist:<id>') and dropped
+as soon as a commit changes that venue or artist, or one of their
+shows. Each entry also expires when its next upcoming show starts, so
+the past/upcoming split never goes stale.
+
+Commits only drop entries from the backend of the process that made
+them: the in-process 'lru' backend of every other worker keeps its copy.
+So each entry is stored with the version of the page's validator (see
+conditional.py) it was built at and served only while the validator
+still reads the same, which catches commits made by other workers and
+imports. Entries are built from the primary, never a lagging replica,
+so an entry is never older than the version it is stored under.
+"""
+# Imports
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import event, select
+
+from models import db, Artist, Venue, Show
+from replicas import primary
+
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+class LRUCache:
+    """In-process cache holding at most max_entries values."""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete_many(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {'entries': len(self.entries), 'evictions': self.evictions}
+
+
+class RedisCache:
+    """Cache stored in Redis, or anything with the same get/set/delete interface."""
+
+    def __init__(self, client, prefix='fyyur:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value, timeout):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=max(1, int(timeout)))
+
+    def delete_many(self, keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self):
+        # Redis evicts on its own, so report the server's count
+        return {'evictions': self.client.info('stats').get('evicted_keys', 0)}
+
+
+class FakeRedis:
+    """Minimal in-memory stand-in for a Redis client, for development and tests."""
+
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        with self.lock:
+            value, expires = self.values.get(name, (None, None))
+            if expires is not None and expires <= time.monotonic():
+                del self.values[name]
+                return None
+            return value
+
+    def set(self, name, value, ex=None):
+        with self.lock:
+            self.values[name] = (value, None if ex is None else time.monotonic() + ex)
+
+    def delete(self, *names):
+        with self.lock:
+            return sum(self.values.pop(name, None) is not None for name in names)
+
+    def scan_iter(self, match='*'):
+        prefix = match.rstrip('*')
+        return [name for name in list(self.values) if name.startswith(prefix)]
+
+    def info(self, section=None):
+        return {'evicted_keys': 0}
+
+
+#----------------------------------------------------------------------------#
+# Cache.
+#----------------------------------------------------------------------------#
+
+class PageCache:
+    """Cache of the assembled detail page data, configured from the app config.
+
+    CACHE_TYPE is 'lru' (default), 'redis' or 'null'. CACHE_REDIS_URL may be
+    'fake://' to use the in-memory stand-in.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.timeout = 300
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config.get('CACHE_TYPE', 'lru')
+        self.timeout = app.config.get('CACHE_TIMEOUT', 300)
+        if kind == 'lru':
+            self.backend = LRUCache(app.config.get('CACHE_MAX_ENTRIES', 1000))
+        elif kind == 'redis':
+            url = app.config.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+            if url.startswith('fake://'):
+                self.backend = RedisCache(FakeRedis())
+            else:
+                import redis
+                self.backend = RedisCache(redis.Redis.from_url(url))
+        else:
+            self.backend = None
+        app.extensions['page_cache'] = self
+
+    def get(self, key, version=None):
+        """Return the value cached for key at version, or None, counting the hit or miss."""
+        if self.backend is None:
+            return None
+        entry = self.backend.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def set(self, key, value, expires=None, version=None):
+        """Cache value at version until the configured timeout or expires, whichever comes first."""
+        if self.backend is not None and value is not None:
+            timeout = self.timeout
+            if expires is not None:
+                timeout = min(timeout, (expires - datetime.now()).total_seconds())
+            if timeout > 0:
+                self.backend.set(key, (version, value), timeout)
+
+    def get_or_set(self, key, build, version):
+        """Return the value cached for key at version, or build and cache it.
+
+        version is the version of the page's validator, read before the
+        call; with None the value is built without the cache. build returns
+        (value, expires), where expires is an optional datetime after which
+        the value must not be served, and runs against the primary. A value
+        of None is returned without being cached.
+        """
+        value = self.get(key, version) if version is not None else None
+        if value is None:
+            with primary():
+                value, expires = build()
+            if version is not None:
+                self.set(key, value, expires, version)
+        return value
+
+    def delete_many(self, keys):
+        if self.backend is not None:
+            self.backend.delete_many(keys)
+
+    def clear(self):
+        # Drop every entry, e.g. after a bulk load that bypassed the session events
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        stats = {'hits': self.hits, 'misses': self.misses}
+        if self.backend is not None:
+            stats.update(self.backend.stats())
+        return stats
+
+
+page_cache = PageCache()
+
+
+#----------------------------------------------------------------------------#
+# Invalidation.
+#----------------------------------------------------------------------------#
+
+def _show_keys(show_rows):
+    keys = set()
+    for venue_id, artist_id in show_rows:
+        keys.add(f'venue:{venue_id}')
+        keys.add(f'artist:{artist_id}')
+    return keys
+
+
+@event.listens_for(db.session, 'before_flush')
+def _collect_before_flush(session, flush_context, instances):
+    keys = session.info.setdefault('page_cache_keys', set())
+
+    # Changed and deleted shows may be leaving a venue or artist, so look up where they were
+    shows = [show.id for show in list(session.dirty) + list(session.deleted) if isinstance(show, Show) and show.id]
+    if shows:
+        table = Show.__table__
+        keys |= _show_keys(session.connection().execute(
+            select(table.c.venue_id, table.c.artist_id).where(table.c.id.in_(shows))
+        ))
+
+    # A venue or artist name appears on the pages of everyone it has shows with
+    for model, prefix, other, column, other_column in (
+        (Venue, 'venue', 'artist', Show.venue_id, Show.artist_id),
+        (Artist, 'artist', 'venue', Show.artist_id, Show.venue_id),
+    ):
+        ids = [instance.id for instance in list(session.dirty) + list(session.deleted) if isinstance(instance, model)]
+        if ids:
+            keys.update(f'{prefix}:{id}' for id in ids)
+            keys.update(f'{other}:{id}' for id, in session.connection().execute(
+                select(other_column).where(column.in_(ids)).distinct()
+            ))
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_after_flush(session, flush_context):
+    # New and moved shows belong to their venue and artist now that foreign keys are set
+    keys = session.info.setdefault('page_cache_keys', set())
+    keys |= _show_keys(
+        (show.venue_id, show.artist_id) for show in list(session.new) + list(session.dirty) if isinstance(show, Show)
+    )
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate(session):
+    keys = session.info.pop('page_cache_keys', None)
+    if keys:
+        page_cache.delete_many(keys)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard(session):
+    session.info.pop('page_cache_keys', None)
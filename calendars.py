@@ -0,0 +1,229 @@
+"""
+Show calendars: day counts and iCal feeds
+
+    flask calendar rebuild-days
+
+ShowDay holds the number of shows each venue has starting on each day.
+Session events keep it current as shows are created, moved and deleted,
+like the show counters, so the shows per day of a city over a month are
+read from at most days x venues small rows however many shows there
+are. Bulk imports add their shows with count_show_days, and
+rebuild-days recounts everything, e.g. after loading rows outside the
+app. Set CALENDAR_DAY_BUCKETS=0 to count the shows instead.
+
+Each venue and artist has an iCal feed of its shows from ICAL_PAST_DAYS
+ago on, for calendar apps to subscribe to.
+"""
+# Imports
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, delete, event, func, insert, select, tuple_, update
+
+from models import db, Artist, Venue, Show, ShowDay
+
+# Widest window of day counts served at once
+MAX_CALENDAR_DAYS = 366
+
+# iCal lines longer than this many octets are folded
+ICAL_LINE_OCTETS = 75
+
+
+#----------------------------------------------------------------------------#
+# Day buckets.
+#----------------------------------------------------------------------------#
+
+def add_days(connection, deltas):
+    """Add {(day, venue_id): shows} to the ShowDay buckets, dropping the buckets left empty."""
+    deltas = {key: delta for key, delta in deltas.items() if delta and None not in key}
+    if not deltas:
+        return
+    table = ShowDay.__table__
+    existing = set(connection.execute(
+        select(table.c.day, table.c.venue_id).where(tuple_(table.c.day, table.c.venue_id).in_(list(deltas)))
+    ).all())
+    changed = [
+        {'bucket_day': day, 'bucket_venue_id': venue_id, 'delta': delta}
+        for (day, venue_id), delta in deltas.items() if (day, venue_id) in existing
+    ]
+    if changed:
+        connection.execute(update(table).where(
+            table.c.day == bindparam('bucket_day'), table.c.venue_id == bindparam('bucket_venue_id')
+        ).values(shows=table.c.shows + bindparam('delta')), changed)
+        connection.execute(delete(table).where(
+            tuple_(table.c.day, table.c.venue_id).in_([(row['bucket_day'], row['bucket_venue_id']) for row in changed]),
+            table.c.shows <= 0,
+        ))
+    # A bucket is only missing when its venue gained shows, deleted venues take theirs along
+    new = [
+        {'day': day, 'venue_id': venue_id, 'shows': delta}
+        for (day, venue_id), delta in deltas.items() if (day, venue_id) not in existing and delta > 0
+    ]
+    if new:
+        connection.execute(insert(table), new)
+
+
+def count_show_days(shows):
+    """Add shows inserted in bulk, bypassing the session events, to the day buckets.
+
+    shows is an iterable of (start_time, venue_id) pairs. The caller commits.
+    """
+    deltas = defaultdict(int)
+    for start_time, venue_id in shows:
+        deltas[(start_time.date(), venue_id)] += 1
+    add_days(db.session.connection(), deltas)
+
+
+def rebuild_days():
+    """Recount every bucket from the shows, returning the number of buckets."""
+    table = ShowDay.__table__
+    day = func.date(Show.start_time)
+    db.session.execute(delete(table))
+    db.session.execute(insert(table).from_select(
+        ['day', 'venue_id', 'shows'],
+        select(day, Show.venue_id, func.count(Show.id)).group_by(day, Show.venue_id)
+    ))
+    count = db.session.execute(select(func.count()).select_from(table)).scalar()
+    db.session.commit()
+    return count
+
+
+@event.listens_for(db.session, 'before_flush')
+def _before_flush(session, flush_context, instances):
+    # Start from scratch in case a previous flush failed part way through
+    deltas = session.info['show_day_deltas'] = defaultdict(int)
+    moved = session.info['show_day_moved'] = [
+        show for show in session.dirty if isinstance(show, Show) and session.is_modified(show)
+    ]
+
+    # Deleted and moved shows are counted out of their previous day and venue, read back from the
+    # database since the attributes may have been overwritten without being loaded
+    previous = [show.id for show in list(session.deleted) + moved if isinstance(show, Show) and show.id]
+    if previous:
+        table = Show.__table__
+        for start_time, venue_id in session.connection().execute(
+            select(table.c.start_time, table.c.venue_id).where(table.c.id.in_(previous))
+        ):
+            deltas[(start_time.date(), venue_id)] -= 1
+
+
+@event.listens_for(db.session, 'after_flush')
+def _after_flush(session, flush_context):
+    deltas = session.info.pop('show_day_deltas', None)
+    if deltas is None:
+        return
+    # Foreign keys are populated now, so new and moved shows are counted into their current day and venue
+    for show in list(session.new) + session.info.pop('show_day_moved', []):
+        if isinstance(show, Show):
+            deltas[(show.start_time.date(), show.venue_id)] += 1
+    add_days(session.connection(), deltas)
+
+
+def day_counts(start, end, city=None, state=None):
+    """Return [(date, shows)] for the days from start up to, not including, end with any shows."""
+    if current_app.config['CALENDAR_DAY_BUCKETS']:
+        day, count = ShowDay.day, func.sum(ShowDay.shows)
+        query = select(day, count).where(ShowDay.day >= start, ShowDay.day < end)
+        venue_id = ShowDay.venue_id
+    else:
+        day, count = func.date(Show.start_time), func.count(Show.id)
+        query = select(day, count).where(
+            Show.start_time >= datetime.combine(start, datetime.min.time()),
+            Show.start_time < datetime.combine(end, datetime.min.time()),
+        )
+        venue_id = Show.venue_id
+    if city or state:
+        query = query.join(Venue, Venue.id == venue_id)
+        query = query.where(*(
+            getattr(Venue, field) == value for field, value in (('city', city), ('state', state)) if value
+        ))
+    rows = db.session.execute(query.group_by(day).order_by(day)).all()
+    # SQLite returns the dates of the fallback as text
+    return [(date if not isinstance(date, str) else datetime.fromisoformat(date).date(), shows) for date, shows in rows]
+
+
+#----------------------------------------------------------------------------#
+# iCal feeds.
+#----------------------------------------------------------------------------#
+
+def calendar_shows(column, id, since):
+    # The shows of a venue or artist starting from since, with what their events display
+    return db.session.execute(
+        select(
+            Show.id, Show.start_time, Show.end_time, Show.updated_at,
+            Venue.name.label('venue_name'), Venue.address, Venue.city, Venue.state,
+            Artist.name.label('artist_name'),
+        ).join(Venue, Venue.id == Show.venue_id).join(Artist, Artist.id == Show.artist_id).where(
+            column == id, Show.start_time >= since
+        ).order_by(Show.start_time, Show.id)
+    ).all()
+
+
+def escape_text(value):
+    # TEXT values escape backslashes, semicolons, commas and newlines (RFC 5545 3.3.11)
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def fold(line):
+    # Lines over 75 octets continue on lines starting with a space, without splitting a character
+    parts, part, size = [], '', 0
+    for character in line:
+        octets = len(character.encode())
+        if size + octets > ICAL_LINE_OCTETS:
+            parts.append(part)
+            part, size = ' ', 1
+        part += character
+        size += octets
+    parts.append(part)
+    return '\r\n'.join(parts)
+
+
+def ical(name, shows, host, url=None):
+    """An iCalendar document with an event per show, as returned by calendar_shows, linking to url."""
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Fyyur//Shows//EN',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(name)}',
+    ]
+    for show in shows:
+        # Start and end are stored as local times without a zone, so they stay floating times
+        lines += [
+            'BEGIN:VEVENT',
+            f'UID:show-{show.id}@{host}',
+            f'DTSTAMP:{stamp}',
+            f"LAST-MODIFIED:{show.updated_at.astimezone(timezone.utc):%Y%m%dT%H%M%SZ}",
+            f'DTSTART:{show.start_time:%Y%m%dT%H%M%S}',
+            f'DTEND:{show.end_time:%Y%m%dT%H%M%S}',
+            f'SUMMARY:{escape_text(f"{show.artist_name} at {show.venue_name}")}',
+            f"LOCATION:{escape_text(', '.join(value for value in (show.address, show.city, show.state) if value))}",
+        ]
+        if url is not None:
+            lines.append(f'URL:{url}')
+        lines.append('END:VEVENT')
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(fold(line) for line in lines) + '\r\n'
+
+
+def feed_start():
+    return datetime.now() - timedelta(days=current_app.config['ICAL_PAST_DAYS'])
+
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+calendar_cli = AppGroup('calendar', help='Maintain the calendar day counts.')
+
+
+@calendar_cli.command('rebuild-days')
+def rebuild_days_command():
+    """Recount the shows per venue and day from the shows."""
+    click.echo(f'Rebuilt {rebuild_days()} day buckets.')
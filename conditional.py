@@ -0,0 +1,207 @@
+"""
+Conditional GET for the listing and detail pages
+
+Each page has a validator: one cheap aggregate query over the updated_at
+columns of the rows it shows, plus the start of the latest show that has
+already begun, since the past/upcoming split moves whenever a show
+starts. The validator becomes a weak ETag and the Last-Modified date,
+and a browser revalidating a page it already has gets a 304 before the
+page's own queries run or a template is rendered.
+
+A show's row does not outlive its deletion, so deleting or moving a show
+touches the venue and artist it belonged to instead. Counts catch
+deleted venues and artists on the listings.
+
+The validator reads from the same database as the page, a replica for
+most GETs, and before the page does, so the page is never older than
+its ETag. The version is also kept for the view (current_version), and
+the page cache serves an entry only while it matches.
+"""
+# Imports
+
+import asyncio
+import hashlib
+import inspect
+import os
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, g, request, session, Response
+from sqlalchemy import event, func, select, update
+
+import assets
+from metrics import metrics
+from models import db, Artist, Venue, Show
+from queries import show_history
+
+
+#----------------------------------------------------------------------------#
+# Validators.
+#----------------------------------------------------------------------------#
+
+def latest_start(now):
+    # The start of the latest show already begun, where the past/upcoming split last moved
+    return select(func.max(Show.start_time)).where(Show.start_time < now).scalar_subquery()
+
+
+def listing_version(*models):
+    """Validator of a listing showing rows of models and their show counts."""
+    counts = [select(func.count(model.id)).scalar_subquery() for model in models]
+    changes = [select(func.max(model.updated_at)).scalar_subquery() for model in models + (Show,)]
+    version = db.session.execute(select(*counts, *changes, latest_start(datetime.now()))).one()
+    return tuple(version), max((value for value in version[len(counts):] if value is not None), default=None)
+
+
+def venues_version():
+    return listing_version(Venue)
+
+
+def artists_version():
+    return listing_version(Artist)
+
+
+def shows_version():
+    return listing_version(Venue, Artist)
+
+
+def detail_version(model, id, column, other, other_column):
+    """Validator of a venue or artist page: the row, its shows and the other side of each show.
+
+    The page lists archived shows too, so their number and the other side of
+    each are read from the show history; archived shows never change.
+    """
+    shows = show_history(column, id)
+    version = db.session.execute(
+        select(
+            model.updated_at,
+            select(func.max(Show.updated_at)).where(Show.__table__.c[column] == id).scalar_subquery(),
+            func.max(other.updated_at),
+            func.max(shows.c.start_time).filter(shows.c.start_time < datetime.now()),
+            func.count(shows.c.start_time),
+        ).select_from(model).outerjoin(shows, shows.c[column] == model.id).outerjoin(
+            other, other.id == shows.c[other_column]
+        ).where(model.id == id).group_by(model.id)
+    ).first()
+    if version is None:
+        return None, None
+    return tuple(version), max((value for value in version[:-1] if value is not None), default=None)
+
+
+def venue_version(venue_id):
+    return detail_version(Venue, venue_id, 'venue_id', Artist, 'artist_id')
+
+
+def artist_version(artist_id):
+    return detail_version(Artist, artist_id, 'artist_id', Venue, 'venue_id')
+
+
+#----------------------------------------------------------------------------#
+# Responses.
+#----------------------------------------------------------------------------#
+
+def template_version(folder):
+    # Pages change with the templates, so a deploy must not revalidate copies rendered by the old ones
+    digest = hashlib.sha1()
+    for root, dirs, files in sorted(os.walk(folder)):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(f'{path}:{os.stat(path).st_mtime_ns}'.encode())
+    return digest.hexdigest()
+
+
+def current_version():
+    """The version the conditional validator read for this request, or None."""
+    return g.get('page_version')
+
+
+def revalidate(validator, kwargs):
+    # (ETag, last modified, whether the client's copy is current), or None to serve the page unconditionally
+    if request.method not in ('GET', 'HEAD'):
+        return None
+
+    version, last_modified = validator(**kwargs)
+    g.page_version = version
+    # Pages carrying flashed messages are not the same page the client has
+    if version is None or '_flashes' in session:
+        return None
+    templates = current_app.extensions.setdefault(
+        'template_version', template_version(os.path.join(current_app.root_path, current_app.template_folder))
+    )
+    # The page links the current asset bundles, whose names change with each build
+    etag = hashlib.sha1(
+        repr((templates, sorted(assets.manifest().items()), request.full_path, version)).encode()
+    ).hexdigest()
+    if last_modified is not None:
+        last_modified = last_modified.astimezone(timezone.utc)
+
+    # If-None-Match takes precedence over If-Modified-Since
+    if request.if_none_match:
+        revalidating, current = True, request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified is not None:
+        revalidating, current = True, last_modified.replace(microsecond=0) <= request.if_modified_since
+    else:
+        revalidating, current = False, False
+    metrics.record_validation(
+        request.endpoint, 'not_modified' if current else 'modified' if revalidating else 'unconditional'
+    )
+    return etag, last_modified, current
+
+
+def validated(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Browsers may reuse the copy only after checking it is still current
+    response.cache_control.no_cache = True
+    return response
+
+
+def conditional(validator):
+    """Answer a GET with 304 Not Modified when the validator shows the client's copy is current.
+
+    validator is called with the view's arguments and returns a version,
+    anything hashable by repr, and the last modified datetime. Async
+    views, as served by asgi.py, run the validator in a worker thread.
+    """
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapped_async(**kwargs):
+                check = await asyncio.to_thread(revalidate, validator, kwargs)
+                if check is None:
+                    return await view(**kwargs)
+                etag, last_modified, current = check
+                response = Response(status=304) if current else current_app.make_response(await view(**kwargs))
+                return validated(response, etag, last_modified)
+            return wrapped_async
+
+        @wraps(view)
+        def wrapped(**kwargs):
+            check = revalidate(validator, kwargs)
+            if check is None:
+                return view(**kwargs)
+            etag, last_modified, current = check
+            response = Response(status=304) if current else current_app.make_response(view(**kwargs))
+            return validated(response, etag, last_modified)
+        return wrapped
+    return decorator
+
+
+#----------------------------------------------------------------------------#
+# Touching.
+#----------------------------------------------------------------------------#
+
+@event.listens_for(db.session, 'before_flush')
+def _touch_previous_owners(session, flush_context, instances):
+    # A deleted or moved show leaves its venue and artist pages without changing a row of their own
+    shows = [show.id for show in list(session.dirty) + list(session.deleted) if isinstance(show, Show) and show.id]
+    if not shows:
+        return
+    connection = session.connection()
+    owners = connection.execute(select(Show.venue_id, Show.artist_id).where(Show.id.in_(shows))).all()
+    now = datetime.now()
+    for table, ids in (
+        (Venue.__table__, {venue_id for venue_id, artist_id in owners}),
+        (Artist.__table__, {artist_id for venue_id, artist_id in owners}),
+    ):
+        connection.execute(update(table).where(table.c.id.in_(ids)).values(updated_at=now))
@@ -0,0 +1,207 @@
+"""
+Past and upcoming show counters on Venue and Artist
+
+Every Show carries an is_upcoming flag recording which counter it was
+added to. Session events adjust the counters of the affected venue and
+artist whenever a show is inserted, deleted or rescheduled, and the
+roll-over job moves shows whose start time has passed from the upcoming
+counters to the past counters in bulk.
+"""
+# Imports
+
+from collections import defaultdict
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import Integer, bindparam, cast, event, func, inspect, select, update
+from sqlalchemy.orm.util import identity_key
+
+from models import db, Artist, Venue, Show
+
+COUNTER_FIELDS = ['past_shows_count', 'upcoming_shows_count']
+
+
+#----------------------------------------------------------------------------#
+# Incremental maintenance.
+#----------------------------------------------------------------------------#
+
+def _add(deltas, venue_id, artist_id, is_upcoming, amount):
+    index = 1 if is_upcoming else 0
+    deltas[(Venue, venue_id)][index] += amount
+    deltas[(Artist, artist_id)][index] += amount
+
+
+@event.listens_for(db.session, 'before_flush')
+def _before_flush(session, flush_context, instances):
+    now = datetime.now()
+    # Start from scratch in case a previous flush failed part way through
+    deltas = session.info['show_counter_deltas'] = defaultdict(lambda: [0, 0])
+    session.info['show_counter_moved'] = set()
+
+    # Deleted shows are counted out before their rows disappear
+    for show in session.deleted:
+        if isinstance(show, Show):
+            _add(deltas, show.venue_id, show.artist_id, show.is_upcoming, -1)
+
+    # Rescheduled and reassigned shows are counted out of their previous venue, artist and counter,
+    # read back from the database since the attributes may have been overwritten without being loaded
+    moved = [show for show in session.dirty if isinstance(show, Show) and session.is_modified(show)]
+    if moved:
+        table = Show.__table__
+        previous = session.connection().execute(
+            select(table.c.venue_id, table.c.artist_id, table.c.is_upcoming).where(table.c.id.in_([show.id for show in moved]))
+        )
+        for venue_id, artist_id, is_upcoming in previous:
+            _add(deltas, venue_id, artist_id, is_upcoming, -1)
+        session.info['show_counter_moved'].update(moved)
+
+    # Classify new and rescheduled shows against the current time
+    for show in list(session.new) + list(session.dirty):
+        if isinstance(show, Show) and (show in session.new or inspect(show).attrs.start_time.history.has_changes()):
+            show.is_upcoming = show.start_time >= now
+
+
+@event.listens_for(db.session, 'after_flush')
+def _after_flush(session, flush_context):
+    deltas = session.info.pop('show_counter_deltas', None)
+    if deltas is None:
+        return
+
+    # Foreign keys are populated now, so new and moved shows are counted into their current venue and artist
+    for show in list(session.new) + list(session.info.pop('show_counter_moved', ())):
+        if isinstance(show, Show):
+            _add(deltas, show.venue_id, show.artist_id, show.is_upcoming, 1)
+
+    connection = session.connection()
+    for (model, id), (past, upcoming) in deltas.items():
+        if id is None or (past == 0 and upcoming == 0):
+            continue
+        connection.execute(update(model.__table__).where(model.__table__.c.id == id).values(
+            past_shows_count=func.coalesce(model.__table__.c.past_shows_count, 0) + past,
+            upcoming_shows_count=func.coalesce(model.__table__.c.upcoming_shows_count, 0) + upcoming,
+        ))
+        session.info.setdefault('show_counter_stale', set()).add(identity_key(model, id))
+
+
+@event.listens_for(db.session, 'after_flush_postexec')
+def _after_flush_postexec(session, flush_context):
+    # The counters were changed behind the ORM's back, so reload them on next access
+    for key in session.info.pop('show_counter_stale', ()):
+        instance = session.identity_map.get(key)
+        if instance is not None:
+            session.expire(instance, COUNTER_FIELDS)
+
+
+#----------------------------------------------------------------------------#
+# Batch jobs.
+#----------------------------------------------------------------------------#
+
+def roll_over(now=None):
+    """Move shows that have started from the upcoming counters to the past counters.
+
+    Returns the number of shows moved.
+    """
+    now = now or datetime.now()
+    started = db.session.query(
+        Show.venue_id,
+        Show.artist_id,
+        func.count(Show.id)
+    ).filter(Show.is_upcoming, Show.start_time < now).group_by(Show.venue_id, Show.artist_id).all()
+
+    moved = defaultdict(int)
+    for venue_id, artist_id, count in started:
+        moved[(Venue, venue_id)] += count
+        moved[(Artist, artist_id)] += count
+
+    for model in (Venue, Artist):
+        table = model.__table__
+        rows = [{'row_id': id, 'moved': count} for (m, id), count in moved.items() if m is model]
+        if rows:
+            db.session.execute(update(table).where(table.c.id == bindparam('row_id')).values(
+                past_shows_count=func.coalesce(table.c.past_shows_count, 0) + bindparam('moved'),
+                upcoming_shows_count=func.coalesce(table.c.upcoming_shows_count, 0) - bindparam('moved'),
+            ), rows)
+
+    db.session.execute(
+        update(Show.__table__).where(Show.__table__.c.is_upcoming, Show.__table__.c.start_time < now).values(is_upcoming=False)
+    )
+    db.session.commit()
+    return sum(count for venue_id, artist_id, count in started)
+
+
+def count_new_shows(shows):
+    """Add shows inserted in bulk, bypassing the session events, to the counters.
+
+    shows is an iterable of (venue_id, artist_id, is_upcoming, number of shows). The caller commits.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for venue_id, artist_id, is_upcoming, count in shows:
+        _add(deltas, venue_id, artist_id, is_upcoming, count)
+
+    for model in (Venue, Artist):
+        table = model.__table__
+        rows = [
+            {'row_id': id, 'past': past, 'upcoming': upcoming}
+            for (m, id), (past, upcoming) in deltas.items() if m is model
+        ]
+        if rows:
+            db.session.execute(update(table).where(table.c.id == bindparam('row_id')).values(
+                past_shows_count=func.coalesce(table.c.past_shows_count, 0) + bindparam('past'),
+                upcoming_shows_count=func.coalesce(table.c.upcoming_shows_count, 0) + bindparam('upcoming'),
+            ), rows)
+
+
+def verify(repair=False):
+    """Recompute the counters from the Show table and report any drift.
+
+    Returns a list of (model name, id, stored (past, upcoming), actual (past, upcoming)).
+    When repair is set the stored counters are overwritten with the actual values.
+    """
+    drift = []
+    for model, column in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+        actual = {
+            id: (past, upcoming) for id, past, upcoming in db.session.query(
+                column,
+                func.count(Show.id) - func.coalesce(func.sum(cast(Show.is_upcoming, Integer)), 0),
+                func.coalesce(func.sum(cast(Show.is_upcoming, Integer)), 0)
+            ).group_by(column)
+        }
+        stored = db.session.query(model.id, model.past_shows_count, model.upcoming_shows_count)
+        for id, past, upcoming in stored:
+            expected = actual.get(id, (0, 0))
+            if (past, upcoming) != expected:
+                drift.append((model.__name__, id, (past, upcoming), expected))
+
+    if repair and drift:
+        for name, id, stored, (past, upcoming) in drift:
+            model = Venue if name == 'Venue' else Artist
+            db.session.execute(update(model.__table__).where(model.__table__.c.id == id).values(
+                past_shows_count=past, upcoming_shows_count=upcoming
+            ))
+        db.session.commit()
+
+    return drift
+
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+counters_cli = AppGroup('counters', help='Maintain the show counters on venues and artists.')
+
+
+@counters_cli.command('rollover')
+def rollover_command():
+    """Move started shows from upcoming to past."""
+    click.echo(f'Moved {roll_over()} shows from upcoming to past.')
+
+
+@counters_cli.command('verify')
+@click.option('--repair', is_flag=True, help='Overwrite drifted counters with the recomputed values.')
+def verify_command(repair):
+    """Recompute the counters and report drift."""
+    drift = verify(repair=repair)
+    for name, id, stored, actual in drift:
+        click.echo(f'{name} {id}: stored past/upcoming {stored}, actual {actual}')
+    click.echo(f'{len(drift)} counters drifted' + (' and were repaired.' if repair and drift else '.'))
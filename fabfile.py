@@ -1,14 +1,27 @@
+import os
+
 from fabric.api import local, settings, abort
 from fabric.contrib.console import confirm
 
+# The benchmarks recreate their database, so never let them near a real one
+BENCHMARK_ENV = "DATABASE_URL=sqlite:////tmp/fyyur_bench.db"
+BASELINE = "benchmarks/results/baseline.json"
+
 # prepare for deployment
 
 
+def checks():
+    # The test suite, including the query budgets, always; endpoint timings against the committed
+    # baseline when there is one
+    command = "python -m pytest -q"
+    if os.path.exists(BASELINE):
+        command += " && {} python -m benchmarks.endpoints --baseline {}".format(BENCHMARK_ENV, BASELINE)
+    return command
+
+
 def test():
     with settings(warn_only=True):
-        result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
-        )
+        result = local(checks(), capture=True)
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
@@ -40,7 +53,7 @@ def heroku():
 
 def heroku_test():
     local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
+        "heroku run '{} python -m benchmarks.query_counts'".format(BENCHMARK_ENV)
     )
 
 
@@ -0,0 +1,130 @@
+"""
+In-process indexes built from the database and kept in step with it
+
+search.py, autocomplete.py and schedule.py hold indexes of venue, artist
+and show rows in memory. Each registers a SyncedIndexes here, which
+builds a model's index on first use and applies the rows this process
+commits through the session once each commit succeeds. Other worker
+processes commit too, so at most every INDEX_SYNC_SECONDS an index also
+reads back the rows whose updated_at moved since it last looked, and is
+rebuilt when its number of rows no longer matches the table's, as after
+deletes made elsewhere or bulk statements that bypass updated_at.
+"""
+# Imports
+
+import threading
+import time
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import event, func, select
+
+from models import db
+
+# Rows changed this long before the last sync are read again, as a transaction may commit
+# some time after it set updated_at
+SYNC_OVERLAP = timedelta(minutes=1)
+
+
+class Built:
+    """A built index with the point its rows were last read up to."""
+
+    def __init__(self, index, since):
+        self.index = index
+        self.since = since
+        self.checked = time.monotonic()
+
+
+class SyncedIndexes:
+    """One in-process index per model, built from the database and kept current.
+
+    columns(model) are the columns the index is built from, the id first.
+    factory(rows) builds an index from rows of those columns; the index
+    must have add(id, *values), remove(id) and len(). values(instance)
+    are the values of a changed instance to add, in the same order.
+    """
+
+    def __init__(self, name, models, columns, factory, values):
+        self.key = f'{name}_changes'
+        self.models = tuple(models)
+        self.columns = columns
+        self.factory = factory
+        self.values = values
+        self.built = {}
+        self.lock = threading.Lock()
+        event.listen(db.session, 'after_flush', self._collect_changes)
+        event.listen(db.session, 'after_commit', self._apply_changes)
+        event.listen(db.session, 'after_rollback', self._discard_changes)
+
+    def get(self, model):
+        """The model's index, built on first use and brought up to date with other processes' commits."""
+        with self.lock:
+            built = self.built.get(model)
+            if built is None:
+                built = self.built[model] = self._build(model)
+            elif self._due(built) and not self._sync(model, built):
+                built = self.built[model] = self._build(model)
+            return built.index
+
+    def clear(self):
+        """Drop the built indexes, e.g. after the tables were reloaded outside the session."""
+        with self.lock:
+            self.built.clear()
+
+    def record(self, model, rows):
+        """Add rows of the columns, inserted outside the session, to the model's index if it is built."""
+        built = self.built.get(model)
+        if built is not None:
+            for row in rows:
+                built.index.add(*row)
+
+    def _due(self, built):
+        # Rows this session flushed but has not committed must not reach the index, so wait for the commit
+        if db.session.info.get(self.key):
+            return False
+        return time.monotonic() - built.checked >= current_app.config.get('INDEX_SYNC_SECONDS', 5)
+
+    def _build(self, model):
+        # Rows committed while the index loads are read again by the first sync
+        since = db.session.execute(select(func.max(model.updated_at))).scalar()
+        index = self.factory(db.session.execute(select(*self.columns(model)).execution_options(yield_per=10000)))
+        return Built(index, since)
+
+    def _sync(self, model, built):
+        # Apply the rows changed since the last look; False when rows went missing and a rebuild is needed
+        built.checked = time.monotonic()
+        since = db.session.execute(select(func.max(model.updated_at))).scalar()
+        if built.since is not None and since is not None:
+            for row in db.session.execute(
+                select(*self.columns(model)).where(model.updated_at >= built.since - SYNC_OVERLAP)
+            ):
+                built.index.add(*row)
+        elif since != built.since:
+            return False
+        built.since = since
+        return len(built.index) == db.session.execute(select(func.count(model.id))).scalar()
+
+    # Session events.
+
+    def _collect_changes(self, session, flush_context):
+        changes = session.info.setdefault(self.key, {})
+        for instance in list(session.new) + list(session.dirty):
+            if isinstance(instance, self.models):
+                changes[(type(instance), instance.id)] = self.values(instance)
+        for instance in session.deleted:
+            if isinstance(instance, self.models):
+                changes[(type(instance), instance.id)] = None
+
+    def _apply_changes(self, session):
+        # Only indexes that have already been built need updating, the rest load fresh rows when built
+        for (model, id), values in session.info.pop(self.key, {}).items():
+            built = self.built.get(model)
+            if built is None:
+                continue
+            if values is None:
+                built.index.remove(id)
+            else:
+                built.index.add(id, *values)
+
+    def _discard_changes(self, session):
+        session.info.pop(self.key, None)
@@ -0,0 +1,196 @@
+"""
+Connection pool and per-request SQL metrics
+
+Served at /metrics in the Prometheus text format, or as JSON with
+?format=json. Every worker process keeps its own figures, like the page
+cache statistics.
+
+Checkout waits are timed by a QueuePool subclass installed through the
+engine options, so init_app has to run before db.init_app. SQLite
+in-memory databases keep their single-connection pool and report no
+waits.
+"""
+# Imports
+
+import threading
+import time
+from collections import defaultdict
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+
+
+class Metrics:
+    """Counters for connection checkouts and for the SQL each endpoint runs."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.checkout_wait = 0.0
+        self.max_checkout_wait = 0.0
+        self.endpoints = defaultdict(lambda: {'requests': 0, 'queries': 0, 'sql_seconds': 0.0, 'max_queries': 0})
+        self.validations = defaultdict(lambda: {'not_modified': 0, 'modified': 0, 'unconditional': 0})
+
+    def record_checkout(self, seconds, timed_out=False):
+        with self.lock:
+            self.checkouts += 1
+            self.checkout_timeouts += timed_out
+            self.checkout_wait += seconds
+            self.max_checkout_wait = max(self.max_checkout_wait, seconds)
+
+    def record_request(self, endpoint, queries, seconds):
+        with self.lock:
+            stats = self.endpoints[endpoint]
+            stats['requests'] += 1
+            stats['queries'] += queries
+            stats['sql_seconds'] += seconds
+            stats['max_queries'] = max(stats['max_queries'], queries)
+
+    def record_validation(self, endpoint, outcome):
+        # outcome is 'not_modified' or 'modified' for a revalidated copy, 'unconditional' for a first visit
+        with self.lock:
+            self.validations[endpoint][outcome] += 1
+
+    def snapshot(self, engines):
+        """Return the counters and the state of each engine's pool, keyed by bind name."""
+        pools = {}
+        for bind, engine in engines.items():
+            pool = engine.pool
+            pools[bind or 'default'] = {
+                'class': type(pool).__name__,
+                'checked_out': pool.checkedout() if hasattr(pool, 'checkedout') else None,
+                'size': pool.size() if hasattr(pool, 'size') else None,
+                # QueuePool counts overflow from -size, so only the connections beyond size are overflow
+                'overflow': max(0, pool.overflow()) if hasattr(pool, 'overflow') else None,
+            }
+        with self.lock:
+            return {
+                'pools': pools,
+                'checkouts': self.checkouts,
+                'checkout_timeouts': self.checkout_timeouts,
+                'checkout_wait_seconds': self.checkout_wait,
+                'max_checkout_wait_seconds': self.max_checkout_wait,
+                'endpoints': {endpoint: dict(stats) for endpoint, stats in self.endpoints.items()},
+                'validations': {endpoint: dict(stats) for endpoint, stats in self.validations.items()},
+            }
+
+
+metrics = Metrics()
+
+
+def prometheus(snapshot):
+    """Format a snapshot in the Prometheus text exposition format."""
+    lines = []
+
+    def metric(name, kind, help, samples):
+        lines.append(f'# HELP fyyur_{name} {help}')
+        lines.append(f'# TYPE fyyur_{name} {kind}')
+        for labels, value in samples:
+            if value is not None:
+                label = ','.join(f'{key}="{value}"' for key, value in labels.items())
+                lines.append(f'fyyur_{name}{{{label}}} {value}' if label else f'fyyur_{name} {value}')
+
+    pools = snapshot['pools'].items()
+    metric('db_pool_checked_out', 'gauge', 'Connections currently checked out of the pool.',
+           [({'bind': bind}, pool['checked_out']) for bind, pool in pools])
+    metric('db_pool_size', 'gauge', 'Connections the pool keeps open.',
+           [({'bind': bind}, pool['size']) for bind, pool in pools])
+    metric('db_pool_overflow', 'gauge', 'Connections open beyond the pool size.',
+           [({'bind': bind}, pool['overflow']) for bind, pool in pools])
+    metric('db_checkouts_total', 'counter', 'Connections checked out of a pool.', [({}, snapshot['checkouts'])])
+    metric('db_checkout_timeouts_total', 'counter', 'Checkouts that gave up waiting for a connection.',
+           [({}, snapshot['checkout_timeouts'])])
+    metric('db_checkout_wait_seconds_total', 'counter', 'Time spent waiting for a connection, including opening one.',
+           [({}, snapshot['checkout_wait_seconds'])])
+    metric('db_checkout_wait_seconds_max', 'gauge', 'Longest wait for a connection.',
+           [({}, snapshot['max_checkout_wait_seconds'])])
+
+    endpoints = snapshot['endpoints'].items()
+    metric('requests_total', 'counter', 'Requests handled.',
+           [({'endpoint': endpoint}, stats['requests']) for endpoint, stats in endpoints])
+    metric('request_queries_total', 'counter', 'SQL statements run by requests.',
+           [({'endpoint': endpoint}, stats['queries']) for endpoint, stats in endpoints])
+    metric('request_queries_max', 'gauge', 'Most SQL statements run by one request.',
+           [({'endpoint': endpoint}, stats['max_queries']) for endpoint, stats in endpoints])
+    metric('request_sql_seconds_total', 'counter', 'Time requests spent executing SQL.',
+           [({'endpoint': endpoint}, stats['sql_seconds']) for endpoint, stats in endpoints])
+
+    # The share of revalidations answered with 304 is not_modified / (not_modified + modified)
+    metric('conditional_requests_total', 'counter', 'Page requests by conditional GET outcome.', [
+        ({'endpoint': endpoint, 'outcome': outcome}, count)
+        for endpoint, stats in snapshot['validations'].items() for outcome, count in stats.items()
+    ])
+    return '\n'.join(lines) + '\n'
+
+
+#----------------------------------------------------------------------------#
+# Pool.
+#----------------------------------------------------------------------------#
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout took to get a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            metrics.record_checkout(time.perf_counter() - started, timed_out=True)
+            raise
+        metrics.record_checkout(time.perf_counter() - started)
+        return connection
+
+
+def engine_options(uri, options):
+    # Time checkouts wherever SQLAlchemy would use a QueuePool, which is everywhere but SQLite in memory
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options
+    return dict(options, poolclass=options.get('poolclass', TimedQueuePool))
+
+
+#----------------------------------------------------------------------------#
+# Statements.
+#----------------------------------------------------------------------------#
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    if has_request_context():
+        g.sql_queries = g.get('sql_queries', 0) + 1
+        g.sql_seconds = g.get('sql_seconds', 0.0) + elapsed
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    if context.connection is not None and context.connection.info.get('query_started'):
+        context.connection.info['query_started'].pop()
+
+
+#----------------------------------------------------------------------------#
+# Requests.
+#----------------------------------------------------------------------------#
+
+def init_app(app):
+    """Install the timed pool and record each request's SQL. Call before db.init_app."""
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(
+        app.config['SQLALCHEMY_DATABASE_URI'], app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    )
+    binds = app.config.get('SQLALCHEMY_BINDS', {})
+    for key, bind in binds.items():
+        if isinstance(bind, dict):
+            binds[key] = engine_options(bind['url'], bind)
+
+    # Teardown runs after a streamed response has finished, so its queries are counted too
+    @app.teardown_request
+    def _record_request(exception):
+        metrics.record_request(request.endpoint or 'unmatched', g.get('sql_queries', 0), g.get('sql_seconds', 0.0))
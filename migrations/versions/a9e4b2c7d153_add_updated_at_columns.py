@@ -0,0 +1,38 @@
+"""Add updated_at to venues, artists and shows for conditional GET
+
+Revision ID: a9e4b2c7d153
+Revises: f4c9a2d71b38
+Create Date: 2026-10-18 17:42:55.104386
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9e4b2c7d153'
+down_revision = 'f4c9a2d71b38'
+branch_labels = None
+depends_on = None
+
+TABLES = ['Venue', 'Artist', 'Show']
+
+
+def upgrade():
+    for table in TABLES:
+        # Existing rows start out as changed now
+        column = sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False)
+        if op.get_bind().dialect.name == 'sqlite':
+            # SQLite cannot add a column with a non-constant default, so copy the table
+            with op.batch_alter_table(table, recreate='always') as batch_op:
+                batch_op.add_column(column)
+        else:
+            op.add_column(table, column)
+        op.create_index(f'ix_{table}_updated_at', table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
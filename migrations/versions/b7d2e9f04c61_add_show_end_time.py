@@ -0,0 +1,63 @@
+"""Add Show.end_time and forbid overlapping bookings of a venue or artist
+
+Revision ID: b7d2e9f04c61
+Revises: a9e4b2c7d153
+Create Date: 2026-10-18 19:05:31.582017
+
+Existing shows are given two hours, cut short where the venue or the
+artist has its next show sooner, so the constraints hold for the data
+already there. Shows booked at the same time end where they start: the
+empty range overlaps nothing and they remain listed.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e9f04c61'
+down_revision = 'a9e4b2c7d153'
+branch_labels = None
+depends_on = None
+
+SIDES = ('venue', 'artist')
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(), nullable=True))
+
+    if dialect == 'postgresql':
+        least, default_end = 'LEAST', "start_time + interval '2 hours'"
+    else:
+        least, default_end = 'MIN', "strftime('%Y-%m-%d %H:%M:%f000', start_time, '+2 hours')"
+    next_starts = ', '.join(
+        f'COALESCE(LEAD(start_time) OVER (PARTITION BY {side}_id ORDER BY start_time, id), {default_end})'
+        for side in SIDES
+    )
+    op.execute(f"""
+        UPDATE "Show" SET end_time = clipped.end_time
+        FROM (SELECT id, {least}({default_end}, {next_starts}) AS end_time FROM "Show") AS clipped
+        WHERE "Show".id = clipped.id
+    """)
+
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_check_constraint('chk_Show_end_time', 'end_time >= start_time')
+
+    # Other databases check bookings with the in-process index in schedule.py
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        for side in SIDES:
+            op.execute(
+                f'ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_{side}_booking" '
+                f'EXCLUDE USING gist ({side}_id WITH =, tsrange(start_time, end_time) WITH &&)'
+            )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for side in SIDES:
+            op.execute(f'ALTER TABLE "Show" DROP CONSTRAINT IF EXISTS "ex_Show_{side}_booking"')
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_constraint('chk_Show_end_time', type_='check')
+        batch_op.drop_column('end_time')
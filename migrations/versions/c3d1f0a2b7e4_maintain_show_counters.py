@@ -0,0 +1,55 @@
+"""Maintain show counters on Venue and Artist
+
+Revision ID: c3d1f0a2b7e4
+Revises: a1a3639ebd9e
+Create Date: 2026-10-18 09:12:41.503118
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3d1f0a2b7e4'
+down_revision = 'a1a3639ebd9e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The counter columns were added to the models without a migration
+    inspector = sa.inspect(op.get_bind())
+    for table in ('Venue', 'Artist'):
+        existing = [column['name'] for column in inspector.get_columns(table)]
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name in ('past_shows_count', 'upcoming_shows_count'):
+                if name not in existing:
+                    batch_op.add_column(sa.Column(name, sa.Integer(), nullable=True))
+
+    with op.batch_alter_table('Show', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_upcoming', sa.Boolean(), nullable=False, server_default=sa.true()))
+        batch_op.create_index('ix_Show_is_upcoming_start_time', ['is_upcoming', 'start_time'], unique=False)
+
+    # Classify the existing shows and backfill the counters from them
+    show = sa.table('Show', sa.column('start_time'), sa.column('is_upcoming'), sa.column('venue_id'), sa.column('artist_id'))
+    op.execute(show.update().values(is_upcoming=show.c.start_time >= datetime.now()))
+    for table, key in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        target = sa.table(table, sa.column('id'), sa.column('past_shows_count'), sa.column('upcoming_shows_count'))
+        def count(upcoming):
+            return sa.select(sa.func.count()).where(
+                show.c[key] == target.c.id, show.c.is_upcoming == upcoming
+            ).scalar_subquery()
+        op.execute(target.update().values(past_shows_count=count(False), upcoming_shows_count=count(True)))
+
+
+def downgrade():
+    with op.batch_alter_table('Show', schema=None) as batch_op:
+        batch_op.drop_index('ix_Show_is_upcoming_start_time')
+        batch_op.drop_column('is_upcoming')
+
+    for table in ('Venue', 'Artist'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('upcoming_shows_count')
+            batch_op.drop_column('past_shows_count')
@@ -0,0 +1,36 @@
+"""Add ShowDay, the number of shows of each venue per day
+
+Revision ID: c5e8a1d3f927
+Revises: b7d2e9f04c61
+Create Date: 2026-10-18 21:12:47.305118
+
+The buckets are counted from the shows already there.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e8a1d3f927'
+down_revision = 'b7d2e9f04c61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'ShowDay',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.Column('shows', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('day', 'venue_id')
+    )
+    op.execute("""
+        INSERT INTO "ShowDay" (day, venue_id, shows)
+        SELECT date(start_time), venue_id, count(*) FROM "Show" GROUP BY date(start_time), venue_id
+    """)
+
+
+def downgrade():
+    op.drop_table('ShowDay')
@@ -0,0 +1,206 @@
+"""Add ShowArchive and partition Show by month on Postgres
+
+Revision ID: d1f6c8b2e473
+Revises: c5e8a1d3f927
+Create Date: 2026-10-18 22:40:09.118364
+
+On Postgres, Show is rebuilt as a table partitioned by range of
+start_time, with a partition per month from its first show, or the
+current month, to three months ahead, keeping its ids and sequence.
+Show_earlier and Show_later take the shows before and after those
+months. They are range partitions rather than a default partition, as
+Postgres refuses DETACH PARTITION CONCURRENTLY on a table with a default
+partition. The primary key of a partitioned table must include the
+partition key, so it becomes (id, start_time).
+
+Exclusion constraints cannot span partitions, so when btree_gist is
+installed the booking constraints are added to each partition instead,
+and the show_booking_overlap trigger rejects a booking overlapping one
+in another month. It holds a transaction-level advisory lock per venue
+and per artist, so concurrent bookings in neighbouring months cannot
+both pass the check.
+
+Downgrading moves the archived shows back into Show. Run `flask counters
+verify --repair` and `flask calendar rebuild-days` afterwards.
+"""
+from datetime import date, datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd1f6c8b2e473'
+down_revision = 'c5e8a1d3f927'
+branch_labels = None
+depends_on = None
+
+# Months of partitions created after the current one
+AHEAD = 3
+
+INDEXES = [
+    ('ix_Show_is_upcoming_start_time', ['is_upcoming', 'start_time']),
+    ('ix_Show_venue_id_start_time', ['venue_id', 'start_time']),
+    ('ix_Show_artist_id_start_time', ['artist_id', 'start_time']),
+    ('ix_Show_start_time_id', ['start_time', 'id']),
+    ('ix_Show_updated_at', ['updated_at']),
+]
+
+COLUMNS = 'id, start_time, end_time, artist_id, venue_id, is_upcoming, updated_at'
+
+# Shows of a venue or an artist never overlap, so the one show starting last before a booking is the only
+# earlier show that can reach into it, and the rest start within it
+BOOKING_OVERLAP = """
+    CREATE FUNCTION show_booking_overlap() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF NEW.end_time <= NEW.start_time THEN
+            RETURN NEW;
+        END IF;
+        PERFORM pg_advisory_xact_lock(1, NEW.venue_id);
+        PERFORM pg_advisory_xact_lock(2, NEW.artist_id);
+        IF EXISTS (
+            SELECT 1 FROM "Show" WHERE venue_id = NEW.venue_id AND id <> NEW.id AND end_time > start_time
+            AND start_time >= NEW.start_time AND start_time < NEW.end_time
+        ) OR (
+            SELECT end_time FROM "Show" WHERE venue_id = NEW.venue_id AND id <> NEW.id AND end_time > start_time
+            AND start_time < NEW.start_time ORDER BY start_time DESC LIMIT 1
+        ) > NEW.start_time THEN
+            RAISE EXCEPTION 'show % overlaps another booking of venue %', NEW.id, NEW.venue_id
+                USING ERRCODE = 'exclusion_violation';
+        END IF;
+        IF EXISTS (
+            SELECT 1 FROM "Show" WHERE artist_id = NEW.artist_id AND id <> NEW.id AND end_time > start_time
+            AND start_time >= NEW.start_time AND start_time < NEW.end_time
+        ) OR (
+            SELECT end_time FROM "Show" WHERE artist_id = NEW.artist_id AND id <> NEW.id AND end_time > start_time
+            AND start_time < NEW.start_time ORDER BY start_time DESC LIMIT 1
+        ) > NEW.start_time THEN
+            RAISE EXCEPTION 'show % overlaps another booking of artist %', NEW.id, NEW.artist_id
+                USING ERRCODE = 'exclusion_violation';
+        END IF;
+        RETURN NEW;
+    END
+    $$
+"""
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def has_btree_gist():
+    return op.get_bind().execute(
+        sa.text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'btree_gist')")
+    ).scalar()
+
+
+def add_booking_constraints(table):
+    for side in ('venue', 'artist'):
+        op.execute(
+            f'ALTER TABLE "{table}" ADD CONSTRAINT "ex_{table}_{side}_booking" '
+            f'EXCLUDE USING gist ({side}_id WITH =, tsrange(start_time, end_time) WITH &&)'
+        )
+
+
+def create_show_table(name, partitioned):
+    op.execute(f"""
+        CREATE TABLE "{name}" (
+            id INTEGER NOT NULL DEFAULT nextval('"Show_id_seq"'),
+            start_time TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            end_time TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            artist_id INTEGER NOT NULL,
+            venue_id INTEGER NOT NULL,
+            is_upcoming BOOLEAN NOT NULL DEFAULT true,
+            updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now()
+        ){' PARTITION BY RANGE (start_time)' if partitioned else ''}
+    """)
+
+
+def finish_show_table(key):
+    # Constraints and indexes are named after Show, so they are added once the previous table is gone
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    op.execute(f'ALTER TABLE "Show" ADD CONSTRAINT "Show_pkey" PRIMARY KEY ({key})')
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_artist_id_fkey" FOREIGN KEY (artist_id) REFERENCES "Artist" (id)')
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_venue_id_fkey" FOREIGN KEY (venue_id) REFERENCES "Venue" (id)')
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT "chk_Show_end_time" CHECK (end_time >= start_time)')
+    for name, columns in INDEXES:
+        op.create_index(name, 'Show', columns, unique=False)
+
+
+def upgrade():
+    op.create_table(
+        'ShowArchive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('end_time', sa.DateTime(), nullable=False),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_ShowArchive_venue_id_start_time', 'ShowArchive', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_ShowArchive_artist_id_start_time', 'ShowArchive', ['artist_id', 'start_time'], unique=False)
+
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    constraints = has_btree_gist()
+    op.execute('ALTER TABLE "Show" RENAME TO "Show_unpartitioned"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+    create_show_table('Show', partitioned=True)
+
+    first = op.get_bind().execute(sa.text('SELECT min(start_time) FROM "Show_unpartitioned"')).scalar()
+    month = min(first.date() if first else date.today(), date.today()).replace(day=1)
+    last = add_months(date.today().replace(day=1), AHEAD)
+    partitions = ['Show_earlier', 'Show_later']
+    op.execute(
+        f'CREATE TABLE "Show_earlier" PARTITION OF "Show" '
+        f"FOR VALUES FROM (MINVALUE) TO ('{month.isoformat()}')"
+    )
+    op.execute(
+        f'CREATE TABLE "Show_later" PARTITION OF "Show" '
+        f"FOR VALUES FROM ('{add_months(last, 1).isoformat()}') TO (MAXVALUE)"
+    )
+    while month <= last:
+        name = f'Show_{month.year:04d}_{month.month:02d}'
+        op.execute(
+            f'CREATE TABLE "{name}" PARTITION OF "Show" '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        )
+        partitions.append(name)
+        month = add_months(month, 1)
+
+    op.execute(f'INSERT INTO "Show" ({COLUMNS}) SELECT {COLUMNS} FROM "Show_unpartitioned"')
+    op.execute('DROP TABLE "Show_unpartitioned"')
+    finish_show_table('id, start_time')
+    if constraints:
+        for name in partitions:
+            add_booking_constraints(name)
+        op.execute(BOOKING_OVERLAP)
+        op.execute(
+            'CREATE TRIGGER show_booking_overlap BEFORE INSERT OR UPDATE OF start_time, end_time, venue_id, artist_id '
+            'ON "Show" FOR EACH ROW EXECUTE FUNCTION show_booking_overlap()'
+        )
+
+
+def downgrade():
+    archived = 'id, start_time, end_time, artist_id, venue_id, false, CURRENT_TIMESTAMP'
+    if op.get_bind().dialect.name == 'postgresql':
+        create_show_table('Show_unpartitioned', partitioned=False)
+        op.execute(f'INSERT INTO "Show_unpartitioned" ({COLUMNS}) SELECT {COLUMNS} FROM "Show"')
+        op.execute(f'INSERT INTO "Show_unpartitioned" ({COLUMNS}) SELECT {archived} FROM "ShowArchive"')
+        op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+        op.execute('DROP TABLE "Show"')
+        op.execute('DROP FUNCTION IF EXISTS show_booking_overlap()')
+        op.execute('ALTER TABLE "Show_unpartitioned" RENAME TO "Show"')
+        finish_show_table('id')
+        if has_btree_gist():
+            add_booking_constraints('Show')
+    else:
+        op.execute(f'INSERT INTO "Show" ({COLUMNS}) SELECT {archived} FROM "ShowArchive"')
+
+    op.drop_index('ix_ShowArchive_artist_id_start_time', table_name='ShowArchive')
+    op.drop_index('ix_ShowArchive_venue_id_start_time', table_name='ShowArchive')
+    op.drop_table('ShowArchive')
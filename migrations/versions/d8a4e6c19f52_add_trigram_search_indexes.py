@@ -0,0 +1,35 @@
+"""Add trigram search indexes on Venue and Artist
+
+Revision ID: d8a4e6c19f52
+Revises: c3d1f0a2b7e4
+Create Date: 2026-10-18 10:41:07.218334
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8a4e6c19f52'
+down_revision = 'c3d1f0a2b7e4'
+branch_labels = None
+depends_on = None
+
+# Must stay identical to search.search_text() for the planner to use the index
+SEARCH_TEXT = """(coalesce(name, '') || ' ' || coalesce(city, '') || ' ' || coalesce(state, '') || ' ' || coalesce(genres, ''))"""
+
+
+def upgrade():
+    # Other databases fall back to the in-process index in search.py
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('Venue', 'Artist'):
+        op.execute(f'CREATE INDEX "ix_{table}_search_trgm" ON "{table}" USING gin ({SEARCH_TEXT} gin_trgm_ops)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in ('Venue', 'Artist'):
+        op.execute(f'DROP INDEX IF EXISTS "ix_{table}_search_trgm"')
@@ -0,0 +1,90 @@
+"""Add AreaSummary and TrendingArtist, materialized views on Postgres
+
+Revision ID: e8c3a5f19d27
+Revises: d1f6c8b2e473
+Create Date: 2026-10-18 23:52:31.604127
+
+On Postgres both are materialized views, with the unique index REFRESH
+MATERIALIZED VIEW CONCURRENTLY requires. Elsewhere they are tables,
+filled once here and refilled by `flask summaries refresh`. The view
+definitions mirror area_query and trending_query in summaries.py.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8c3a5f19d27'
+down_revision = 'd1f6c8b2e473'
+branch_labels = None
+depends_on = None
+
+# The trending window and the number of artists kept, summaries.TRENDING_DAYS and TRENDING_KEPT
+TRENDING_DAYS = 30
+TRENDING_KEPT = 50
+
+AREAS = """
+    SELECT v.city, v.state, count(v.id) AS venues,
+           coalesce(sum(u.shows), 0) AS upcoming_shows, {now} AS refreshed_at
+    FROM "Venue" v
+    LEFT OUTER JOIN (
+        SELECT venue_id, count(id) AS shows FROM "Show" WHERE start_time >= {now} GROUP BY venue_id
+    ) u ON u.venue_id = v.id
+    WHERE v.city IS NOT NULL AND v.state IS NOT NULL
+    GROUP BY v.city, v.state
+"""
+
+TRENDING = """
+    SELECT row_number() OVER (ORDER BY count(s.id) DESC, s.artist_id) AS rank,
+           s.artist_id, a.name, a.image_link, count(s.id) AS upcoming_shows, {now} AS refreshed_at
+    FROM "Show" s
+    JOIN "Artist" a ON a.id = s.artist_id
+    WHERE s.start_time >= {now} AND s.start_time < {until}
+    GROUP BY s.artist_id, a.name, a.image_link
+    ORDER BY count(s.id) DESC, s.artist_id
+    LIMIT {kept}
+"""
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        now = "date_trunc('second', localtimestamp)"
+        op.execute(f'CREATE MATERIALIZED VIEW "AreaSummary" AS {AREAS.format(now=now)}')
+        op.execute('CREATE UNIQUE INDEX "ix_AreaSummary_city_state" ON "AreaSummary" (city, state)')
+        until = f"{now} + interval '{TRENDING_DAYS} days'"
+        op.execute(f'CREATE MATERIALIZED VIEW "TrendingArtist" AS {TRENDING.format(now=now, until=until, kept=TRENDING_KEPT)}')
+        op.execute('CREATE UNIQUE INDEX "ix_TrendingArtist_rank" ON "TrendingArtist" (rank)')
+        return
+
+    op.create_table(
+        'AreaSummary',
+        sa.Column('city', sa.String(length=120), nullable=False),
+        sa.Column('state', sa.String(length=120), nullable=False),
+        sa.Column('venues', sa.Integer(), nullable=False),
+        sa.Column('upcoming_shows', sa.Integer(), nullable=False),
+        sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('city', 'state')
+    )
+    op.create_table(
+        'TrendingArtist',
+        sa.Column('rank', sa.Integer(), nullable=False),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('image_link', sa.String(), nullable=True),
+        sa.Column('upcoming_shows', sa.Integer(), nullable=False),
+        sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('rank')
+    )
+    now = "datetime('now', 'localtime')"
+    until = f"datetime('now', 'localtime', '+{TRENDING_DAYS} days')"
+    op.execute(f'INSERT INTO "AreaSummary" {AREAS.format(now=now)}')
+    op.execute(f'INSERT INTO "TrendingArtist" {TRENDING.format(now=now, until=until, kept=TRENDING_KEPT)}')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP MATERIALIZED VIEW "TrendingArtist"')
+        op.execute('DROP MATERIALIZED VIEW "AreaSummary"')
+    else:
+        op.drop_table('TrendingArtist')
+        op.drop_table('AreaSummary')
@@ -0,0 +1,80 @@
+"""Move genres into a Genre table linked to venues and artists
+
+Revision ID: f4c9a2d71b38
+Revises: e2b7c5d94a10
+Create Date: 2026-10-18 14:21:07.318452
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4c9a2d71b38'
+down_revision = 'e2b7c5d94a10'
+branch_labels = None
+depends_on = None
+
+# (link table, owner table, owner key column)
+LINKS = [
+    ('venue_genres', 'Venue', 'venue_id'),
+    ('artist_genres', 'Artist', 'artist_id'),
+]
+
+
+def parse_genres(value):
+    # A copy of models.parse_genres, so the migration keeps working if the model changes
+    if not value:
+        return []
+    names = []
+    for name in value.strip().strip('{}[]').split(','):
+        name = name.strip().strip('"\'').strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def upgrade():
+    genre = op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    for link, owner, column in LINKS:
+        op.create_table(link,
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.Column(column, sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint([column], [owner + '.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('genre_id', column)
+        )
+        op.create_index(f'ix_{link}_{column}', link, [column], unique=False)
+
+    # Parse the genres strings, including the '{A,B}' lists stored by the old form handlers
+    connection = op.get_bind()
+    ids = {}
+    for link, owner, column in LINKS:
+        owners = sa.table(owner, sa.column('id'), sa.column('genres'))
+        links = sa.table(link, sa.column('genre_id'), sa.column(column))
+        rows = []
+        for id, genres in connection.execute(sa.select(owners.c.id, owners.c.genres)).fetchall():
+            names = parse_genres(genres)
+            for name in names:
+                if name not in ids:
+                    ids[name] = connection.execute(
+                        genre.insert().values(name=name).returning(genre.c.id)
+                    ).scalar()
+                rows.append({'genre_id': ids[name], column: id})
+            # Store the normalized text the model now writes
+            if ','.join(names) != (genres or ''):
+                connection.execute(owners.update().where(owners.c.id == id).values(genres=','.join(names)))
+        if rows:
+            connection.execute(links.insert(), rows)
+
+
+def downgrade():
+    for link, owner, column in LINKS:
+        op.drop_index(f'ix_{link}_{column}', table_name=link)
+        op.drop_table(link)
+    op.drop_table('Genre')
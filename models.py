@@ -5,11 +5,72 @@ Artist, Venue and Show models
 
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import UniqueConstraint, CheckConstraint
-import re
-from datetime import datetime
+from datetime import datetime, timedelta
 from sqlalchemy import func
 
-db = SQLAlchemy()
+from phones import validate_phone_number
+from replicas import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Genres.
+
+def parse_genres(value):
+    """Return the distinct genre names in a list or a comma-separated string, or raise ValueError.
+
+    Also reads the '{Jazz,"Rock n Roll"}' and "['Jazz', 'Blues']" strings
+    stored when a list of genres used to be assigned to the column.
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.strip().strip('{}[]').split(',')
+    elif not isinstance(value, (list, tuple)) or not all(isinstance(name, str) for name in value):
+        raise ValueError('Genres must be a string or a list of strings.')
+    names = []
+    for name in value:
+        name = name.strip().strip('"\'').strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+    @staticmethod
+    def lookup(names):
+        # The genres with these names, adding the ones that do not exist yet to the session
+        with db.session.no_autoflush:
+            found = {genre.name: genre for genre in db.session.new if isinstance(genre, Genre)}
+            if names:
+                found.update((genre.name, genre) for genre in Genre.query.filter(Genre.name.in_(names)))
+        genres = []
+        for name in names:
+            if name not in found:
+                found[name] = Genre(name=name)
+                db.session.add(found[name])
+            genres.append(found[name])
+        return genres
+
+
+# The primary keys lead with genre_id so that filtering by genre is an index range scan
+venue_genres = db.Table(
+    'venue_genres',
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_venue_genres_venue_id', 'venue_id')
+)
+
+artist_genres = db.Table(
+    'artist_genres',
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_artist_genres_artist_id', 'artist_id')
+)
 
 # Models.
 
@@ -26,34 +87,36 @@ class Venue(db.Model):
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))  # Adding a new field 'website'
     genres = db.Column(db.String(120), nullable=False) # Add the venue_genres field
+    # The genres text above is kept for display and search, the links are the source of truth for filtering
+    genre_list = db.relationship('Genre', secondary=venue_genres)
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
     past_shows_count = db.Column(db.Integer, default=0)
     upcoming_shows_count = db.Column(db.Integer, default=0)
+    # Bumped on every change, for the pages' ETag and Last-Modified, see conditional.py
+    updated_at = db.Column(
+        db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now, server_default=func.now()
+    )
    # Add more fields as needed
-    def update_shows_count(self):
-        now = datetime.now()
-        past_shows_count = db.session.query(func.count(Show.id)).filter(Show.artist_id == self.id, Show.start_time < now).scalar()
-        upcoming_shows_count = db.session.query(func.count(Show.id)).filter(Show.artist_id == self.id, Show.start_time >= now).scalar()
-        self.past_shows_count = past_shows_count
-        self.upcoming_shows_count = upcoming_shows_count
-        db.session.commit()
+   # The show counters are kept current by counters.py
    # Add additional constraints
     __table_args__ = (
         UniqueConstraint('name', 'city', 'state', name='uq_Venue_name_city_state'),
-        CheckConstraint("phone <> ''", name='chk_Venue_phone_not_empty')
+        CheckConstraint("phone <> ''", name='chk_Venue_phone_not_empty'),
+        db.Index('ix_Venue_state_city_id', 'state', 'city', 'id'),
+        db.Index('ix_Venue_updated_at', 'updated_at')
     )
-    @staticmethod
-    def validate_phone_number(key, value):
-        # Modify the regular expression pattern to allow different phone number formats
-        phone_pattern = re.compile(r'^\+?\d{1,3}[-.\s]?\(?\d{1,3}\)?[-.\s]?\d{1,4}[-.\s]?\d{1,4}[-.\s]?\d{1,9}$')
-        if not phone_pattern.match(value):
-            raise ValueError(f"Invalid phone number format: {value}")
-        return value
-
     @db.validates('phone')
     def validate_phone(self, key, value):
-        return self.validate_phone_number(key, value)
+        # The accepted formats are defined once in phones.py
+        return validate_phone_number(value)
+
+    @db.validates('genres')
+    def validate_genres(self, key, value):
+        # Link the genres and store them as comma-separated text
+        names = parse_genres(value)
+        self.genre_list = Genre.lookup(names)
+        return ','.join(names)
 
 
 
@@ -65,6 +128,7 @@ class Artist(db.Model):
     state = db.Column(db.String)
     phone = db.Column(db.String(120))
     genres = db.Column(db.String)  # Add the genres column here
+    genre_list = db.relationship('Genre', secondary=artist_genres)
     image_link = db.Column(db.String)
     facebook_link = db.Column(db.String)
     website = db.Column(db.String)
@@ -72,38 +136,126 @@ class Artist(db.Model):
     seeking_description = db.Column(db.String)
     past_shows_count = db.Column(db.Integer, default=0)
     upcoming_shows_count = db.Column(db.Integer, default=0)
+    # Bumped on every change, for the pages' ETag and Last-Modified, see conditional.py
+    updated_at = db.Column(
+        db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now, server_default=func.now()
+    )
     # Add more fields as needed
-    def update_shows_count(self):
-        now = datetime.now()
-        past_shows_count = db.session.query(func.count(Show.id)).filter(Show.artist_id == self.id, Show.start_time < now).scalar()
-        upcoming_shows_count = db.session.query(func.count(Show.id)).filter(Show.artist_id == self.id, Show.start_time >= now).scalar()
-        self.past_shows_count = past_shows_count
-        self.upcoming_shows_count = upcoming_shows_count
-        db.session.commit()
+    # The show counters are kept current by counters.py
 
      # Add additional constraints
     __table_args__ = (
         UniqueConstraint('name', 'city', 'state', name='uq_artist_name_city_state'),
-        CheckConstraint("phone <> ''", name='chk_artist_phone_not_empty')
+        CheckConstraint("phone <> ''", name='chk_artist_phone_not_empty'),
+        db.Index('ix_Artist_updated_at', 'updated_at')
     )
-    @staticmethod
-    def validate_phone_number(key, value):
-        # Modify the regular expression pattern to allow different phone number formats
-        phone_pattern = re.compile(r'^\+?\d{1,3}[-.\s]?\(?\d{1,3}\)?[-.\s]?\d{1,4}[-.\s]?\d{1,4}[-.\s]?\d{1,9}$')
-        if not phone_pattern.match(value):
-            raise ValueError(f"Invalid phone number format: {value}")
-        return value
-
     @db.validates('phone')
     def validate_phone(self, key, value):
-        return self.validate_phone_number(key, value)
+        # The accepted formats are defined once in phones.py
+        return validate_phone_number(value)
+
+    @db.validates('genres')
+    def validate_genres(self, key, value):
+        # Link the genres and store them as comma-separated text
+        names = parse_genres(value)
+        self.genre_list = Genre.lookup(names)
+        return ','.join(names)
+
+# Length of a show listed without an end time
+DEFAULT_SHOW_DURATION = timedelta(hours=2)
+
+
+def parse_datetime(value):
+    """Parse an ISO 8601 date and time as shows store it, in local time, or raise ValueError.
+
+    Shows are stored without a UTC offset, so values carrying one are
+    rejected rather than compared against naive times.
+    """
+    moment = datetime.fromisoformat(value.strip())
+    if moment.tzinfo is not None:
+        raise ValueError(f'{value!r} has a UTC offset; give the local time without one.')
+    return moment
+
+
+def default_end_time(context):
+    # Bulk inserts without an end time, the session sets it earlier, see schedule.py
+    return context.get_current_parameters()['start_time'] + DEFAULT_SHOW_DURATION
+
 
 class Show(db.Model):
     __tablename__ = 'Show'
 
+    # On Postgres the table is partitioned by month of start_time, with (id, start_time) as its key, see archive.py
     id = db.Column(db.Integer, primary_key=True)
-    start_time = db.Column(db.DateTime, nullable=False)
+    # The previous start is loaded on change, so a moved show keeps its length, see schedule.py
+    start_time = db.column_property(db.Column(db.DateTime, nullable=False), active_history=True)
+    # Exclusive, no two shows of a venue or of an artist may overlap, see schedule.py
+    end_time = db.Column(db.DateTime, nullable=False, default=default_end_time)
     artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
+    # Which counter the show is currently included in, see counters.py
+    is_upcoming = db.Column(db.Boolean, nullable=False, default=True)
+    # Bumped on every change, for the pages' ETag and Last-Modified, see conditional.py
+    updated_at = db.Column(
+        db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now, server_default=func.now()
+    )
     artist = db.relationship('Artist', backref=db.backref('shows', cascade='all, delete'))
-    venue = db.relationship('Venue', backref=db.backref('shows', cascade='all, delete'))
\ No newline at end of file
+    venue = db.relationship('Venue', backref=db.backref('shows', cascade='all, delete'))
+
+    __table_args__ = (
+        db.Index('ix_Show_is_upcoming_start_time', 'is_upcoming', 'start_time'),
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+        db.Index('ix_Show_updated_at', 'updated_at'),
+        CheckConstraint('end_time >= start_time', name='chk_Show_end_time'),
+    )
+
+
+# Number of shows of a venue starting on each day, for the calendar day counts, see calendars.py
+class ShowDay(db.Model):
+    __tablename__ = 'ShowDay'
+
+    day = db.Column(db.Date, primary_key=True)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True)
+    shows = db.Column(db.Integer, nullable=False)
+
+
+# Long past shows moved out of Show, listed with the past shows of their venue and artist, see archive.py
+class ShowArchive(db.Model):
+    __tablename__ = 'ShowArchive'
+
+    # The id the show had in Show
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_ShowArchive_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_ShowArchive_artist_id_start_time', 'artist_id', 'start_time'),
+    )
+
+
+# Shows and venues per city and state, recomputed by the refresh in summaries.py; a materialized view on Postgres
+class AreaSummary(db.Model):
+    __tablename__ = 'AreaSummary'
+
+    city = db.Column(db.String(120), primary_key=True)
+    state = db.Column(db.String(120), primary_key=True)
+    venues = db.Column(db.Integer, nullable=False)
+    upcoming_shows = db.Column(db.Integer, nullable=False)
+    refreshed_at = db.Column(db.DateTime, nullable=False)
+
+
+# The artists with the most shows coming up, recomputed by the refresh in summaries.py; a materialized view on Postgres
+class TrendingArtist(db.Model):
+    __tablename__ = 'TrendingArtist'
+
+    rank = db.Column(db.Integer, primary_key=True)
+    artist_id = db.Column(db.Integer, nullable=False)
+    name = db.Column(db.String)
+    image_link = db.Column(db.String)
+    upcoming_shows = db.Column(db.Integer, nullable=False)
+    refreshed_at = db.Column(db.DateTime, nullable=False)
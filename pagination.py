@@ -0,0 +1,106 @@
+"""
+Keyset pagination for the listing pages
+"""
+# Imports
+
+import base64
+import json
+from datetime import datetime
+
+from flask import current_app, request
+from sqlalchemy import tuple_
+
+
+class Page:
+    """One page of rows plus the cursors of the pages either side of it."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, keys):
+    """The key values of a cursor, or None when it is malformed, so a tampered cursor reads the first page."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(keys):
+            return None
+        return [decode_value(key, value) for key, value in zip(keys, values)]
+    except (ValueError, TypeError):
+        return None
+
+
+def decode_value(key, value):
+    # Convert a JSON value back to the type of its key column, raising ValueError on any other type
+    if value is None:
+        return None
+    python_type = key.type.python_type
+    if python_type is datetime:
+        if not isinstance(value, str):
+            raise ValueError(value)
+        return datetime.fromisoformat(value)
+    if not isinstance(value, python_type) or isinstance(value, bool) and python_type is not bool:
+        raise ValueError(value)
+    return value
+
+
+def page_size():
+    # Page size requested with ?per_page=, bounded by the configuration
+    default = current_app.config.get('PAGE_SIZE', 50)
+    maximum = current_app.config.get('MAX_PAGE_SIZE', 200)
+    return max(1, min(request.args.get('per_page', default, type=int), maximum))
+
+
+def page_query(query, keys, after=None, before=None, per_page=None):
+    """Narrow a query or select to the page following the after cursor or preceding the before cursor.
+
+    keys are the columns the rows are ordered by, ascending, and must be
+    selected by the query and unique together. Returns the narrowed query,
+    which fetches one row more than the page to tell whether more follow,
+    and a function turning its rows into the Page.
+    """
+    per_page = per_page or page_size()
+    after = decode_cursor(after, keys) if after else None
+    before = decode_cursor(before, keys) if before else None
+
+    if before is not None:
+        # Walk backwards from the cursor, the rows are put back in order below
+        query = query.filter(tuple_(*keys) < tuple_(*before)).order_by(*(key.desc() for key in keys))
+    else:
+        if after is not None:
+            query = query.filter(tuple_(*keys) > tuple_(*after))
+        query = query.order_by(*keys)
+
+    def cursor(row):
+        return encode_cursor([row._mapping[key] for key in keys])
+
+    def page(rows):
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if before is not None:
+            rows = rows[::-1]
+            has_previous, has_next = has_more, True
+        else:
+            has_previous, has_next = after is not None, has_more
+        return Page(
+            rows,
+            next_cursor=cursor(rows[-1]) if rows and has_next else None,
+            prev_cursor=cursor(rows[0]) if rows and has_previous else None
+        )
+
+    return query.limit(per_page + 1), page
+
+
+def paginate(query, keys, after=None, before=None, per_page=None):
+    """Return the page of query rows following the after cursor or preceding the before cursor.
+
+    Only one page of rows is ever fetched, however deep the page.
+    """
+    query, page = page_query(query, keys, after, before, per_page)
+    return page(query.all())
@@ -0,0 +1,68 @@
+"""
+Phone number validation and E.164 normalization
+
+validate_phone_number checks one number against the format the forms
+have always accepted. check_phone_numbers validates, and optionally
+normalizes to E.164, a whole column at once for imports and clean-ups.
+Numbers without a country code are taken to be North American, like the
+states the forms offer.
+"""
+# Imports
+
+import re
+
+# Every character \s matches except the newline, which separates the values in the batch patterns below
+WHITESPACE = '\t\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000'
+
+# A dash, dot or space between the digit groups. The single number and batch patterns are both
+# built from it, so they accept exactly the same numbers
+SEPARATOR = '[-.' + WHITESPACE + ']'
+PHONE_FORMAT = (
+    r'\+?\d{1,3}{sep}?\(?\d{1,3}\)?{sep}?\d{1,4}{sep}?\d{1,4}{sep}?\d{1,9}'.replace('{sep}', SEPARATOR)
+)
+PHONE_PATTERN = re.compile(PHONE_FORMAT)
+
+# Country code assumed for ten-digit numbers written without one
+DEFAULT_COUNTRY_CODE = '1'
+
+# E.164 allows at most 15 digits including the country code
+MAX_DIGITS = 15
+
+# The batch patterns run over a whole column joined with newlines, one match per line:
+# the line's value when it is valid, nothing otherwise
+LINE_PATTERN = re.compile('(' + PHONE_FORMAT + r')\n|[^\n]*\n')
+E164_LINE_PATTERN = re.compile(
+    rf'(?:\+(\d{{8,{MAX_DIGITS}}})|(?:{re.escape(DEFAULT_COUNTRY_CODE)})?(\d{{10}}))\n|[^\n]*\n'
+)
+
+# The separators and parentheses a valid number may contain, deleted to leave its digits
+SEPARATORS = str.maketrans('', '', '-.()' + WHITESPACE)
+
+
+def validate_phone_number(value):
+    """Return value if it is a phone number in an accepted format, or raise ValueError."""
+    if not isinstance(value, str) or not PHONE_PATTERN.fullmatch(value):
+        raise ValueError(f"Invalid phone number format: {value}")
+    return value
+
+
+def check_phone_numbers(values, e164=True):
+    """Validate a column of phone numbers, normalizing them to E.164 unless e164 is False.
+
+    Returns (checked, failures): checked holds the normalized (or, without
+    e164, the original) value for each input, None where it is invalid,
+    and failures the indexes of the invalid ones. The whole column goes
+    through each pattern in a single call rather than one call per value.
+    """
+    # Anything that is not a single-line string is invalid, and would upset the line count
+    lines = [value if isinstance(value, str) and '\n' not in value else '' for value in values]
+    valid = LINE_PATTERN.findall('\n'.join(lines) + '\n')
+    if e164:
+        digits = '\n'.join(valid).translate(SEPARATORS) + '\n'
+        checked = [
+            '+' + international if international else '+' + DEFAULT_COUNTRY_CODE + national if national else None
+            for international, national in E164_LINE_PATTERN.findall(digits)
+        ]
+    else:
+        checked = [value or None for value in valid]
+    return checked, [index for index, value in enumerate(checked) if value is None]
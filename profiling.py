@@ -0,0 +1,122 @@
+"""
+Per-request SQL profiling and the slow request log
+
+With SQL_PROFILE set, every statement a request runs is recorded with
+its duration, and requests slower than SLOW_REQUEST_MS are logged as one
+JSON object per line to SLOW_LOG and to the app logger (and so to
+error.log outside debug mode). Statements are grouped by their SQL, so
+a query repeated per row shows up as one entry with a high count.
+
+In debug mode responses carry a Server-Timing header splitting the
+request into database and application time, shown in the browser's
+network panel. It uses the counters metrics.py keeps for every request.
+"""
+# Imports
+
+import json
+import logging
+import time
+from logging import FileHandler, Formatter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Slow log entries keep this many statements, slowest first, each cut to STATEMENT_LENGTH
+MAX_STATEMENTS = 20
+STATEMENT_LENGTH = 1000
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('profile_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['profile_started'].pop()
+    if has_request_context() and 'sql_profile' in g:
+        g.sql_profile.append((statement, elapsed))
+
+
+def _handle_error(context):
+    if context.connection is not None and context.connection.info.get('profile_started'):
+        context.connection.info['profile_started'].pop()
+
+
+def summarize(profile):
+    """Group (statement, seconds) pairs by statement, slowest total first."""
+    statements = {}
+    for statement, seconds in profile:
+        entry = statements.setdefault(
+            statement, {'statement': statement[:STATEMENT_LENGTH], 'count': 0, 'ms': 0.0, 'max_ms': 0.0}
+        )
+        entry['count'] += 1
+        entry['ms'] += seconds * 1000
+        entry['max_ms'] = max(entry['max_ms'], seconds * 1000)
+    summary = sorted(statements.values(), key=lambda entry: entry['ms'], reverse=True)
+    for entry in summary:
+        entry['ms'] = round(entry['ms'], 3)
+        entry['max_ms'] = round(entry['max_ms'], 3)
+    return summary
+
+
+def init_app(app):
+    """Time each request, and profile its SQL when SQL_PROFILE is set."""
+    profile = app.config.get('SQL_PROFILE', False)
+    threshold = app.config.get('SLOW_REQUEST_MS', 500) / 1000
+
+    if profile:
+        # Registered only when enabled, so unprofiled apps pay nothing per statement
+        for name, listener in (
+            ('before_cursor_execute', _before_cursor_execute),
+            ('after_cursor_execute', _after_cursor_execute),
+            ('handle_error', _handle_error),
+        ):
+            if not event.contains(Engine, name, listener):
+                event.listen(Engine, name, listener)
+
+        # A child of the app logger, so entries also reach the error.log handler
+        slow_log = app.logger.getChild('slow')
+        slow_log.setLevel(logging.WARNING)
+        if app.config.get('SLOW_LOG'):
+            handler = FileHandler(app.config['SLOW_LOG'])
+            handler.setFormatter(Formatter('%(message)s'))
+            slow_log.addHandler(handler)
+
+    @app.before_request
+    def _start_request():
+        g.request_started = time.perf_counter()
+        if profile:
+            g.sql_profile = []
+
+    @app.after_request
+    def _server_timing(response):
+        g.response_status = response.status_code
+        if app.debug and 'request_started' in g:
+            total = (time.perf_counter() - g.request_started) * 1000
+            sql = g.get('sql_seconds', 0.0) * 1000
+            response.headers.add(
+                'Server-Timing',
+                f'db;dur={sql:.1f};desc="{g.get("sql_queries", 0)} queries", app;dur={total - sql:.1f}',
+            )
+        return response
+
+    # Teardown runs after a streamed response has finished, so the log sees its whole duration
+    @app.teardown_request
+    def _log_slow_request(exception):
+        if not profile or 'request_started' not in g:
+            return
+        elapsed = time.perf_counter() - g.request_started
+        if elapsed < threshold:
+            return
+        statements = summarize(g.sql_profile)
+        app.logger.getChild('slow').warning(json.dumps({
+            'event': 'slow_request',
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': g.get('response_status', 500),
+            'ms': round(elapsed * 1000, 3),
+            'sql_ms': round(sum((seconds for statement, seconds in g.sql_profile), 0.0) * 1000, 3),
+            'queries': len(g.sql_profile),
+            'statements': statements[:MAX_STATEMENTS],
+        }))
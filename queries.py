@@ -0,0 +1,231 @@
+"""
+Queries shared by the HTML pages and the JSON API
+"""
+# Imports
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import exists, select, union_all
+
+from models import db, Artist, Venue, Show, ShowArchive, Genre, artist_genres, venue_genres, parse_datetime
+
+# The genre link column of each model
+GENRE_LINKS = {
+    Venue: venue_genres.c.venue_id,
+    Artist: artist_genres.c.artist_id,
+}
+
+
+def venue_data(venue, past_shows, upcoming_shows):
+    # The venue page data from a venue row or object and its shows, split into past and upcoming
+    return {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": venue.genres.split(',') if venue.genres else [],
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website": venue.website,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link,
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows)
+    }
+
+
+def artist_data(artist, past_shows, upcoming_shows):
+    # The artist page data from an artist row or object and its shows, split into past and upcoming
+    return {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": artist.genres.split(',') if artist.genres else [],
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "website": artist.website,
+        "facebook_link": artist.facebook_link,
+        "seeking_venue": artist.seeking_venue,
+        "seeking_description": artist.seeking_description,
+        "image_link": artist.image_link,
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows),
+    }
+
+
+def get_venue_data(venue_id):
+    # Load the venue with its live and archived shows and each show's artist in a single query
+    shows = show_history('venue_id', venue_id)
+    rows = db.session.query(
+        Venue, shows.c.start_time, Artist.id, Artist.name, Artist.image_link
+    ).outerjoin(shows, shows.c.venue_id == Venue.id).outerjoin(Artist, Artist.id == shows.c.artist_id).filter(
+        Venue.id == venue_id
+    ).order_by(shows.c.start_time).all()
+
+    # Check if the venue exists
+    if not rows:
+        return None, None
+    venue = rows[0][0]
+
+    # Split the shows into past and upcoming against a single point in time
+    now = datetime.now()
+    past_shows = []
+    upcoming_shows = []
+    for _, start_time, artist_id, artist_name, artist_image_link in rows:
+        if start_time is None:
+            continue
+        (upcoming_shows if start_time >= now else past_shows).append({
+            "artist_id": artist_id,
+            "artist_name": artist_name,
+            "artist_image_link": artist_image_link,
+            "start_time": start_time,
+        })
+    # The split changes when the next upcoming show starts
+    next_start = upcoming_shows[0]["start_time"] if upcoming_shows else None
+
+    return venue_data(venue, past_shows, upcoming_shows), next_start
+
+
+def get_artist_data(artist_id):
+    # Load the artist with its live and archived shows and each show's venue in a single query
+    shows = show_history('artist_id', artist_id)
+    rows = db.session.query(
+        Artist, shows.c.start_time, Venue.id, Venue.name, Venue.image_link
+    ).outerjoin(shows, shows.c.artist_id == Artist.id).outerjoin(Venue, Venue.id == shows.c.venue_id).filter(
+        Artist.id == artist_id
+    ).order_by(shows.c.start_time).all()
+
+    # Check if the artist exists
+    if not rows:
+        return None, None
+    artist = rows[0][0]
+
+    # Split the shows into past and upcoming against a single point in time
+    now = datetime.now()
+    past_shows = []
+    upcoming_shows = []
+    for _, start_time, venue_id, venue_name, venue_image_link in rows:
+        if start_time is None:
+            continue
+        (upcoming_shows if start_time >= now else past_shows).append({
+            "venue_id": venue_id,
+            "venue_name": venue_name,
+            "venue_image_link": venue_image_link,
+            "start_time": start_time,
+        })
+    # The split changes when the next upcoming show starts
+    next_start = upcoming_shows[0]["start_time"] if upcoming_shows else None
+
+    return artist_data(artist, past_shows, upcoming_shows), next_start
+
+
+def show_history(column, id):
+    """The live and archived shows of a venue or artist as one subquery of venue_id, artist_id and start_time.
+
+    column is 'venue_id' or 'artist_id'. Archived shows are all long past, so
+    past show lookups read this in place of Show and find them too.
+    """
+    return union_all(*(
+        select(table.c.venue_id, table.c.artist_id, table.c.start_time).where(table.c[column] == id)
+        for table in (Show.__table__, ShowArchive.__table__)
+    )).subquery('show_history')
+
+
+def venue_shows(venue_id, now, upcoming):
+    # A venue's past or upcoming shows with their artists, as the venue page lists them
+    shows = Show.__table__ if upcoming else show_history('venue_id', venue_id)
+    return select(
+        shows.c.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        shows.c.start_time
+    ).join(Artist, Artist.id == shows.c.artist_id).where(
+        shows.c.venue_id == venue_id,
+        shows.c.start_time >= now if upcoming else shows.c.start_time < now
+    ).order_by(shows.c.start_time)
+
+
+def artist_shows(artist_id, now, upcoming):
+    # An artist's past or upcoming shows with their venues, as the artist page lists them
+    shows = Show.__table__ if upcoming else show_history('artist_id', artist_id)
+    return select(
+        shows.c.venue_id,
+        Venue.name.label('venue_name'),
+        Venue.image_link.label('venue_image_link'),
+        shows.c.start_time
+    ).join(Venue, Venue.id == shows.c.venue_id).where(
+        shows.c.artist_id == artist_id,
+        shows.c.start_time >= now if upcoming else shows.c.start_time < now
+    ).order_by(shows.c.start_time)
+
+
+def show_listing():
+    # The columns the shows page displays, with the artist and venue joined in
+    return db.session.query(
+        Show.id,
+        Show.start_time,
+        Show.end_time,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).join(Artist, Artist.id == Show.artist_id).join(Venue, Venue.id == Show.venue_id)
+
+
+def genre_filter(model, name):
+    """A filter for the venues or artists linked to the named genre."""
+    # A correlated EXISTS probes the (genre_id, owner id) primary key once per row, so an
+    # ordered listing stops after a page instead of collecting every row of the genre first
+    column = GENRE_LINKS[model]
+    genre_id = select(Genre.id).where(Genre.name == name).scalar_subquery()
+    return exists().where(column.table.c.genre_id == genre_id, column == model.id)
+
+
+def genre_members(model, name):
+    """The ids of the venues or artists linked to the named genre, read from the links alone."""
+    column = GENRE_LINKS[model]
+    return select(column).join(Genre, Genre.id == column.table.c.genre_id).where(Genre.name == name)
+
+
+def parse_moment(value, end=False):
+    """Parse an ISO date or local datetime; a bare date ending a window includes that whole day."""
+    value = value.strip()
+    moment = parse_datetime(value)
+    if end and len(value) == 10:
+        moment += timedelta(days=1)
+    return moment
+
+
+def filter_shows(query, args):
+    """Narrow a show listing to ?from= and ?to=, the venue's ?city= and ?state= and the artist's ?genre=.
+
+    Raises ValueError on a malformed date.
+    """
+    # A window on start_time keeps the range scanned independent of how many past shows there are
+    if args.get('from'):
+        query = query.filter(Show.start_time >= parse_moment(args['from']))
+    if args.get('to'):
+        query = query.filter(Show.start_time < parse_moment(args['to'], end=True))
+    for field in ('city', 'state'):
+        if args.get(field):
+            query = query.filter(getattr(Venue, field) == args[field])
+    if args.get('genre'):
+        query = query.filter(Show.artist_id.in_(genre_members(Artist, args['genre'])))
+    return query
+
+
+def filter_listing(query, model, args):
+    # Narrow a venue or artist listing to the ?genre=, ?city= and ?state= given in args
+    if args.get('genre'):
+        query = query.filter(genre_filter(model, args['genre']))
+    for field in ('city', 'state'):
+        if args.get(field):
+            query = query.filter(getattr(model, field) == args[field])
+    return query
@@ -0,0 +1,102 @@
+"""
+Read replica routing
+
+Each URI in DATABASE_REPLICA_URLS (comma separated) becomes a bind named
+replica_0, replica_1, ... sharing the primary's engine options. GET and
+HEAD requests, and POST views marked read_only like the search forms,
+read from a replica picked at random; writes always go to the primary,
+as does anything run outside a request.
+
+A request that commits makes the browser read from the primary for the
+next REPLICA_STICKY_SECONDS, so the page a create or edit redirects to
+shows the change even while the replicas lag behind. The flag travels in
+the session cookie, so SECRET_KEY must be set and shared by every worker. Data kept beyond
+the request, like the page cache entries, is read inside primary().
+"""
+# Imports
+
+import random
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+# Key in the Flask session holding the time until which reads stay on the primary
+STICKY_KEY = 'read_primary_until'
+
+
+class RoutingSession(Session):
+    """Session that reads from the replica in info['replica'], when one is set, and flushes to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        replica = self.info.get('replica')
+        # Only statements for the default bind move; models with their own bind keep it
+        if replica is not None and not self._flushing and engine is self._db.engines[None]:
+            return replica
+        return engine
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_write(session):
+    if has_request_context():
+        g.wrote_primary = True
+
+
+def read_only(view):
+    """Mark a POST view as safe to serve from a replica."""
+    view.read_only = True
+    return view
+
+
+@contextmanager
+def primary():
+    """Read from the primary inside the block, even in a request routed to a replica."""
+    if not has_app_context():
+        yield
+        return
+    info = current_app.extensions['sqlalchemy'].session().info
+    replica = info.pop('replica', None)
+    try:
+        yield
+    finally:
+        if replica is not None:
+            info['replica'] = replica
+
+
+def replica_binds(app):
+    return sorted(key for key in app.config.get('SQLALCHEMY_BINDS', {}) if str(key).startswith('replica_'))
+
+
+def init_app(app):
+    """Add a bind per replica URI and route each request's reads. Call before db.init_app."""
+    urls = [url.strip() for url in app.config.get('SQLALCHEMY_REPLICA_URIS', []) if url.strip()]
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+    for number, url in enumerate(urls):
+        binds[f'replica_{number}'] = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}), url=url)
+    if not urls:
+        return
+    if not app.config.get('SECRET_KEY_SHARED'):
+        # Another worker could not read the sticky flag from a cookie signed with its own random key
+        raise RuntimeError('Set SECRET_KEY to use read replicas, so every worker can read the session.')
+    sticky = app.config.get('REPLICA_STICKY_SECONDS', 5)
+
+    @app.before_request
+    def _route_reads():
+        view = app.view_functions.get(request.endpoint)
+        reading = request.method in ('GET', 'HEAD') or getattr(view, 'read_only', False)
+        if reading and session.get(STICKY_KEY, 0) <= time.time():
+            db = current_app.extensions['sqlalchemy']
+            db.session().info['replica'] = db.engines[random.choice(replica_binds(app))]
+
+    @app.after_request
+    def _stick_to_primary(response):
+        if g.get('wrote_primary'):
+            session[STICKY_KEY] = time.time() + sticky
+        return response
+
+    @app.teardown_request
+    def _reset_route(exception):
+        current_app.extensions['sqlalchemy'].session().info.pop('replica', None)
@@ -0,0 +1,396 @@
+"""
+Show scheduling conflicts
+
+A show books its venue and its artist from start_time up to, but not
+including, end_time, and no two bookings of a venue or of an artist may
+overlap. On Postgres the b7d2e9f04c61 migration enforces this with
+exclusion constraints over tsrange(start_time, end_time), and conflicts
+are looked up through their GiST indexes. Elsewhere (SQLite in
+development and the benchmarks) an in-process interval tree per venue
+and per artist is built on first use and kept current by indexes.py as shows
+are committed, like the search index.
+
+Every flush checks the shows it inserts or moves and raises
+ScheduleConflict instead of writing an overlapping one. check_schedule
+validates a whole season of proposed shows, against the booked shows and
+against each other, in one pass.
+"""
+# Imports
+
+import random
+import threading
+from collections import defaultdict
+
+from sqlalchemy import DateTime, Integer, and_, cast, column, event, func, inspect, literal, select, union_all, values
+
+from indexes import SyncedIndexes
+from models import db, Show, DEFAULT_SHOW_DURATION
+
+# What a show books, by the name of its id column
+SIDES = ('venue', 'artist')
+
+# Show columns whose change can create a conflict
+BOOKING_FIELDS = ('start_time', 'end_time', 'venue_id', 'artist_id')
+
+
+class ScheduleConflict(ValueError):
+    """Raised by a flush writing shows that overlap another booking of their venue or artist.
+
+    conflicts holds (show, conflicts) pairs in the form check_schedule returns.
+    """
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        show, found = conflicts[0]
+        sides = [side for side in SIDES if any(conflict['on'] == side for conflict in found)]
+        others = sorted({conflict['show_id'] for conflict in found if 'show_id' in conflict})
+        super().__init__(
+            f"The {' and '.join(sides)} {'are' if len(sides) > 1 else 'is'} already booked between"
+            f" {show.start_time:%Y-%m-%d %H:%M} and {show.end_time:%H:%M}"
+            + (f" (show {', '.join(map(str, others))})." if others else ' by another new show.')
+        )
+
+
+def booking(venue_id, artist_id, start_time, end_time=None, id=None):
+    """A proposed show as check_schedule takes it, lasting DEFAULT_SHOW_DURATION without an end time."""
+    return {
+        'id': id,
+        'venue_id': venue_id,
+        'artist_id': artist_id,
+        'start_time': start_time,
+        'end_time': end_time or start_time + DEFAULT_SHOW_DURATION,
+    }
+
+
+#----------------------------------------------------------------------------#
+# Interval tree.
+#----------------------------------------------------------------------------#
+
+class _Node:
+    __slots__ = ('start', 'end', 'id', 'priority', 'left', 'right', 'max_end')
+
+    def __init__(self, start, end, id, priority):
+        self.start = start
+        self.end = end
+        self.id = id
+        self.priority = priority
+        self.left = self.right = None
+        self.max_end = end
+
+
+def _update(node):
+    node.max_end = node.end
+    if node.left is not None and node.left.max_end > node.max_end:
+        node.max_end = node.left.max_end
+    if node.right is not None and node.right.max_end > node.max_end:
+        node.max_end = node.right.max_end
+
+
+def _rotate_right(node):
+    left = node.left
+    node.left, left.right = left.right, node
+    _update(node)
+    _update(left)
+    return left
+
+
+def _rotate_left(node):
+    right = node.right
+    node.right, right.left = right.left, node
+    _update(node)
+    _update(right)
+    return right
+
+
+def _insert(node, new):
+    if node is None:
+        return new
+    if (new.start, new.id) < (node.start, node.id):
+        node.left = _insert(node.left, new)
+        if node.left.priority > node.priority:
+            return _rotate_right(node)
+    else:
+        node.right = _insert(node.right, new)
+        if node.right.priority > node.priority:
+            return _rotate_left(node)
+    _update(node)
+    return node
+
+
+def _merge(left, right):
+    if left is None or right is None:
+        return left or right
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+def _delete(node, start, id):
+    if node is None:
+        return None
+    if (start, id) < (node.start, node.id):
+        node.left = _delete(node.left, start, id)
+    elif (start, id) > (node.start, node.id):
+        node.right = _delete(node.right, start, id)
+    else:
+        return _merge(node.left, node.right)
+    _update(node)
+    return node
+
+
+def _build(intervals, low, high, priority):
+    # A balanced subtree of the sorted intervals, priorities falling with depth
+    if low >= high:
+        return None
+    middle = (low + high) // 2
+    node = _Node(*intervals[middle], priority)
+    node.left = _build(intervals, low, middle, priority - 1)
+    node.right = _build(intervals, middle + 1, high, priority - 1)
+    _update(node)
+    return node
+
+
+class IntervalTree:
+    """Half-open [start, end) intervals in a treap ordered by start.
+
+    Each node keeps the latest end in its subtree, so a search skips every
+    subtree ending before the interval searched for and stops at the first
+    node starting after it: O(log n + k) for k overlapping intervals.
+    Empty intervals overlap nothing and are not stored.
+    """
+
+    def __init__(self, intervals=()):
+        # Built balanced, with priorities above the random ones of later insertions
+        intervals = sorted(
+            (interval for interval in intervals if interval[0] < interval[1]), key=lambda interval: (interval[0], interval[2])
+        )
+        self.root = _build(intervals, 0, len(intervals), len(intervals).bit_length() + 1)
+
+    def add(self, start, end, id):
+        if start < end:
+            self.root = _insert(self.root, _Node(start, end, id, random.random()))
+
+    def remove(self, start, end, id):
+        if start < end:
+            self.root = _delete(self.root, start, id)
+
+    def overlapping(self, start, end):
+        """The ids of the intervals overlapping [start, end)."""
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None or node.max_end <= start:
+                continue
+            stack.append(node.left)
+            if node.start < end:
+                if node.end > start:
+                    found.append(node.id)
+                stack.append(node.right)
+        return found
+
+
+#----------------------------------------------------------------------------#
+# In-process index.
+#----------------------------------------------------------------------------#
+
+class ScheduleIndex:
+    """An interval tree of the booked shows of each venue and of each artist."""
+
+    def __init__(self, shows=()):
+        # shows are (id, venue_id, artist_id, start_time, end_time) rows
+        self.shows = {}
+        grouped = {side: defaultdict(list) for side in SIDES}
+        for id, venue_id, artist_id, start_time, end_time in shows:
+            self.shows[id] = (venue_id, artist_id, start_time, end_time)
+            grouped['venue'][venue_id].append((start_time, end_time, id))
+            grouped['artist'][artist_id].append((start_time, end_time, id))
+        self.trees = {
+            side: defaultdict(IntervalTree, {key: IntervalTree(intervals) for key, intervals in groups.items()})
+            for side, groups in grouped.items()
+        }
+        self.lock = threading.Lock()
+
+    def add(self, id, venue_id, artist_id, start_time, end_time):
+        with self.lock:
+            self._remove(id)
+            self.shows[id] = (venue_id, artist_id, start_time, end_time)
+            self.trees['venue'][venue_id].add(start_time, end_time, id)
+            self.trees['artist'][artist_id].add(start_time, end_time, id)
+
+    def remove(self, id):
+        with self.lock:
+            self._remove(id)
+
+    def _remove(self, id):
+        show = self.shows.pop(id, None)
+        if show is None:
+            return
+        venue_id, artist_id, start_time, end_time = show
+        self.trees['venue'][venue_id].remove(start_time, end_time, id)
+        self.trees['artist'][artist_id].remove(start_time, end_time, id)
+
+    def overlapping(self, side, key, start_time, end_time):
+        with self.lock:
+            tree = self.trees[side].get(key)
+            return tree.overlapping(start_time, end_time) if tree is not None else []
+
+    def __len__(self):
+        return len(self.shows)
+
+
+def _show_values(show):
+    # Keyed by integer ids whatever type the form or API assigned, so bookings of both collide
+    return (_owner_id(show, 'venue'), _owner_id(show, 'artist'), show.start_time, show.end_time)
+
+
+_indexes = SyncedIndexes(
+    'schedule', (Show,),
+    columns=lambda model: (model.id, model.venue_id, model.artist_id, model.start_time, model.end_time),
+    factory=ScheduleIndex,
+    values=_show_values
+)
+
+
+def get_index():
+    # The index, built from the database on first use
+    return _indexes.get(Show)
+
+
+def clear_index():
+    # Drop the built index, e.g. after the shows were reloaded outside the session
+    _indexes.clear()
+
+
+def record_shows(shows):
+    """Add (id, venue_id, artist_id, start_time, end_time) rows inserted outside the session to a built index."""
+    _indexes.record(Show, shows)
+
+
+def uses_database():
+    # Postgres answers from the exclusion constraints' indexes, other databases from the in-process index
+    return db.session.get_bind().dialect.name == 'postgresql'
+
+
+#----------------------------------------------------------------------------#
+# Checks.
+#----------------------------------------------------------------------------#
+
+def booked_conflicts(proposals):
+    """Yield (proposal number, side, show id) for each booked show a proposal overlaps."""
+    if not uses_database():
+        index = get_index()
+        for number, proposal in enumerate(proposals):
+            for side in SIDES:
+                key = proposal[f'{side}_id']
+                if key is None:
+                    continue
+                for id in index.overlapping(side, key, proposal['start_time'], proposal['end_time']):
+                    if id != proposal['id']:
+                        yield number, side, id
+        return
+
+    # One statement for the whole batch, joining the proposals to the shows through the GiST indexes
+    proposed = values(
+        column('number', Integer), column('id', Integer), column('venue_id', Integer), column('artist_id', Integer),
+        column('start_time', DateTime), column('end_time', DateTime), name='proposed'
+    ).data([
+        (number, proposal['id'], proposal['venue_id'], proposal['artist_id'], proposal['start_time'], proposal['end_time'])
+        for number, proposal in enumerate(proposals)
+    ]).cte()
+    overlaps = func.tsrange(Show.start_time, Show.end_time).op('&&')(
+        func.tsrange(proposed.c.start_time, proposed.c.end_time)
+    )
+    statement = union_all(*(
+        select(proposed.c.number, literal(side), Show.id).select_from(proposed).join(Show, and_(
+            getattr(Show, f'{side}_id') == proposed.c[f'{side}_id'],
+            overlaps,
+            # An all NULL column of VALUES would be typed as text
+            Show.id.is_distinct_from(cast(proposed.c.id, Integer)),
+        )) for side in SIDES
+    ))
+    yield from db.session.execute(statement)
+
+
+def check_schedule(proposals):
+    """Return, for each proposed show in order, the bookings it conflicts with.
+
+    proposals are dicts like booking() returns; a proposal with the id of
+    an existing show moves that show. Each conflict is {'on': 'venue' or
+    'artist'} with either the 'show_id' of a booked show or the index of
+    another 'proposal'. Costs one query, or on the in-process index
+    O(log n) per proposal, plus O(m log m) among the m proposals.
+    """
+    conflicts = [[] for proposal in proposals]
+    moved = {proposal['id'] for proposal in proposals if proposal['id'] is not None}
+    for number, side, id in booked_conflicts(proposals):
+        # A show being moved no longer holds its old booking
+        if id not in moved:
+            conflicts[number].append({'on': side, 'show_id': id})
+
+    for side in SIDES:
+        trees = defaultdict(IntervalTree)
+        for number, proposal in enumerate(proposals):
+            key = proposal[f'{side}_id']
+            if key is None:
+                continue
+            tree = trees[key]
+            for other in tree.overlapping(proposal['start_time'], proposal['end_time']):
+                conflicts[other].append({'on': side, 'proposal': number})
+                conflicts[number].append({'on': side, 'proposal': other})
+            tree.add(proposal['start_time'], proposal['end_time'], number)
+    return conflicts
+
+
+#----------------------------------------------------------------------------#
+# Session events.
+#----------------------------------------------------------------------------#
+
+def _changed(show):
+    state = inspect(show)
+    return any(state.attrs[field].history.has_changes() for field in BOOKING_FIELDS)
+
+
+def _owner_id(show, side):
+    # The id column, which the forms assign as a string, or the id of a related row assigned instead
+    id = getattr(show, f'{side}_id')
+    if id is None:
+        id = getattr(getattr(show, side), 'id', None)
+    return int(id) if id is not None else None
+
+
+@event.listens_for(db.session, 'before_flush')
+def _check_bookings(session, flush_context, instances):
+    shows = [show for show in session.new if isinstance(show, Show)]
+    shows += [show for show in session.dirty if isinstance(show, Show) and _changed(show)]
+    if not shows:
+        return
+
+    for show in shows:
+        if show.end_time is None:
+            show.end_time = show.start_time + DEFAULT_SHOW_DURATION
+            continue
+        # A show moved without a new end time keeps its length
+        start = inspect(show).attrs.start_time.history
+        if start.deleted and start.deleted[0] is not None and not inspect(show).attrs.end_time.history.has_changes():
+            show.end_time += show.start_time - start.deleted[0]
+        if show.end_time <= show.start_time:
+            raise ValueError('A show must end after it starts.')
+
+    deleted = {show.id for show in session.deleted if isinstance(show, Show)}
+    proposals = [
+        booking(_owner_id(show, 'venue'), _owner_id(show, 'artist'), show.start_time, show.end_time, show.id)
+        for show in shows
+    ]
+    found = []
+    for show, conflicts in zip(shows, check_schedule(proposals)):
+        # Shows deleted in the same flush no longer hold their bookings
+        conflicts = [conflict for conflict in conflicts if conflict.get('show_id') not in deleted]
+        if conflicts:
+            found.append((show, conflicts))
+    if found:
+        raise ScheduleConflict(found)
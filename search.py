@@ -0,0 +1,226 @@
+"""
+Ranked search over venue and artist names, cities, states and genres
+
+On Postgres with the pg_trgm extension the search runs against a GIN
+trigram index on the combined search text. Elsewhere (SQLite in
+development and the benchmarks) an in-process trigram index is built on
+first use and kept current by indexes.py as venues and artists are
+committed, in this process or another.
+"""
+# Imports
+
+import heapq
+import math
+import re
+import threading
+from collections import defaultdict
+
+from sqlalchemy import func, literal, literal_column, or_, text
+
+from indexes import SyncedIndexes
+from models import db, Artist, Venue
+from queries import genre_filter, genre_members
+
+# Maximum number of results returned by a search
+DEFAULT_LIMIT = 50
+
+# Minimum share of the query trigrams a result must contain, matching pg_trgm's default
+SIMILARITY_THRESHOLD = 0.3
+
+# Fields that feed the search text, the first one being the name
+SEARCH_FIELDS = ('name', 'city', 'state', 'genres')
+
+# A match anywhere in the search text ranks at this fraction of the same match in the name
+OTHER_FIELD_WEIGHT = 0.5
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def search_text(model):
+    # Built from literals rather than bound parameters so it matches the expression index
+    separator = literal_column("' '")
+    expression = func.coalesce(getattr(model, SEARCH_FIELDS[0]), literal_column("''"))
+    for field in SEARCH_FIELDS[1:]:
+        expression = expression.op('||')(separator).op('||')(func.coalesce(getattr(model, field), literal_column("''")))
+    return expression
+
+
+def trigrams(value):
+    # The same trigrams pg_trgm extracts: lower-cased words padded with two spaces in front and one behind
+    grams = set()
+    for word in WORD_PATTERN.findall((value or '').lower()):
+        word = '  ' + word + ' '
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+def windows(value):
+    # Every three-character window of the lower-cased text, used to find substrings
+    value = value.lower()
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+#----------------------------------------------------------------------------#
+# In-process index.
+#----------------------------------------------------------------------------#
+
+class TrigramIndex:
+    """Inverted index from trigrams to the ids of the rows containing them.
+
+    Rows are ranked like the Postgres path: by the share of the query's word
+    trigrams found in the name, or at a lower weight in the whole search
+    text. Rows containing the query as a substring always match, found
+    through an index of the raw three-character windows of the text.
+    """
+
+    def __init__(self):
+        self.name_postings = defaultdict(set)
+        self.text_postings = defaultdict(set)
+        self.window_postings = defaultdict(set)
+        self.documents = {}
+        self.lock = threading.Lock()
+
+    def add(self, id, name, *others):
+        document = ' '.join(value or '' for value in (name,) + others).lower()
+        grams = (trigrams(name), trigrams(document), windows(document))
+        with self.lock:
+            self._remove(id)
+            self.documents[id] = (name or '', document, grams)
+            for postings, keys in zip(self._postings(), grams):
+                for key in keys:
+                    postings[key].add(id)
+
+    def remove(self, id):
+        with self.lock:
+            self._remove(id)
+
+    def _postings(self):
+        return (self.name_postings, self.text_postings, self.window_postings)
+
+    def _remove(self, id):
+        document = self.documents.pop(id, None)
+        if document is None:
+            return
+        for postings, keys in zip(self._postings(), document[2]):
+            for key in keys:
+                postings[key].discard(id)
+                if not postings[key]:
+                    del postings[key]
+
+    def search(self, term, limit=DEFAULT_LIMIT, only=None):
+        """Return up to limit (id, score) pairs, best match first, optionally restricted to the ids in only."""
+        query = trigrams(term)
+        if not query:
+            return []
+        term = term.lower()
+        # A row reaching the threshold must contain one of the rarest trigrams that could get it there
+        needed = max(1, math.ceil(SIMILARITY_THRESHOLD * len(query)))
+        with self.lock:
+            rarest = sorted(query, key=lambda gram: len(self.text_postings.get(gram, ())))[:len(query) - needed + 1]
+            candidates = set().union(*(self.text_postings.get(gram, ()) for gram in rarest))
+
+            # Substring matches must contain every window of the query
+            keys = windows(term)
+            if keys:
+                contains = set.intersection(*(self.window_postings.get(key, set()) for key in keys))
+                candidates |= {id for id in contains if term in self.documents[id][1]}
+            if only is not None:
+                candidates &= only
+
+            ranked = []
+            for id in candidates:
+                name, document, (name_grams, text_grams, window_grams) = self.documents[id]
+                name_score = len(query & name_grams) / len(query)
+                text_score = len(query & text_grams) / len(query)
+                if name_score >= SIMILARITY_THRESHOLD or text_score >= SIMILARITY_THRESHOLD or term in document:
+                    ranked.append((-max(name_score, text_score * OTHER_FIELD_WEIGHT), name.lower(), id))
+
+        return [(id, -score) for score, name, id in heapq.nsmallest(limit, ranked)]
+
+    def __len__(self):
+        return len(self.documents)
+
+
+def build_index(rows):
+    # A trigram index of (id, *SEARCH_FIELDS) rows
+    index = TrigramIndex()
+    for row in rows:
+        index.add(*row)
+    return index
+
+
+_indexes = SyncedIndexes(
+    'search', (Venue, Artist),
+    columns=lambda model: [model.id] + [getattr(model, field) for field in SEARCH_FIELDS],
+    factory=build_index,
+    values=lambda instance: tuple(getattr(instance, field) for field in SEARCH_FIELDS)
+)
+
+
+def get_index(model):
+    # The model's index, built from the database on first use
+    return _indexes.get(model)
+
+
+def clear_indexes():
+    # Drop the built indexes, e.g. after the tables were reloaded outside the session
+    _indexes.clear()
+
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+_trigram_support = {}
+
+
+def has_trigram_support():
+    # Whether the database is Postgres with pg_trgm installed, checked once per engine
+    engine = db.engine
+    if engine not in _trigram_support:
+        _trigram_support[engine] = engine.dialect.name == 'postgresql' and bool(
+            db.session.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).scalar()
+        )
+    return _trigram_support[engine]
+
+
+def search(model, term, limit=DEFAULT_LIMIT, genre=None):
+    """Search venues or artists, returning the ranked rows the search templates expect.
+
+    genre restricts the results to venues or artists linked to that genre.
+    """
+    term = (term or '').strip()
+    query = db.session.query(model.id, model.name, model.upcoming_shows_count)
+    if genre:
+        query = query.filter(genre_filter(model, genre))
+    if not term:
+        # An empty search lists rows alphabetically, as the unfiltered ILIKE search used to
+        rows = query.order_by(
+            model.name, model.id
+        ).limit(limit).all()
+    elif has_trigram_support():
+        document = search_text(model)
+        rank = func.greatest(
+            func.word_similarity(term, model.name),
+            func.word_similarity(term, document) * OTHER_FIELD_WEIGHT
+        )
+        rows = query.filter(
+            or_(document.ilike(f'%{term}%'), literal(term).op('<%')(document))
+        ).order_by(rank.desc(), model.name, model.id).limit(limit).all()
+    else:
+        only = set(db.session.execute(genre_members(model, genre)).scalars()) if genre else None
+        ranked = [id for id, score in get_index(model).search(term, limit, only)]
+        if not ranked:
+            return []
+        found = {
+            row.id: row for row in db.session.query(
+                model.id, model.name, model.upcoming_shows_count
+            ).filter(model.id.in_(ranked))
+        }
+        rows = [found[id] for id in ranked if id in found]
+
+    return [{
+        "id": row.id,
+        "name": row.name,
+        "num_upcoming_shows": row.upcoming_shows_count or 0
+    } for row in rows]
@@ -2,3 +2,27 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Suggest venue or artist names in the search boxes as the user types
+$(function() {
+  $('input[data-autocomplete]').each(function() {
+    var input = $(this);
+    var list = $('#' + input.attr('list'));
+    var timer = null;
+    var request = null;
+    input.on('input', function() {
+      clearTimeout(timer);
+      timer = setTimeout(function() {
+        var q = $.trim(input.val());
+        if (request) request.abort();
+        if (!q) return list.empty();
+        request = $.getJSON('/autocomplete', {q: q, type: input.data('autocomplete')}, function(response) {
+          list.empty();
+          $.each(response.data, function(i, suggestion) {
+            list.append($('<option>').attr('value', suggestion.name));
+          });
+        });
+      }, 100);
+    });
+  });
+});
@@ -0,0 +1,134 @@
+"""
+Area and trending summaries for the home page
+
+    flask summaries refresh
+
+AreaSummary holds the number of venues and upcoming shows of each city
+and state, and TrendingArtist the TRENDING_KEPT artists with the most
+shows in the next TRENDING_DAYS days. Both are computed from every show,
+far too much work for a page view, so the home page reads them as they were
+at the last refresh, in one small query each. Run the refresh from cron,
+e.g. every 15 minutes.
+
+On Postgres they are materialized views (migration e8c3a5f19d27),
+refreshed CONCURRENTLY so pages keep reading the previous rows while
+the views are recomputed. Elsewhere they are tables, emptied and
+refilled in one transaction, which readers only see once committed.
+"""
+# Imports
+
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, insert, literal, select, text
+
+from models import db, Artist, Venue, Show, AreaSummary, TrendingArtist
+
+# The window trending artists are ranked over, and how many are kept
+TRENDING_DAYS = 30
+TRENDING_KEPT = 50
+
+
+#----------------------------------------------------------------------------#
+# Refresh.
+#----------------------------------------------------------------------------#
+
+def area_query(now):
+    # Venues and upcoming shows per city and state, the definition of the AreaSummary view
+    upcoming = select(Show.venue_id, func.count(Show.id).label('shows')).where(
+        Show.start_time >= now
+    ).group_by(Show.venue_id).subquery()
+    return select(
+        Venue.city, Venue.state, func.count(Venue.id), func.coalesce(func.sum(upcoming.c.shows), 0), literal(now)
+    ).outerjoin(upcoming, upcoming.c.venue_id == Venue.id).where(
+        Venue.city.isnot(None), Venue.state.isnot(None)
+    ).group_by(Venue.city, Venue.state)
+
+
+def trending_query(now):
+    # The artists ranked by their shows in the coming window, the definition of the TrendingArtist view
+    shows = func.count(Show.id)
+    return select(
+        func.row_number().over(order_by=(shows.desc(), Show.artist_id)),
+        Show.artist_id, Artist.name, Artist.image_link, shows, literal(now)
+    ).join(Artist, Artist.id == Show.artist_id).where(
+        Show.start_time >= now, Show.start_time < now + timedelta(days=TRENDING_DAYS)
+    ).group_by(Show.artist_id, Artist.name, Artist.image_link).order_by(shows.desc(), Show.artist_id).limit(TRENDING_KEPT)
+
+
+SUMMARIES = [
+    (AreaSummary, area_query, ['city', 'state', 'venues', 'upcoming_shows', 'refreshed_at']),
+    (TrendingArtist, trending_query, ['rank', 'artist_id', 'name', 'image_link', 'upcoming_shows', 'refreshed_at']),
+]
+
+
+def is_view(connection, name):
+    if connection.dialect.name != 'postgresql':
+        return False
+    return connection.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_matviews WHERE matviewname = :name)"), {'name': name}
+    ).scalar()
+
+
+def refresh(now=None):
+    """Recompute the summaries, returning {table name: rows}."""
+    now = (now or datetime.now()).replace(microsecond=0)
+    connection = db.session.connection()
+    for model, query, columns in SUMMARIES:
+        if is_view(connection, model.__tablename__):
+            connection.execute(text(f'REFRESH MATERIALIZED VIEW CONCURRENTLY "{model.__tablename__}"'))
+        else:
+            connection.execute(delete(model.__table__))
+            connection.execute(insert(model.__table__).from_select(columns, query(now)))
+    counts = {
+        model.__tablename__: connection.execute(select(func.count()).select_from(model.__table__)).scalar()
+        for model, query, columns in SUMMARIES
+    }
+    db.session.commit()
+    return counts
+
+
+def drop_views():
+    """Drop the materialized views, which depend on the tables, before dropping the tables."""
+    connection = db.session.connection()
+    for model, query, columns in SUMMARIES:
+        if is_view(connection, model.__tablename__):
+            connection.execute(text(f'DROP MATERIALIZED VIEW "{model.__tablename__}"'))
+    db.session.commit()
+
+
+#----------------------------------------------------------------------------#
+# Reading.
+#----------------------------------------------------------------------------#
+
+def top_areas(limit):
+    """The areas with the most upcoming shows."""
+    return db.session.execute(
+        select(AreaSummary.city, AreaSummary.state, AreaSummary.venues, AreaSummary.upcoming_shows)
+        .order_by(AreaSummary.upcoming_shows.desc(), AreaSummary.state, AreaSummary.city).limit(limit)
+    ).all()
+
+
+def trending_artists(limit):
+    """The artists with the most shows in the coming TRENDING_DAYS days, busiest first."""
+    return db.session.execute(
+        select(TrendingArtist.artist_id, TrendingArtist.name, TrendingArtist.image_link, TrendingArtist.upcoming_shows)
+        .where(TrendingArtist.rank <= limit).order_by(TrendingArtist.rank)
+    ).all()
+
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+summaries_cli = AppGroup('summaries', help='Refresh the area and trending summaries.')
+
+
+@summaries_cli.command('refresh')
+def refresh_command():
+    """Recompute the area and trending summaries."""
+    started = datetime.now()
+    counts = refresh()
+    elapsed = (datetime.now() - started).total_seconds()
+    click.echo(', '.join(f'{name}: {count} rows' for name, count in counts.items()) + f' in {elapsed:.2f} s.')
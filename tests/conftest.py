@@ -0,0 +1,43 @@
+"""
+Shared fixtures: the app on a throwaway SQLite database, reseeded for every test
+"""
+# Imports
+
+import os
+import tempfile
+
+import pytest
+
+# The config reads DATABASE_URL when the app is imported, so point it away from any real database first
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'fyyur_test.db')
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    from benchmarks.seed import seed
+    from cache import page_cache
+    from schedule import clear_index
+    from search import clear_indexes
+
+    with app.app_context():
+        seed(venues=20, artists=20, shows=100)
+    # The seed bypasses the session, so drop everything built from the previous rows
+    page_cache.clear()
+    clear_index()
+    clear_indexes()
+    return app.test_client()
+
+
+@pytest.fixture
+def context(app, client):
+    """An app context for tests that query the database directly."""
+    with app.app_context():
+        yield
@@ -0,0 +1,63 @@
+from transfer import import_rows
+
+VENUE = {'name': 'The Test Room', 'city': 'Austin', 'state': 'TX', 'phone': '512-555-0100', 'genres': ['Jazz', 'Folk']}
+
+
+def test_create_and_read_a_venue(client):
+    created = client.post('/api/v1/venues', json=VENUE)
+    assert created.status_code == 201
+    venue = client.get(f'/api/v1/venues/{created.get_json()["id"]}').get_json()
+    assert venue['name'] == 'The Test Room'
+    assert venue['genres'] == ['Jazz', 'Folk']
+
+
+def test_create_rejects_missing_fields_and_bad_phones(client):
+    assert client.post('/api/v1/venues', json={'name': 'Nowhere'}).status_code == 400
+    assert client.post('/api/v1/venues', json={**VENUE, 'phone': '12'}).status_code == 400
+    assert client.post('/api/v1/venues', data='not json').status_code == 400
+
+
+def test_fields_selects_the_returned_fields(client):
+    data = client.get('/api/v1/venues?fields=id,name&per_page=2').get_json()['data']
+    assert data == [{'id': 1, 'name': 'Venue 1'}, {'id': 2, 'name': 'Venue 2'}]
+
+
+def test_get_responses_revalidate(client):
+    response = client.get('/api/v1/venues/1')
+    assert client.get('/api/v1/venues/1', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_create_rejects_wrongly_typed_fields(client):
+    for body in ({**VENUE, 'genres': 7}, {**VENUE, 'genres': ['Jazz', 7]}, {**VENUE, 'name': 7},
+                 {**VENUE, 'seeking_talent': 'yes'}, {**VENUE, 'city': ['Austin']}):
+        assert client.post('/api/v1/venues', json=body).status_code == 400, body
+    for body in ({'venue_id': '1', 'artist_id': 1, 'start_time': '2030-01-01T20:00:00'},
+                 {'venue_id': 1, 'artist_id': True, 'start_time': '2030-01-01T20:00:00'},
+                 {'venue_id': 1, 'artist_id': 1, 'start_time': 20300101}):
+        assert client.post('/api/v1/shows', json=body).status_code == 400, body
+    assert client.post('/api/v1/shows/check', json=[7, 'x']).status_code == 400
+
+
+def test_unknown_fields_are_rejected(client):
+    response = client.get('/api/v1/venues?fields=id,nmae')
+    assert response.status_code == 400
+    assert 'nmae' in response.get_json()['message']
+    assert client.get('/api/v1/venues/1?fields=name,colour').status_code == 400
+
+
+def test_show_times_with_a_utc_offset_are_rejected(client):
+    for start_time in ('2031-01-01T20:00:00+00:00', '2031-01-01T20:00:00+02:00'):
+        response = client.post('/api/v1/shows', json={'venue_id': 1, 'artist_id': 1, 'start_time': start_time})
+        assert response.status_code == 400, start_time
+    assert client.post('/api/v1/shows', json={
+        'venue_id': 1, 'artist_id': 1, 'start_time': '2031-01-01T20:00:00', 'end_time': '2031-01-01T23:00:00Z',
+    }).status_code == 400
+
+
+def test_every_entry_point_rejects_show_times_with_a_utc_offset(client, context):
+    proposal = {'venue_id': 1, 'artist_id': 1, 'start_time': '2031-01-01T20:00:00Z'}
+    assert client.post('/api/v1/shows/check', json=[proposal]).status_code == 400
+    assert client.get('/api/v1/shows/search?from=2031-01-01T20:00:00Z').status_code == 400
+    assert client.get('/shows?from=2031-01-01T20:00:00Z').status_code == 400
+    assert client.get('/api/v1/shows/search?from=2031-01-01T20:00:00').status_code == 200
+    assert import_rows('shows', [proposal]) == (0, 1)
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('asgiref')
+pytest.importorskip('aiosqlite')
+
+
+@pytest.fixture
+def call(client):
+    from asgi import application
+
+    def call(path, method='GET', headers=(), body=b''):
+        # The status, headers and body of one request through the ASGI application
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http', 'method': method, 'path': path, 'root_path': '', 'query_string': query.encode(),
+            'headers': [(name.lower().encode(), value.encode()) for name, value in headers],
+        }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': body}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(application(scope, receive, send))
+        start, *chunks = messages
+        return start['status'], dict((name.decode(), value.decode()) for name, value in start['headers']), b''.join(
+            chunk.get('body', b'') for chunk in chunks
+        )
+    return call
+
+
+@pytest.mark.parametrize('path', [
+    '/venues', '/artists', '/shows', '/venues?per_page=5', '/artists?per_page=5', '/shows?per_page=5',
+    '/venues/1', '/artists/1',
+])
+def test_pages_match_the_flask_app(client, call, path):
+    status, headers, body = call(path)
+    flask = client.get(path)
+    assert status == flask.status_code == 200
+    assert headers['etag'] == flask.headers['ETag']
+    assert body == flask.data
+
+
+def test_pages_revalidate_with_their_etag(call):
+    status, headers, body = call('/venues/1')
+    assert call('/venues/1', headers=[('If-None-Match', headers['etag'])])[0] == 304
+
+
+def test_requests_are_counted_in_metrics(client, call):
+    from metrics import metrics
+
+    before = metrics.endpoints['show_artist']['requests']
+    call('/artists/2')
+    assert metrics.endpoints['show_artist']['requests'] == before + 1
+    assert metrics.endpoints['show_artist']['queries'] > 0
+
+
+def test_repeated_headers_are_all_read(call, monkeypatch):
+    from flask import request
+
+    from app import app
+
+    status, headers, body = call('/venues/1')
+    assert call('/venues/1', headers=[('If-None-Match', headers['etag']), ('If-None-Match', '"other"')])[0] == 304
+
+    cookies = []
+    preprocess = app.preprocess_request
+    monkeypatch.setattr(app, 'preprocess_request', lambda: cookies.append(dict(request.cookies)) or preprocess())
+    call('/venues/1', headers=[('Cookie', 'theme=dark'), ('Cookie', 'session=abc; lang=en')])
+    assert cookies == [{'theme': 'dark', 'session': 'abc', 'lang': 'en'}]
+
+
+def test_shutdown_disposes_every_engine(monkeypatch):
+    import asgi
+
+    disposed = []
+
+    class Engine:
+        def __init__(self, name):
+            self.name = name
+
+        async def dispose(self):
+            disposed.append(self.name)
+
+    monkeypatch.setattr(asgi, 'engine', Engine('primary'))
+    monkeypatch.setattr(asgi, 'replica_engines', {'replica_0': Engine('replica_0')})
+    messages = iter([{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+    sent = []
+
+    async def receive():
+        return next(messages)
+
+    async def send(message):
+        sent.append(message['type'])
+
+    asyncio.run(asgi.application({'type': 'lifespan'}, receive, send))
+    assert disposed == ['primary', 'replica_0']
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
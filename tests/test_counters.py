@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+
+from counters import roll_over, verify
+from models import db, Artist, Venue, Show
+
+
+def test_counters_follow_created_moved_and_deleted_shows(context):
+    venue, artist = db.session.get(Venue, 1), db.session.get(Artist, 1)
+    upcoming = venue.upcoming_shows_count
+    show = Show(venue_id=1, artist_id=1, start_time=datetime.now() + timedelta(days=400))
+    db.session.add(show)
+    db.session.commit()
+    assert venue.upcoming_shows_count == upcoming + 1
+    assert verify() == []
+
+    show.start_time = datetime.now() - timedelta(days=400)
+    db.session.commit()
+    assert venue.upcoming_shows_count == upcoming
+    assert verify() == []
+
+    db.session.delete(show)
+    db.session.commit()
+    assert verify() == []
+    assert artist.past_shows_count + artist.upcoming_shows_count == db.session.query(Show).filter_by(artist_id=1).count()
+
+
+def test_roll_over_moves_started_shows_to_the_past(context):
+    roll_over(datetime.now() + timedelta(days=3650))
+    assert db.session.query(Show).filter(Show.is_upcoming.is_(True)).count() == 0
+    assert verify() == []
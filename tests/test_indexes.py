@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, insert, update
+
+from autocomplete import suggest
+from models import db, Artist, Show, Venue
+from schedule import booking, check_schedule
+from search import get_index
+
+START = (datetime.now() + timedelta(days=600)).replace(hour=20, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture
+def synced(app, context, monkeypatch):
+    # Check for other workers' commits on every use
+    monkeypatch.setitem(app.config, 'INDEX_SYNC_SECONDS', 0)
+
+
+def elsewhere(statement):
+    # A Core statement bypasses the session events, like a commit made by another worker
+    db.session.execute(statement)
+    db.session.commit()
+
+
+def test_names_committed_elsewhere_are_suggested(synced):
+    assert suggest('Zyxwv Hall') == []
+    elsewhere(insert(Venue).values(name='Zyxwv Hall', city='Oslo', state='NY', genres='Jazz'))
+    assert [match['name'] for match in suggest('Zyxwv')] == ['Zyxwv Hall']
+
+    elsewhere(update(Venue).where(Venue.name == 'Zyxwv Hall').values(name='Qwvut Hall', updated_at=datetime.now()))
+    assert suggest('Zyxwv') == []
+    assert [match['name'] for match in suggest('Qwvut')] == ['Qwvut Hall']
+
+
+def test_rows_deleted_elsewhere_leave_the_index(synced):
+    name = db.session.get(Artist, 1).name
+    assert 1 in dict(get_index(Artist).search(name))
+    elsewhere(delete(Show).where(Show.artist_id == 1))
+    elsewhere(delete(Artist).where(Artist.id == 1))
+    assert 1 not in dict(get_index(Artist).search(name))
+
+
+def test_shows_booked_elsewhere_conflict(synced):
+    proposal = booking(1, 2, START + timedelta(hours=1))
+    assert check_schedule([proposal]) == [[]]
+    elsewhere(insert(Show).values(venue_id=1, artist_id=1, start_time=START, end_time=START + timedelta(hours=2)))
+    assert check_schedule([proposal])[0][0]['on'] == 'venue'
+
+
+def test_indexes_wait_for_the_sync_interval(app, context, monkeypatch):
+    monkeypatch.setitem(app.config, 'INDEX_SYNC_SECONDS', 3600)
+    assert suggest('Zyxwv') == []
+    elsewhere(insert(Venue).values(name='Zyxwv Hall', city='Oslo', state='NY', genres='Jazz'))
+    assert suggest('Zyxwv') == []
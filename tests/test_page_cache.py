@@ -0,0 +1,51 @@
+import shutil
+from datetime import datetime
+
+from sqlalchemy import create_engine, update
+
+from cache import page_cache
+from conditional import venue_version
+from models import db, Venue
+from queries import get_venue_data
+
+
+def test_editing_a_venue_invalidates_its_cached_page(client):
+    assert b'Venue 1' in client.get('/venues/1').data
+    assert page_cache.backend.get('venue:1') is not None
+    page = client.get('/venues/1/edit').data.decode()
+    assert 'Venue 1' in page
+
+    client.post('/venues/1/edit', data={
+        'name': 'Renamed Hall', 'genres': ['Jazz'], 'address': '1 Main Street', 'city': 'San Francisco',
+        'state': 'CA', 'phone': '415-555-0100', 'website_link': '', 'facebook_link': '',
+        'seeking_description': '', 'image_link': '',
+    })
+    assert page_cache.backend.get('venue:1') is None
+    assert b'Renamed Hall' in client.get('/venues/1').data
+
+
+def test_pages_cached_before_another_workers_commit_are_rebuilt(app, client):
+    assert b'Venue 1' in client.get('/venues/1').data
+    with app.app_context():
+        # A Core statement bypasses this process's invalidation, like a commit made by another worker
+        db.session.execute(update(Venue).where(Venue.id == 1).values(name='Renamed Hall', updated_at=datetime.now()))
+        db.session.commit()
+    assert page_cache.backend.get('venue:1') is not None
+    assert b'Renamed Hall' in client.get('/venues/1').data
+    assert b'Renamed Hall' in client.get('/api/v1/venues/1').data
+
+
+def test_cached_pages_are_built_from_the_primary(context, tmp_path):
+    # A replica that has not seen the rename yet
+    replica = tmp_path / 'replica.db'
+    shutil.copy(db.engine.url.database, replica)
+    db.session.get(Venue, 1).name = 'Renamed Hall'
+    db.session.commit()
+
+    db.session.info['replica'] = engine = create_engine(f'sqlite:///{replica}')
+    try:
+        data = page_cache.get_or_set('venue:1', lambda: get_venue_data(1), venue_version(1)[0])
+    finally:
+        db.session.info.pop('replica')
+        engine.dispose()
+    assert data['name'] == 'Renamed Hall'
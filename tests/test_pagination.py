@@ -0,0 +1,37 @@
+def walk(client, path, key):
+    # Every row of a listing, following the next cursors
+    seen, cursor = [], None
+    while True:
+        page = client.get(path + (f'&after={cursor}' if cursor else '')).get_json()
+        seen += [row[key] for row in page['data']]
+        cursor = page['next']
+        if not cursor:
+            return seen
+
+
+def test_cursors_walk_every_row_once(client):
+    ids = walk(client, '/api/v1/venues?per_page=7', 'id')
+    assert ids == list(range(1, 21))
+    shows = walk(client, '/api/v1/shows?per_page=13', 'id')
+    assert len(shows) == len(set(shows)) == 100
+
+
+def test_before_cursor_returns_the_previous_page(client):
+    first = client.get('/api/v1/venues?per_page=5').get_json()
+    second = client.get(f'/api/v1/venues?per_page=5&after={first["next"]}').get_json()
+    back = client.get(f'/api/v1/venues?per_page=5&before={second["previous"]}').get_json()
+    assert back['data'] == first['data']
+
+
+def test_malformed_cursors_read_the_first_page(client):
+    import base64
+    import json
+
+    first = client.get('/api/v1/shows?per_page=5').get_json()
+    for values in (['not a date', 1], [1, 2], {'a': 1}, [None], ['2026-01-01T00:00:00', 'x'], [[1], 2]):
+        cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+        for path in ('/api/v1/shows', '/shows'):
+            response = client.get(f'{path}?per_page=5&after={cursor}')
+            assert response.status_code == 200, (path, values)
+        assert client.get(f'/api/v1/shows?per_page=5&after={cursor}').get_json() == first
+    assert client.get('/shows?after=%%%').status_code == 200
@@ -0,0 +1,67 @@
+import random
+import re
+
+from phones import DEFAULT_COUNTRY_CODE, MAX_DIGITS, check_phone_numbers, validate_phone_number
+
+# Characters that separate, surround or sneak into phone numbers, including Unicode spaces and digits
+ALPHABET = '0123456789' * 4 + '+-.() \t\r\f\v\n' + '\xa0 　\x85 \x1c' + '١٢' + 'x#'
+
+CASES = [
+    '415-555-0100', '(415) 555-0100', '+1 415 555 0100', '415.555.0100', '+44 20 7946 0958',
+    '415-555-0100\n', '415-555-0100\r', '415\xa0555\xa00100', '415　555 0100', '\n415-555-0100',
+    '415 555\n0100', '+1 415 555 0100', '٤١٥-555-0100', '415--555-0100', '',
+]
+
+
+def generated(count=5000, seed=0):
+    rng = random.Random(seed)
+    return [''.join(rng.choice(ALPHABET) for _ in range(rng.randint(7, 18))) for _ in range(count)]
+
+
+def single(value):
+    try:
+        return validate_phone_number(value)
+    except ValueError:
+        return None
+
+
+def to_e164(value):
+    # The E.164 form of one valid number, or None when it is ambiguous, to check the batch patterns against
+    digits = re.sub(r'\D', '', value)
+    if value.lstrip().startswith('+'):
+        return '+' + digits if 8 <= len(digits) <= MAX_DIGITS else None
+    if len(digits) == 10:
+        return '+' + DEFAULT_COUNTRY_CODE + digits
+    if len(digits) == 11 and digits.startswith(DEFAULT_COUNTRY_CODE):
+        return '+' + digits
+    return None
+
+
+def test_batch_and_single_validation_agree():
+    values = CASES + generated()
+    checked, failures = check_phone_numbers(values, e164=False)
+    assert checked == [single(value) for value in values]
+    assert failures == [index for index, value in enumerate(values) if single(value) is None]
+
+
+def test_batch_and_single_e164_agree():
+    values = CASES + generated(seed=1)
+    checked, failures = check_phone_numbers(values)
+    assert checked == [to_e164(value) if single(value) else None for value in values]
+
+
+def test_trailing_newlines_and_unicode_spaces_are_handled_alike():
+    for value in ('415-555-0100\n', '415 555\n0100'):
+        assert single(value) is None
+    assert single('415\xa0555\xa00100') == '415\xa0555\xa00100'
+    assert check_phone_numbers(['415\xa0555\xa00100'])[0] == ['+14155550100']
+
+
+def test_whitespace_is_every_space_but_the_newline():
+    import sys
+
+    from phones import WHITESPACE
+
+    spaces = {char for char in map(chr, range(sys.maxunicode + 1)) if char.isspace()} - {'\n'}
+    assert {char for char in spaces if re.fullmatch(f'[{WHITESPACE}]', char)} == spaces
+    assert not re.fullmatch(f'[{WHITESPACE}]', '\n')
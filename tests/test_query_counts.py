@@ -0,0 +1,8 @@
+import pytest
+
+from benchmarks.query_counts import BUDGETS, count_queries
+
+
+@pytest.mark.parametrize('path, budget', BUDGETS.items())
+def test_detail_page_within_statement_budget(client, context, path, budget):
+    assert count_queries(client, path) <= budget
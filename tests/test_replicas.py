@@ -0,0 +1,15 @@
+import pytest
+from flask import Flask
+
+import replicas
+
+
+def test_replicas_need_a_shared_secret_key():
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY=b'random', SQLALCHEMY_REPLICA_URIS=['sqlite://'])
+    with pytest.raises(RuntimeError):
+        replicas.init_app(app)
+
+    app.config['SECRET_KEY_SHARED'] = True
+    replicas.init_app(app)
+    assert 'replica_0' in app.config['SQLALCHEMY_BINDS']
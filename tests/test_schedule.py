@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+
+START = (datetime.now() + timedelta(days=500)).replace(hour=20, minute=0, second=0, microsecond=0)
+
+
+def post_show(client, venue_id, artist_id, start):
+    return client.post('/api/v1/shows', json={
+        'venue_id': venue_id, 'artist_id': artist_id, 'start_time': start.isoformat(),
+    })
+
+
+def test_overlapping_bookings_are_rejected(client):
+    assert post_show(client, 1, 1, START).status_code == 201
+    venue_clash = post_show(client, 1, 2, START + timedelta(hours=1))
+    assert venue_clash.status_code == 409
+    assert venue_clash.get_json()['conflicts'][0]['on'] == 'venue'
+    assert post_show(client, 2, 1, START + timedelta(hours=1)).status_code == 409
+    assert post_show(client, 1, 2, START + timedelta(hours=2)).status_code == 201
+
+
+def test_schedule_check_reports_conflicts_within_the_batch(client):
+    shows = [
+        {'venue_id': 3, 'artist_id': 3, 'start_time': START.isoformat()},
+        {'venue_id': 3, 'artist_id': 4, 'start_time': (START + timedelta(minutes=30)).isoformat()},
+        {'venue_id': 4, 'artist_id': 5, 'start_time': START.isoformat()},
+    ]
+    result = client.post('/api/v1/shows/check', json={'shows': shows}).get_json()
+    assert result['conflicting'] == 2
+    assert result['data'][2]['conflicts'] == []
+
+
+def test_form_bookings_conflict_with_api_bookings(client):
+    # The form posts string ids; the schedule index must key them like the API's integers
+    assert post_show(client, 9, 9, START - timedelta(days=1)).status_code == 201
+    client.post('/shows/create', data={
+        'venue_id': '8', 'artist_id': '8', 'start_time': START.strftime('%Y-%m-%d %H:%M:%S'),
+    })
+    assert post_show(client, 8, 10, START + timedelta(hours=1)).status_code == 409
+    assert post_show(client, 11, 8, START + timedelta(hours=1)).status_code == 409
@@ -0,0 +1,50 @@
+import time
+from datetime import datetime, timedelta
+
+START = (datetime.now() + timedelta(days=700)).replace(hour=20, minute=0, second=0, microsecond=0)
+
+
+def venue_areas(client):
+    return {(area['city'], area['state']): area for area in client.get('/venues?format=json&per_page=200').get_json()['data']}
+
+
+def test_area_headings_add_up_to_their_venues(client):
+    for area in venue_areas(client).values():
+        assert area['num_venues'] == len(area['venues'])
+        assert area['num_upcoming_shows'] == sum(venue['num_upcoming_shows'] for venue in area['venues'])
+
+
+def test_new_shows_count_in_the_row_and_its_heading(client):
+    venue = client.get('/api/v1/venues/3').get_json()
+    before = venue_areas(client)[(venue['city'], venue['state'])]
+    assert client.post('/api/v1/shows', json={
+        'venue_id': 3, 'artist_id': 3, 'start_time': START.isoformat(),
+    }).status_code == 201
+
+    after = venue_areas(client)[(venue['city'], venue['state'])]
+    assert after['num_upcoming_shows'] == before['num_upcoming_shows'] + 1
+    rows = {row['id']: row['num_upcoming_shows'] for row in after['venues']}
+    assert rows[3] == {row['id']: row['num_upcoming_shows'] for row in before['venues']}[3] + 1
+
+
+def test_shows_leave_the_counts_once_they_start(client):
+    venue = client.post('/api/v1/venues', json={
+        'name': 'The Starting Room', 'city': 'Boise', 'state': 'ID', 'phone': '208-555-0100', 'genres': ['Jazz'],
+    }).get_json()['id']
+    artist = client.post('/api/v1/artists', json={
+        'name': 'The Starters', 'city': 'Boise', 'state': 'ID', 'phone': '208-555-0101', 'genres': ['Jazz'],
+    }).get_json()['id']
+    start = datetime.now().replace(microsecond=0) + timedelta(seconds=2)
+    assert client.post('/api/v1/shows', json={
+        'venue_id': venue, 'artist_id': artist, 'start_time': start.isoformat(),
+    }).status_code == 201
+    area = venue_areas(client)[('Boise', 'ID')]
+    assert area['num_upcoming_shows'] == 1
+    assert {row['id']: row['num_upcoming_shows'] for row in area['venues']}[venue] == 1
+
+    # No roll-over of the stored counters runs in between
+    time.sleep(max(0, (start - datetime.now()).total_seconds()) + 0.1)
+    area = venue_areas(client)[('Boise', 'ID')]
+    assert area['num_upcoming_shows'] == 0
+    assert {row['id']: row['num_upcoming_shows'] for row in area['venues']}[venue] == 0
+    assert b'1 venues, 0 upcoming shows' in client.get('/venues?stream=1&city=Boise').data
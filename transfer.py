@@ -0,0 +1,539 @@
+"""
+Bulk import and export of venues, artists and shows
+
+    flask fyyur import venues venues.csv
+    flask fyyur import shows shows.ndjson --batch-size 5000
+    flask fyyur export artists artists.ndjson
+    flask fyyur clean-phones [--apply]
+
+Files are CSV with a header row or newline-delimited JSON, read and
+written a batch at a time. Venues and artists are upserted on their
+name, city and state. Shows are inserted, naming their venue and artist
+by the same keys (venue_name, venue_city, ...) or by venue_id and
+artist_id, and rejected when they overlap a booked show or an earlier
+row of the same venue or artist. Imports bypass the session events, so
+the counters and calendar day buckets are updated here and the page
+cache is cleared when the import finishes; app workers using the
+in-process indexes pick up the new rows within INDEX_SYNC_SECONDS.
+
+clean-phones rewrites the stored phone numbers in E.164 form.
+"""
+# Imports
+
+import csv
+import io
+import json
+import time
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, delete, select, update
+
+from cache import page_cache
+from calendars import count_show_days
+from counters import count_new_shows
+from models import db, Artist, Venue, Show, Genre, DEFAULT_SHOW_DURATION, artist_genres, venue_genres, parse_datetime, parse_genres
+from phones import check_phone_numbers
+from schedule import booking, check_schedule, record_shows
+
+# Rows per batch, each batch being one round of statements and one commit
+BATCH_SIZE = 5000
+
+# Invalid rows reported individually before only being counted
+MAX_REPORTED_ERRORS = 20
+
+KEY_FIELDS = ('name', 'city', 'state')
+
+VENUE_FIELDS = (
+    'name', 'city', 'state', 'address', 'phone', 'genres', 'image_link', 'facebook_link', 'website',
+    'seeking_talent', 'seeking_description'
+)
+ARTIST_FIELDS = (
+    'name', 'city', 'state', 'phone', 'genres', 'image_link', 'facebook_link', 'website',
+    'seeking_venue', 'seeking_description'
+)
+SHOW_FIELDS = ('start_time', 'end_time', 'venue_name', 'venue_city', 'venue_state', 'artist_name', 'artist_city', 'artist_state')
+
+# kind: (model, fields, required fields, boolean fields, unique constraint, genre link column)
+ENTITIES = {
+    'venues': (
+        Venue, VENUE_FIELDS, KEY_FIELDS + ('phone', 'genres'), ('seeking_talent',),
+        'uq_Venue_name_city_state', venue_genres.c.venue_id
+    ),
+    'artists': (
+        Artist, ARTIST_FIELDS, KEY_FIELDS + ('phone',), ('seeking_venue',),
+        'uq_artist_name_city_state', artist_genres.c.artist_id
+    ),
+}
+KINDS = ('venues', 'artists', 'shows')
+
+
+#----------------------------------------------------------------------------#
+# Files.
+#----------------------------------------------------------------------------#
+
+def file_format(format, file):
+    # The --format given, or the one the file name suggests, CSV by default
+    if format:
+        return format
+    name = getattr(file, 'name', '') or ''
+    return 'ndjson' if name.endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+
+
+def read_rows(file, format):
+    """Yield each row of a CSV or NDJSON file as a dict, or None for a line that is not a JSON object."""
+    if format == 'csv':
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield row if isinstance(row, dict) else None
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class RowWriter:
+    """Writes dicts as CSV with a header row, or as newline-delimited JSON."""
+
+    def __init__(self, file, format, fields):
+        self.file = file
+        self.format = format
+        if format == 'csv':
+            self.writer = csv.DictWriter(file, fieldnames=fields)
+            self.writer.writeheader()
+
+    def write(self, row):
+        if self.format == 'csv':
+            self.writer.writerow(row)
+        else:
+            self.file.write(json.dumps(row, default=lambda value: value.isoformat()) + '\n')
+
+
+#----------------------------------------------------------------------------#
+# Validation.
+#----------------------------------------------------------------------------#
+
+def parse_bool(value):
+    if value is None or isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 't', 'yes', 'y')
+
+
+def clean_entity(row, fields, required, booleans):
+    """Return the column values of a venue or artist row and its genre names, or raise ValueError.
+
+    Only the fields the row has are returned, so that an update leaves the
+    others alone. The genre names are None when the row has no genres.
+    Phone numbers are checked for the whole batch afterwards.
+    """
+    values = {}
+    for field in fields:
+        if field in row:
+            value = row[field]
+            if isinstance(value, str):
+                value = value.strip()
+            values[field] = None if value == '' else value
+    missing = [field for field in required if not values.get(field)]
+    if missing:
+        raise ValueError('missing ' + ', '.join(missing))
+    names = None
+    if 'genres' in values:
+        names = parse_genres(values['genres'])
+        values['genres'] = ','.join(names)
+    for field in booleans:
+        if field in values:
+            values[field] = parse_bool(values[field])
+    return values, names
+
+
+def known_ids(model):
+    # The ids of every venue or artist, by (name, city, state) and as a set
+    keys = {
+        (name, city, state): id
+        for id, name, city, state in db.session.execute(select(model.id, model.name, model.city, model.state))
+    }
+    return keys, set(keys.values())
+
+
+def clean_show(row, known, now):
+    """Return the column values of a show row, resolving its venue and artist, or raise ValueError.
+
+    known maps 'venue' and 'artist' to the known_ids of that model.
+    """
+    try:
+        start_time = parse_datetime(str(row.get('start_time') or ''))
+    except ValueError:
+        raise ValueError(f"invalid start_time {row.get('start_time')!r}")
+    try:
+        end_time = str(row.get('end_time') or '').strip()
+        end_time = parse_datetime(end_time) if end_time else start_time + DEFAULT_SHOW_DURATION
+    except ValueError:
+        raise ValueError(f"invalid end_time {row.get('end_time')!r}")
+    if end_time <= start_time:
+        raise ValueError('end_time is not after start_time')
+    values = {'start_time': start_time, 'end_time': end_time, 'is_upcoming': start_time >= now}
+    for name, (keys, ids) in known.items():
+        if row.get(f'{name}_id'):
+            id = int(row[f'{name}_id'])
+        else:
+            id = keys.get(tuple(row.get(f'{name}_{field}') for field in KEY_FIELDS))
+        if id not in ids:
+            raise ValueError(f'unknown {name}')
+        values[f'{name}_id'] = id
+    return values
+
+
+#----------------------------------------------------------------------------#
+# Writes.
+#----------------------------------------------------------------------------#
+
+def dialect_insert(table):
+    # INSERT with ON CONFLICT support for the session's database
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise click.ClickException(f'Upserts are not supported on {dialect}.')
+    return insert(table)
+
+
+def upsert(table, constraint, rows):
+    """Insert or update rows on their name, city and state, returning {(name, city, state): id}.
+
+    Rows are sent in one executemany per set of columns, and an update only
+    overwrites the columns the row has.
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row), []).append(row)
+
+    ids = {}
+    for fields, group in groups.items():
+        statement = dialect_insert(table)
+        update = {field: statement.excluded[field] for field in fields if field not in KEY_FIELDS}
+        # ON CONFLICT updates skip the column's onupdate, and conditional GET relies on it
+        update['updated_at'] = datetime.now()
+        if db.session.get_bind().dialect.name == 'postgresql':
+            statement = statement.on_conflict_do_update(constraint=constraint, set_=update)
+        else:
+            statement = statement.on_conflict_do_update(index_elements=list(KEY_FIELDS), set_=update)
+        returned = db.session.execute(
+            statement.returning(table.c.id, table.c.name, table.c.city, table.c.state), group
+        )
+        ids.update(((name, city, state), id) for id, name, city, state in returned)
+    return ids
+
+
+class GenreIds:
+    """Genre ids by name, creating missing genres as they are first seen."""
+
+    def __init__(self):
+        self.ids = dict(db.session.execute(select(Genre.name, Genre.id)).all())
+
+    def __call__(self, names):
+        missing = sorted(set(names) - self.ids.keys())
+        if missing:
+            table = Genre.__table__
+            db.session.execute(dialect_insert(table).on_conflict_do_nothing(), [{'name': name} for name in missing])
+            self.ids.update(db.session.execute(select(table.c.name, table.c.id).where(table.c.name.in_(missing))).all())
+        return [self.ids[name] for name in names]
+
+
+def link_genres(column, genre_ids, owners):
+    # Replace the genre links of each (owner id, genre names)
+    if not owners:
+        return
+    db.session.execute(delete(column.table).where(column.in_([id for id, names in owners])))
+    links = [
+        {'genre_id': genre_id, column.name: id}
+        for id, names in owners for genre_id in genre_ids(names)
+    ]
+    if links:
+        db.session.execute(column.table.insert(), links)
+
+
+def unbooked(cleaned, report):
+    """Return the cleaned shows, by row number, that overlap neither a booked show nor an earlier row."""
+    numbers = list(cleaned)
+    conflicts = check_schedule([
+        booking(show['venue_id'], show['artist_id'], show['start_time'], show['end_time']) for show in cleaned.values()
+    ])
+    accepted = set()
+    for index, found in enumerate(conflicts):
+        # A row only loses to rows before it that were accepted themselves
+        blocking = [conflict for conflict in found if 'show_id' in conflict or conflict['proposal'] in accepted]
+        if not blocking:
+            accepted.add(index)
+            continue
+        report(numbers[index], f"the {blocking[0]['on']} is already booked by " + ', '.join(
+            f"show {conflict['show_id']}" if 'show_id' in conflict else f"row {numbers[conflict['proposal']]}"
+            for conflict in blocking
+        ))
+    return [cleaned[numbers[index]] for index in sorted(accepted)]
+
+
+def copy_rows(table, columns, rows):
+    """Load rows with COPY on Postgres through psycopg2, returning False where that is unavailable."""
+    connection = db.session.connection()
+    if connection.dialect.name != 'postgresql':
+        return False
+    cursor = connection.connection.cursor()
+    if not hasattr(cursor, 'copy_expert'):
+        return False
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([row[column] for column in columns] for row in rows)
+    buffer.seek(0)
+    cursor.copy_expert(
+        f'COPY "{table.name}" ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer
+    )
+    return True
+
+
+#----------------------------------------------------------------------------#
+# Import.
+#----------------------------------------------------------------------------#
+
+def import_rows(kind, rows, batch_size=BATCH_SIZE, report=None, e164=False):
+    """Import an iterable of row dicts, committing once per batch.
+
+    Invalid rows are skipped and passed to report(row number, message).
+    Phone numbers are stored as given, or normalized to E.164 with e164.
+    Returns (rows imported, rows rejected).
+    """
+    report = report or (lambda number, message: None)
+    imported = rejected = number = 0
+    if kind == 'shows':
+        known = {'venue': known_ids(Venue), 'artist': known_ids(Artist)}
+        now = datetime.now()
+        # Shows per (venue, artist, is_upcoming) committed so far, added to the counters once at the end
+        counts = Counter()
+    else:
+        model, fields, required, booleans, constraint, link = ENTITIES[kind]
+        genre_ids = GenreIds()
+
+    try:
+        for batch in batches(rows, batch_size):
+            cleaned = {}
+            entities = []
+            for row in batch:
+                number += 1
+                try:
+                    if row is None:
+                        raise ValueError('not a JSON object')
+                    if kind == 'shows':
+                        cleaned[number] = clean_show(row, known, now)
+                    else:
+                        entities.append((number, *clean_entity(row, fields, required, booleans)))
+                except (ValueError, TypeError) as e:
+                    rejected += 1
+                    report(number, str(e))
+
+            if entities:
+                # Check the batch's phone numbers in one pass
+                phones, failures = check_phone_numbers([values['phone'] for _, values, _ in entities], e164=e164)
+                failures = set(failures)
+                for index, (row_number, values, names) in enumerate(entities):
+                    if index in failures:
+                        rejected += 1
+                        report(row_number, f"Invalid phone number format: {values['phone']}")
+                        continue
+                    values['phone'] = phones[index]
+                    # A later row with the same name, city and state wins
+                    cleaned[tuple(values[field] for field in KEY_FIELDS)] = (values, names)
+            if not cleaned:
+                continue
+
+            if kind == 'shows':
+                shows = unbooked(cleaned, report)
+                rejected += len(cleaned) - len(shows)
+                if not shows:
+                    continue
+                columns = ['venue_id', 'artist_id', 'start_time', 'end_time', 'is_upcoming']
+                if copy_rows(Show.__table__, columns, shows):
+                    count_show_days((show['start_time'], show['venue_id']) for show in shows)
+                    db.session.commit()
+                else:
+                    # Bulk inserts bypass the session events, so add the new ids to the schedule index here
+                    ids = db.session.execute(
+                        Show.__table__.insert().returning(Show.__table__.c.id, sort_by_parameter_order=True), shows
+                    ).scalars().all()
+                    count_show_days((show['start_time'], show['venue_id']) for show in shows)
+                    db.session.commit()
+                    record_shows(
+                        (id, show['venue_id'], show['artist_id'], show['start_time'], show['end_time'])
+                        for id, show in zip(ids, shows)
+                    )
+                counts.update((show['venue_id'], show['artist_id'], show['is_upcoming']) for show in shows)
+                imported += len(shows)
+                continue
+            else:
+                ids = upsert(model.__table__, constraint, [values for values, names in cleaned.values()])
+                link_genres(link, genre_ids, [
+                    (ids[key], names) for key, (values, names) in cleaned.items() if names is not None
+                ])
+                db.session.commit()
+            imported += len(cleaned)
+    finally:
+        # Count the committed shows even when a later batch failed
+        db.session.rollback()
+        if kind == 'shows' and counts:
+            count_new_shows((*key, count) for key, count in counts.items())
+            db.session.commit()
+        page_cache.clear()
+
+    return imported, rejected
+
+
+#----------------------------------------------------------------------------#
+# Export.
+#----------------------------------------------------------------------------#
+
+def export_rows(kind, batch_size=BATCH_SIZE):
+    """Yield every venue, artist or show as a dict of the fields import reads."""
+    if kind == 'shows':
+        query = db.session.query(
+            Show.start_time,
+            Show.end_time,
+            Venue.name.label('venue_name'), Venue.city.label('venue_city'), Venue.state.label('venue_state'),
+            Artist.name.label('artist_name'), Artist.city.label('artist_city'), Artist.state.label('artist_state')
+        ).join(Venue, Venue.id == Show.venue_id).join(Artist, Artist.id == Show.artist_id).order_by(Show.id)
+    else:
+        model, fields = ENTITIES[kind][:2]
+        query = db.session.query(*(getattr(model, field) for field in fields)).order_by(model.id)
+    for row in query.yield_per(batch_size):
+        yield row._asdict()
+
+
+#----------------------------------------------------------------------------#
+# Clean-up.
+#----------------------------------------------------------------------------#
+
+def clean_phone_numbers(model, apply=False, batch_size=BATCH_SIZE, report=None):
+    """Normalize the stored phone numbers of venues or artists to E.164, a batch at a time.
+
+    Numbers that cannot be normalized are left as they are and passed to
+    report(id, phone). Changes are only written when apply is set.
+    Returns (rows checked, rows changed, rows invalid).
+    """
+    report = report or (lambda id, phone: None)
+    table = model.__table__
+    checked = changed = invalid = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(table.c.id, table.c.phone).where(table.c.id > last_id).order_by(table.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        phones, failures = check_phone_numbers([row.phone for row in rows])
+        for index in failures:
+            report(rows[index].id, rows[index].phone)
+        updates = [
+            {'row_id': row.id, 'phone': phone}
+            for row, phone in zip(rows, phones) if phone is not None and phone != row.phone
+        ]
+        if apply and updates:
+            db.session.execute(update(table).where(table.c.id == bindparam('row_id')).values(
+                phone=bindparam('phone')
+            ), updates)
+            db.session.commit()
+        checked += len(rows)
+        changed += len(updates)
+        invalid += len(failures)
+
+    if apply:
+        # The updates bypass the session events, and the detail pages show phone numbers
+        page_cache.clear()
+    return checked, changed, invalid
+
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+fyyur_cli = AppGroup('fyyur', help='Bulk import and export venues, artists and shows.')
+
+format_option = click.option(
+    '--format', type=click.Choice(['csv', 'ndjson']), help='File format, by default guessed from the file name.'
+)
+
+
+@fyyur_cli.command('import')
+@click.argument('kind', type=click.Choice(KINDS))
+@click.argument('file', type=click.File('r', encoding='utf-8'))
+@format_option
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True, help='Rows per batch and commit.')
+@click.option('--e164', is_flag=True, help='Store phone numbers in E.164 form, rejecting ambiguous ones.')
+def import_command(kind, file, format, batch_size, e164):
+    """Import venues, artists or shows from a CSV or NDJSON file ('-' for stdin)."""
+    errors = []
+
+    def report(number, message):
+        errors.append(number)
+        if len(errors) <= MAX_REPORTED_ERRORS:
+            click.echo(f'row {number}: {message}', err=True)
+
+    started = time.perf_counter()
+    imported, rejected = import_rows(kind, read_rows(file, file_format(format, file)), batch_size, report, e164)
+    elapsed = time.perf_counter() - started
+    click.echo(
+        f'Imported {imported} {kind}, rejected {rejected} rows in {elapsed:.2f} s '
+        f'({(imported + rejected) / elapsed if elapsed else 0:,.0f} rows/s).'
+    )
+
+
+@fyyur_cli.command('export')
+@click.argument('kind', type=click.Choice(KINDS))
+@click.argument('file', type=click.File('w', encoding='utf-8'), default='-')
+@format_option
+def export_command(kind, file, format):
+    """Export venues, artists or shows to a CSV or NDJSON file (stdout by default)."""
+    format = file_format(format, file)
+    writer = RowWriter(file, format, SHOW_FIELDS if kind == 'shows' else ENTITIES[kind][1])
+    started = time.perf_counter()
+    count = 0
+    for row in export_rows(kind):
+        writer.write(row)
+        count += 1
+    elapsed = time.perf_counter() - started
+    click.echo(f'Exported {count} {kind} in {elapsed:.2f} s ({count / elapsed if elapsed else 0:,.0f} rows/s).', err=True)
+
+
+@fyyur_cli.command('clean-phones')
+@click.option('--apply', is_flag=True, help='Write the normalized numbers instead of only counting them.')
+def clean_phones_command(apply):
+    """Normalize venue and artist phone numbers to E.164."""
+    for model in (Venue, Artist):
+        reported = []
+
+        def report(id, phone):
+            reported.append(id)
+            if len(reported) <= MAX_REPORTED_ERRORS:
+                click.echo(f'{model.__name__} {id}: cannot normalize {phone!r}', err=True)
+
+        started = time.perf_counter()
+        checked, changed, invalid = clean_phone_numbers(model, apply=apply, report=report)
+        elapsed = time.perf_counter() - started
+        click.echo(
+            f'{model.__name__}: {checked} checked, {changed} ' + ('normalized' if apply else 'to normalize')
+            + f', {invalid} invalid in {elapsed:.2f} s ({checked / elapsed if elapsed else 0:,.0f} rows/s).'
+        )